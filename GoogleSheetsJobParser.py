@@ -13,20 +13,140 @@
 """
 from SampleData import SampleData
 from SRGJob import SRGJob
+import hashlib
+import json
 import time
 
+#Ranges of a tab read by the parser, the details are the first two columns
+#from row 2 and the column names are the first row
+DETAILS_RANGE = 'A2:B101'
+COLUMNS_RANGE = 'A1:Z1'
+#Column letters of the first row, the Test Name and Result columns must be one of these
+COLUMN_CODES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+#Most ranges read by one batchGet request, keeps the request url short
+BATCH_RANGES = 100
+#Seconds between requests so as to not breach the x requests in 100 seconds
+REQUEST_DELAY = 10
+
+def parse_details_values(values, fields):
+    """ Parses the values of the details range of the Details tab into the job fields
+    
+    Args:
+        values (str[][]): the rows of the details range
+        fields (dict): the job fields to add the fields to
+    """
+    #fields columns, first column is name of field and second 
+    #column is the value for the field
+    for row in values:
+        if len(row) == 2 and row[0] != '':
+            fields[row[0]] = row[1]
+
+def result_columns(column_values):
+    """ Finds the Test Name and Result columns of a sample tab
+    
+    Args:
+        column_values (str[][]): the rows of the columns range, the first row of the tab
+        
+    Returns:
+        (str, str): the letters of the Test Name and Result columns, None if
+            the tab doesn't have both columns
+    """
+    #names of all the columns in the spreadsheet. Need to get the index
+    #of the Test Name and Result columns, these are the data columns that
+    #need to be extracted from the sheet
+    try:
+        tn_col_index = column_values[0].index("Test Name")
+        res_col_index = column_values[0].index("Result")
+    except ValueError:
+        return None
+    
+    #convert the index of these columns to the column letter, columns
+    #are letters in spreadsheets not numbers
+    return COLUMN_CODES[tn_col_index], COLUMN_CODES[res_col_index]
+
+def tab_fingerprint(sheet_id, title, values):
+    """ Fingerprints the content of a sample tab, tabs with the same fingerprint
+    parse into the same sample
+    
+    Args:
+        sheet_id (int): the id of the tab in the spreadsheet
+        title (str): the title of the tab
+        values (str[][][]): the values of every range read from the tab
+        
+    Returns:
+        str: the hex sha256 hash of the tab
+    """
+    content = json.dumps([sheet_id, title, values])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def parse_sample_values(details_values, tn_data, res_data):
+    """ Parses the values read from a sample tab into a sample
+    
+    Args:
+        details_values (str[][]): the rows of the details range
+        tn_data (str[][]): the rows of the Test Name column from row 2
+        res_data (str[][]): the rows of the Result column from row 2
+        
+    Returns:
+        SampleData: the sample, None if the tab has no useable data
+    """
+    #create a sample data object to store all the extracted data
+    sample_data = SampleData()
+
+    #Sample details columns, first column is name of detail and second 
+    #column is the value for the detail
+    for row in details_values:
+        if len(row) == 2 and row[0] != '':
+            sample_data.add_detail(row[0], row[1])
+    
+    #go through each row in the extracted data and get the value for
+    #Test Name and Result
+    rows = [(tn_data[i][0], res_data[i][0]) for i in range(len(tn_data))
+            if len(tn_data[i]) > 0 and len(res_data[i]) > 0]
+    
+    #Add the Results for the Test Names to the sample_data test result arrays
+    if len(rows) > 0:
+        test_names, results = zip(*rows)
+        sample_data.add_results(test_names, results)
+
+    #only samples with some useable data are added to the job
+    if len(sample_data.details) > 0 and len(sample_data.test_results) > 0:
+        return sample_data
+    
+    return None
+
 class GoogleSheetsJobParser:
     """ Opens a google sheets document and parses the contents into a job class """
     
-    def __init__(self, view):
+    def __init__(self, view, tab_cache=None):
+        """ Init function for the parser
+        
+        Args:
+            view (class): the view to display progress messages in
+            tab_cache (SRGCache): cache of parsed samples keyed by the tab
+                fingerprint, None to parse every tab
+                
+        Attributes:
+            view (class): the view to display progress messages in
+            tab_cache (SRGCache): cache of parsed samples
+            parsed_tabs (int): the number of sample tabs parsed by the last parse_document
+            cached_tabs (int): the number of sample tabs the last parse_document
+                took from the cache
+        """
         self.view = view
-        pass
-    
-
+        self.tab_cache = tab_cache
+        self.parsed_tabs = 0
+        self.cached_tabs = 0
     
     def parse_document(self, service, document_id):
         """ The main function that opens the document, parses the data into a jobs
-        object and returns the resulting job with all the calculated values
+        object and returns the resulting job with all the calculated values.
+        The values of every tab are read in two batched requests, the details
+        and column names then the Test Name and Result columns. The sheets api
+        has no revision for a tab and a result can change without changing
+        the size of the tab, so every tab is read on every run. A tab with the
+        same values as a tab parsed before isn't parsed again, its sample is
+        taken from the tab cache
         
         Args:
             service (google sheets service): the googlse sheets api service
@@ -43,25 +163,65 @@ class GoogleSheetsJobParser:
         #get the sheet details such as individual sheet names, each test sample
         #will be on a separate sheet
         sheet_details = sheet_ref.execute()
+        sheets = [sheet.get('properties') for sheet in sheet_details.get('sheets')]
+        
+        #get the first two columns which contain the details of every tab as
+        #well as the first row with all the column headings of the sample tabs
+        ranges = []
+        for properties in sheets:
+            ranges.append('{0}!{1}'.format(properties.get('title'), DETAILS_RANGE))
+            if properties.get('title') != "Details":
+                ranges.append('{0}!{1}'.format(properties.get('title'), COLUMNS_RANGE))
+        header_values = self.batch_get(service, document_id, ranges)
+        
+        tabs = []
+        ranges = []
+        for properties in sheets:
+            title = properties.get('title')
+            details_values = header_values.pop(0)
+            columns = result_columns(header_values.pop(0)) if title != "Details" else None
+            tabs.append((properties, details_values, columns))
+            
+            if columns is not None:
+                #rowCount is taken here so we know how many rows to extract from the sheet
+                row_count = properties.get('gridProperties').get('rowCount')
+                ranges.append('{0}!{1}2:{1}{2}'.format(title, columns[0], row_count))
+                ranges.append('{0}!{1}2:{1}{2}'.format(title, columns[1], row_count))
+                
+        #make another request to the sheets api to get the test result data
+        #from the Test Name and Result columns found above
+        data_values = self.batch_get(service, document_id, ranges)
    
         #The job object will hold the list of samples and their data
         job = SRGJob()
+        self.parsed_tabs = 0
+        self.cached_tabs = 0
         
         #go through each sheet in the spreadsheets and process into a SampleData object
-        for sheet in sheet_details.get('sheets'):
+        for properties, details_values, columns in tabs:
                     
-            title = sheet.get('properties').get('title')
+            title = properties.get('title')
             self.view.display_message("Processing: {}".format(title))
             
             #special Details tab is used to extract the details required for the report
             if title == "Details":
-                self.parse_details(sheet, job, service, document_id)
-            else:
-                self.parse_sample(sheet, job, service, document_id)
-                
-            #slow down the requests as to not brech the x requets in 100 seconds
-            time.sleep(10)
+                parse_details_values(details_values, job.fields)
+                continue
+            
+            if columns is None:
+                #don't add this sample because the required columns did not exist
+                continue
+            
+            #The first element will be the Test Name column array the second
+            #element will be the Result column array
+            tn_data = data_values.pop(0)
+            res_data = data_values.pop(0)
+            
+            sample_data = self.parse_sample(document_id, properties, details_values, tn_data, res_data)
             
+            #if this sample had some useable data then add it to the job object
+            if sample_data is not None:
+                job.add_sample(sample_data)
     
         #return None if no samples were added to this job 
         if len(job.samples) > 0:
@@ -69,107 +229,79 @@ class GoogleSheetsJobParser:
         else:
             return None
 
-    def parse_details(self, sheet, job, service, document_id):
-        """ Parses the details tab which has information about the report
+    def parse_metadata(self, service, document_id):
+        """ Reads what is needed to schedule the document without reading the
+        results, the size of each tab and the fields of the Details tab
         
         Args:
-            sheet (google sheet): The google sheet to process
-            job (SRGJob): the pointer to the job object to hold all the results
             service (google sheets service): the google sheets api service
-            document_id (str): the google sheets document id to fetch and process
-        
+            document_id (str): the google sheets document id
+            
+        Returns:
+            (dict[], dict): the properties of each tab and the job fields
         """
+        sheet_details = service.spreadsheets().get(spreadsheetId=document_id,
+                                fields='sheets(properties(title,gridProperties(rowCount)))').execute()
+        sheets = [sheet.get('properties') for sheet in sheet_details.get('sheets', [])]
         
-        #get the first row with all the column headings as well as the first two
-        #columns which contain the sample details
-        result = service.spreadsheets().values().get(spreadsheetId=document_id,
-                                range='Details!A2:B101').execute()
-        
-        #fields columns, first column is name of field and second 
-        #column is the value for the field
-        values = result.get('values', [])
-        for row in values:
-            if len(row) == 2 and row[0] != '':
-                job.fields[row[0]] = row[1]
+        fields = {}
+        if any(properties.get('title') == "Details" for properties in sheets):
+            result = service.spreadsheets().values().get(spreadsheetId=document_id,
+                                range='Details!{0}'.format(DETAILS_RANGE)).execute()
+            parse_details_values(result.get('values', []), fields)
             
-        
-    
-    def parse_sample(self, sheet, job, service, document_id):
-        """ Parses each tab in the sheet as a separate sample.
+        return sheets, fields
+
+    def batch_get(self, service, document_id, ranges):
+        """ Reads the values of ranges of the document, BATCH_RANGES at a time
         
         Args:
-            sheet (google sheet): The google sheet to process
-            job (SRGJob): the pointer to the job object to hold all the results
             service (google sheets service): the google sheets api service
-            document_id (str): the google sheets document id to fetch and process
-
-        
+            document_id (str): the google sheets document id
+            ranges (str[]): the A1 ranges including the tab title
+            
+        Returns:
+            str[][][]: the rows of each range, in the order of the ranges
         """
-        
-        #get the title of the sheet to be used for the ranges reference in batchGet()
-        title = sheet.get('properties').get('title')
+        values = []
+        for start in range(0, len(ranges), BATCH_RANGES):
+            #slow down the requests as to not brech the x requets in 100 seconds
+            if start > 0:
+                time.sleep(REQUEST_DELAY)
             
-        #rowCount is taken here so we know how many rows to extract from the sheet
-        row_count = sheet.get('properties').get('gridProperties').get('rowCount')
-        
-        #get the first row with all the column headings as well as the first two
-        #columns which contain the sample details
-        result = service.spreadsheets().values().batchGet(spreadsheetId=document_id,
-                                ranges=['{0}!A2:B101'.format(title),
-                                        '{0}!A1:Z1'.format(title)]).execute()
-        
-        #The first element in this array is the sample details columns
-        #the second element is the column names ie. first row of sheet
-        valueRanges = result.get('valueRanges', [])
+            result = service.spreadsheets().values().batchGet(spreadsheetId=document_id,
+                                    ranges=ranges[start:start + BATCH_RANGES]).execute()
+            values += [value_range.get('values', []) for value_range in result.get('valueRanges', [])]
+            
+        return values
+    
+    def parse_sample(self, document_id, properties, details_values, tn_data, res_data):
+        """ Parses the values of a sample tab, reusing the sample parsed from a
+        tab with the same fingerprint. The values are always read, only the
+        parsing is saved
         
-        #create a sample data object to store all the extracted data
-        sample_data = SampleData()
-
-        #Sample details columns, first column is name of detail and second 
-        #column is the value for the detail
-        values = valueRanges[0].get('values', [])
-        for row in values:
-            if len(row) == 2 and row[0] != '':
-                sample_data.add_detail(row[0], row[1])
+        Args:
+            document_id (str): the google sheets document id
+            properties (dict): the properties of the tab from the sheets api
+            details_values (str[][]): the rows of the details range
+            tn_data (str[][]): the rows of the Test Name column from row 2
+            res_data (str[][]): the rows of the Result column from row 2
             
-        #names of all the columns in the spreadsheet. Need to get the index
-        #of the Test Name and Result columns, these are the data columns that
-        #need to be extracted from the sheet
-        values = valueRanges[1].get('values', [])
-        try:
-            tn_col_index = values[0].index("Test Name")
-            res_col_index = values[0].index("Result")
-        except ValueError:
-            #don't add this sample because the required columns did not exist
-            return
-        
-        #convert the index of these columns to the column letter, columns
-        #are letters in spreadsheets not numbers
-        alpha_codes = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"            
-        tn_code = alpha_codes[tn_col_index]
-        res_code = alpha_codes[res_col_index]
+        Returns:
+            SampleData: the sample, None if the tab has no useable data
+        """
+        key = None
+        if self.tab_cache is not None:
+            key = ('tab', document_id, tab_fingerprint(properties.get('sheetId'), properties.get('title'),
+                                                       [details_values, tn_data, res_data]))
+            sample_data = self.tab_cache.get(key)
+            if sample_data is not None:
+                self.cached_tabs += 1
+                return sample_data
         
-        #make another request to the sheets api to get the test result data
-        #from the Test Name and Result columns found above
-        data_result = service.spreadsheets().values().batchGet(spreadsheetId=document_id,
-                                ranges=['{0}!{1}2:{1}{2}'.format(title, tn_code, row_count),
-                                        '{0}!{1}2:{1}{2}'.format(title, res_code, row_count)]).execute()
-        
-        #The first element in data_values will be the Test Name column array
-        #the second element will be the Result column array
-        data_values = data_result.get('valueRanges', [])            
-        tn_data = data_values[0].get('values', [])
-        res_data = data_values[1].get('values', [])
-        
-        #go through each row in the extracted data and get the value for
-        #Test Name and Result
-        for i in range(len(tn_data)):
-            #Add the Result for this Test Name to the sample_data test result array
-            if len(tn_data[i]) > 0 and len(res_data[i]) > 0:
-                sample_data.add_result(tn_data[i][0], res_data[i][0])    
-
-        #if this sample had some useable data then add it to the job object
-        if len(sample_data.details) > 0 and len(sample_data.test_results) > 0:
-           job.add_sample(sample_data) 
-    
-    
\ No newline at end of file
+        self.parsed_tabs += 1
+        sample_data = parse_sample_values(details_values, tn_data, res_data)
+        if key is not None and sample_data is not None:
+            self.tab_cache.put(key, sample_data)
+            
+        return sample_data
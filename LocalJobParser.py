@@ -0,0 +1,154 @@
+"""
+    NOTE on local workbook format:
+
+    A local workbook has the same tabs as the google sheets document, a Details
+    tab and a tab for each sample, see GoogleSheetsJobParser. It can be either
+    an Excel workbook (.xlsx, needs openpyxl) or a JSON export of the sheet, an
+    object with the title of each tab as the key and the rows of the tab as the
+    value, in the order of the tabs eg.
+
+    {"Details": [["Field", "Value"], ["ReportTemplate", "Template.docx"]],
+     "Sample 1": [["Detail", "Value", "Test Name", "Result"], ["Name", "A", "Gloss", "85"]]}
+
+"""
+import collections
+import json
+import os
+import re
+from SRGJob import SRGJob
+from GoogleSheetsJobParser import (DETAILS_RANGE, COLUMNS_RANGE, parse_details_values,
+                                   result_columns, parse_sample_values)
+
+RANGE_PATTERN = re.compile(r"([A-Z])(\d+):([A-Z])(\d*)")
+
+def cell_text(value):
+    """ Converts a cell value to the text the Sheets API returns for it
+
+    Args:
+        value (object): the value of the cell
+
+    Returns:
+        str: the text of the cell, empty if the cell has no value
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def sheet_values(rows, cell_range):
+    """ Gets the values of a range of a tab the same way the Sheets API returns
+    them, empty cells at the end of each row and empty rows at the end of the
+    range are left out
+
+    Args:
+        rows (object[][]): every row of the tab
+        cell_range (str): the A1 range without the tab title eg. A2:B101, C2:C for
+            every row from row 2
+
+    Returns:
+        str[][]: the rows of the range
+    """
+    first_column, first_row, last_column, last_row = RANGE_PATTERN.match(cell_range).groups()
+    first_column = ord(first_column) - ord('A')
+    last_column = ord(last_column) - ord('A')
+    last_row = int(last_row) if last_row != '' else len(rows)
+
+    values = []
+    for row in rows[int(first_row) - 1:last_row]:
+        cells = [cell_text(value) for value in row[first_column:last_column + 1]]
+        while len(cells) > 0 and cells[-1] == '':
+            cells.pop()
+        values.append(cells)
+
+    while len(values) > 0 and len(values[-1]) == 0:
+        values.pop()
+
+    return values
+
+class LocalJobParser:
+    """ Parses a local workbook exported from the google sheets document into
+    a job class, with the same rules as GoogleSheetsJobParser """
+
+    def __init__(self, view=None):
+        self.view = view
+
+    def parse_file(self, path):
+        """ Reads a workbook and parses it into a job
+
+        Args:
+            path (str): the path of the .xlsx or .json workbook
+
+        Returns:
+            job (SRGJob): the job object containing all the job information, None
+                if the workbook has no samples
+        """
+        return self.parse_tabs(self.read_workbook(path))
+
+    def read_workbook(self, path):
+        """ Reads the rows of every tab of a workbook
+
+        Args:
+            path (str): the path of the .xlsx or .json workbook
+
+        Returns:
+            OrderedDict: the rows of each tab by the tab title, in the order of the tabs
+        """
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == '.json':
+            with open(path, 'r') as workbook_file:
+                return json.load(workbook_file, object_pairs_hook=collections.OrderedDict)
+
+        if extension == '.xlsx':
+            #openpyxl is only needed for Excel workbooks so import it on first use
+            import openpyxl
+            workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+            try:
+                return collections.OrderedDict((sheet.title, [list(row) for row in sheet.iter_rows(values_only=True)])
+                                               for sheet in workbook.worksheets)
+            finally:
+                workbook.close()
+
+        raise ValueError("Unsupported workbook " + path)
+
+    def parse_tabs(self, tabs):
+        """ Parses the rows of every tab into a job
+
+        Args:
+            tabs (dict): the rows of each tab by the tab title, in the order of the tabs
+
+        Returns:
+            job (SRGJob): the job object containing all the job information, None
+                if there are no samples
+        """
+        job = SRGJob()
+
+        for title, rows in tabs.items():
+            if self.view is not None:
+                self.view.display_message("Processing: {}".format(title))
+
+            #special Details tab is used to extract the details required for the report
+            if title == "Details":
+                parse_details_values(sheet_values(rows, DETAILS_RANGE), job.fields)
+                continue
+
+            columns = result_columns(sheet_values(rows, COLUMNS_RANGE))
+            if columns is None:
+                #don't add this sample because the required columns did not exist
+                continue
+            tn_code, res_code = columns
+
+            sample_data = parse_sample_values(sheet_values(rows, DETAILS_RANGE),
+                                              sheet_values(rows, '{0}2:{0}'.format(tn_code)),
+                                              sheet_values(rows, '{0}2:{0}'.format(res_code)))
+            if sample_data is not None:
+                job.add_sample(sample_data)
+
+        #return None if no samples were added to this job
+        if len(job.samples) > 0:
+            return job
+        else:
+            return None
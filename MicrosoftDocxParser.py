@@ -1,12 +1,16 @@
 import datetime
 from docx import Document
 from docx.shared import Inches
-import re
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+from RenderPlan import RenderPlans, find_element
 import io
 from googleapiclient.http import MediaIoBaseDownload
 import os
 
 PROG_PATH = os.path.dirname(__file__)
+#Widest an image of a table can be in the report, the width of the page content
+MAX_IMAGE_WIDTH = Inches(7.2)
 
 class MicrosoftDocxParser:
     """ Class that parses a Microsoft Docx format report template.
@@ -74,32 +78,24 @@ class MicrosoftDocxParser:
             
         return False
     
-    def extract_table_commands(self, document_path):
+    def extract_table_commands(self, document_path, plan_folder=None):
         """ Extracts the doc template requests for data in the form of command strings
         
         Args:
             document_path (str): the path of the template doc file
+            plan_folder (str): the folder compiled render plans are saved in,
+                None to search the template every time
             
         Returns:
             str[]: Array of table commands extracted from the template
         
         """
         
-        document = Document(document_path)
-        
-        #go through the table objects and extract the <<table commands>> and 
-        #store int he table_commands array
-        table_commands = []
-        for table in document.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    commands = re.findall(r'\<<([^>>]+)\>>', cell.text)
-                    table_commands = table_commands + commands
-         
-        return table_commands   
+        #the <<table commands>> of every table cell are listed in the render plan
+        return RenderPlans(plan_folder).get(document_path)['table_commands']
 
         
-    def generate_report(self, document_path, fields, tables): 
+    def generate_report(self, document_path, fields, tables, plan_folder=None): 
         """ Generates the Docx report by inserting all the job.Details fields
         in the text and inserting the results tables in the <<table command>> 
         positions
@@ -108,33 +104,28 @@ class MicrosoftDocxParser:
             document_path (str): the path of the template doc file
             fields (str[]): Array of fields to replace with results text
             tables (ResultTable[]): The array of results tables calculated from the data
+            plan_folder (str): the folder compiled render plans are saved in,
+                None to search the template every time
         
         """
 
+        #the positions of the <<Field:___>> and <<table command>> objects are
+        #found once for each template and saved in the render plan
+        plan = RenderPlans(plan_folder).get(document_path)
+        
         document = Document(document_path)
-
-        #search through the template to find all the <<Field:___>> objects
-        text_objects = []
-        
-        #Get all the text objects so we can replace any fields
-        for paragraph in document.paragraphs:
-            text_objects.append(paragraph)
-        for section in document.sections:
-            for paragraph in section.header.paragraphs:
-                text_objects.append(paragraph)
-            for paragraph in section.footer.paragraphs:
-                text_objects.append(paragraph)
-        for table in document.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        text_objects.append(paragraph)
+        body = document.element.body
         
         #Substitute the <<Field:___>> text with the data from the fields dictionary
-        for text_object in text_objects:    
-             #extract the field placeholders denoated by <<command>>
-             place_holders = re.findall(r'\<<Field:([^>>]+)\>>', text_object.text)
-             for field in place_holders:        
+        for slot in plan['fields']:
+             if slot['part'] == 'body':
+                 text_object = Paragraph(find_element(body, slot['path']), document._body)
+             else:
+                 section = document.sections[slot['section']]
+                 parent = section.header if slot['part'] == 'header' else section.footer
+                 text_object = Paragraph(find_element(parent._element, slot['path']), parent)
+                 
+             for field in slot['fields']:        
                  #Date is a special field that inserts the current date
                  if field == 'Date':
                      text_object.text = text_object.text.replace('<<Field:Date>>', datetime.date.today().strftime("%d/%m/%Y"))
@@ -145,29 +136,47 @@ class MicrosoftDocxParser:
                          raise KeyError("Field " + field + " missing in source data");
 
         #Insert all the generated tables in the correct positions    
-        for table in document.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    commands = re.findall(r'\<<([^>>]+)\>>', cell.text)            
-                    for command in commands:
-                        
-                        #clear the placeholder
-                        cell.text = ""
-                        table.style = None
+        for slot in plan['cells']:
+            table = Table(find_element(body, slot['table']), document._body)
+            cell = _Cell(find_element(body, slot['cell']), table)
+            for command in slot['commands']:
+                
+                #clear the placeholder
+                cell.text = ""
+                table.style = None
+                
+                if command in tables:
+                    result_table = tables[command]
+                    
+                    if type(result_table) != list:
+                        result_table = [result_table]
                         
-                        if command in tables:
-                            result_table = tables[command]
-                            
-                            if type(result_table) == list:
-                                for inner_table in result_table:
-                                    self.fill_table(inner_table, cell, document.styles['Table Grid'])                                  
-                            else:      
-                                
-                                self.fill_table(result_table, cell, document.styles['Table Grid'])
+                    for inner_table in result_table:
+                        #tables checkpointed before images were supported have no image
+                        if getattr(inner_table, 'image', None) is not None:
+                            self.insert_image(inner_table, cell)
+                        else:
+                            self.fill_table(inner_table, cell, document.styles['Table Grid'])
 
         #save the document over the top of the downloaded template
         document.save(document_path)                                
 
+    def insert_image(self, result_table, cell):
+        """ Inserts the rendered image of a results table in place of a Docx table
+        
+        Args:
+            result_table (ResultTable): the result table with the PNG image
+            cell (Docx.cell): The template cell that will contain the image
+        
+        """
+        
+        picture = cell.add_paragraph().add_run().add_picture(io.BytesIO(result_table.image))
+        
+        #shrink wide images to fit the page keeping the aspect ratio
+        if picture.width > MAX_IMAGE_WIDTH:
+            picture.height = int(picture.height * MAX_IMAGE_WIDTH / picture.width)
+            picture.width = MAX_IMAGE_WIDTH
+    
     def fill_table(self, result_table, cell, style):
         """ Fills Docx tables with the actual results from the data
         
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+
+#Folder the compiled render plans of templates are saved in
+RENDER_PLAN_FOLDER = 'templates'
+#Changing how plans are compiled must change this so old plans aren't used
+RENDER_PLAN_VERSION = 1
+
+FIELD_PATTERN = re.compile(r'\<<Field:([^>>]+)\>>')
+COMMAND_PATTERN = re.compile(r'\<<([^>>]+)\>>')
+
+def template_hash(document_path):
+    """ Hashes the content of a template file
+
+    Args:
+        document_path (str): the path of the template doc file
+
+    Returns:
+        str: the hex sha256 hash of the file
+    """
+    digest = hashlib.sha256()
+    with open(document_path, 'rb') as document_file:
+        for block in iter(lambda: document_file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def element_path(element, root):
+    """ Gets the position of an XML element below a root element
+
+    Args:
+        element (lxml.etree._Element): the element
+        root (lxml.etree._Element): an ancestor of the element
+
+    Returns:
+        int[]: the index of each element in its parent from the root down
+    """
+    path = []
+    while element is not root:
+        parent = element.getparent()
+        path.insert(0, parent.index(element))
+        element = parent
+    return path
+
+def find_element(root, path):
+    """ Finds the XML element at a position from element_path
+
+    Args:
+        root (lxml.etree._Element): the root element the path starts from
+        path (int[]): the index of each element in its parent from the root down
+
+    Returns:
+        lxml.etree._Element: the element
+    """
+    element = root
+    for index in path:
+        element = element[index]
+    return element
+
+def compile_plan(document):
+    """ Compiles a template into the list of slots a render fills. Walks the
+    template the same way MicrosoftDocxParser.generate_report always has, the
+    body paragraphs, the header and footer paragraphs of each section and the
+    paragraphs of each cell of the top level tables
+
+    Args:
+        document (docx.Document): the template
+
+    Returns:
+        dict: the plan, with the keys
+            fields - a slot for each paragraph with <<Field:___>> placeholders,
+                the part of the paragraph (body, header or footer), the index of
+                the section for headers and footers, the path of the paragraph
+                element in the part and the names of the fields
+            cells - a slot for each table cell with <<command>> placeholders, the
+                paths of the table and cell elements in the body and the commands
+            table_commands - the commands of every table cell in the order
+                MicrosoftDocxParser.extract_table_commands has always listed them
+    """
+    body = document.element.body
+    fields = []
+    seen = set()
+
+    def add_fields(paragraphs, part, section, root):
+        for paragraph in paragraphs:
+            names = FIELD_PATTERN.findall(paragraph.text)
+            if len(names) == 0:
+                continue
+            path = element_path(paragraph._p, root)
+            #merged cells and linked headers are visited more than once
+            key = (id(root), tuple(path))
+            if key not in seen:
+                seen.add(key)
+                fields.append({'part': part, 'section': section, 'path': path, 'fields': names})
+
+    add_fields(document.paragraphs, 'body', None, body)
+    for index, section in enumerate(document.sections):
+        add_fields(section.header.paragraphs, 'header', index, section.header._element)
+        add_fields(section.footer.paragraphs, 'footer', index, section.footer._element)
+    for table in document.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                add_fields(cell.paragraphs, 'body', None, body)
+
+    cells = []
+    table_commands = []
+    seen_cells = set()
+    for table in document.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                commands = COMMAND_PATTERN.findall(cell.text)
+                table_commands += commands
+
+                #the fields are filled before the commands are found so they
+                #aren't commands
+                commands = COMMAND_PATTERN.findall(FIELD_PATTERN.sub('', cell.text))
+                path = element_path(cell._tc, body)
+                if len(commands) > 0 and tuple(path) not in seen_cells:
+                    seen_cells.add(tuple(path))
+                    cells.append({'table': element_path(table._tbl, body), 'cell': path, 'commands': commands})
+
+    return {'version': RENDER_PLAN_VERSION, 'fields': fields, 'cells': cells, 'table_commands': table_commands}
+
+class RenderPlans:
+    """ Compiled render plans of report templates. A template is compiled the
+    first time it is seen and the plan is saved on disk by the hash of the
+    template so later jobs using the template don't search it again.
+    """
+
+    def __init__(self, folder=None):
+        """ Init function for the plans
+
+        Args:
+            folder (str): the folder the plans are saved in, None to compile
+                the template every time
+
+        Attributes:
+            folder (str): the folder the plans are saved in
+        """
+        self.folder = folder
+
+    def get(self, document_path):
+        """ Gets the render plan of a template, compiling it if there isn't one.
+        The template is opened separately to compile it so the document being
+        rendered isn't changed by the search
+
+        Args:
+            document_path (str): the path of the template doc file
+
+        Returns:
+            dict: the plan, see compile_plan
+        """
+        key = template_hash(document_path) if self.folder is not None else None
+
+        plan = self.load(key)
+        if plan is None:
+            #docx is only needed when a template has to be compiled
+            from docx import Document
+            plan = compile_plan(Document(document_path))
+            self.save(key, plan)
+
+        return plan
+
+    def path(self, key):
+        """ Gets the path of a saved plan
+
+        Args:
+            key (str): the hash of the template
+
+        Returns:
+            str: the path of the plan file
+        """
+        return os.path.join(self.folder, key + '.json')
+
+    def load(self, key):
+        """ Loads a saved plan
+
+        Args:
+            key (str): the hash of the template
+
+        Returns:
+            dict: the plan, None if there is no plan for the template
+        """
+        if key is None:
+            return None
+
+        try:
+            with open(self.path(key), 'r') as plan_file:
+                plan = json.load(plan_file)
+        except (OSError, ValueError):
+            return None
+
+        if plan.get('version') != RENDER_PLAN_VERSION:
+            return None
+
+        return plan
+
+    def save(self, key, plan):
+        """ Saves a plan
+
+        Args:
+            key (str): the hash of the template
+            plan (dict): the plan
+        """
+        if key is None:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+
+        #write to a temporary file first so other processes never read half a plan
+        temp_path = "{0}.{1}.tmp".format(self.path(key), os.getpid())
+        with open(temp_path, 'w') as plan_file:
+            json.dump(plan, plan_file)
+        os.replace(temp_path, self.path(key))
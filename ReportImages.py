@@ -0,0 +1,282 @@
+import hashlib
+import io
+import json
+import os
+import threading
+
+#Folder the rendered images are cached in
+IMAGE_CACHE_FOLDER = 'images'
+#Most bytes of images kept in the cache folder, the least recently used are removed past it
+IMAGE_CACHE_BYTES = 200 * 1024 * 1024
+#Changing how images are drawn must change this so old cached images aren't used
+IMAGE_VERSION = 1
+#Resolution of the rendered images
+IMAGE_DPI = 150
+#Size in inches of each column and row of a table image
+TABLE_COLUMN_WIDTH = 1.6
+TABLE_ROW_HEIGHT = 0.35
+TABLE_FONT_SIZE = 9
+#Size in inches of a chart
+CHART_WIDTH = 7.0
+CHART_HEIGHT = 4.0
+#Width of the group of bars of each sample, as a fraction of the space for the sample
+CHART_GROUP_WIDTH = 0.8
+
+def image_key(kind, data):
+    """ Builds the cache key of an image from the data it is drawn from
+
+    Args:
+        kind (str): the kind of image, images of different kinds never share a key
+        data (object): the json serializable data the image is drawn from
+
+    Returns:
+        str: the hex sha256 hash of the data
+    """
+    content = json.dumps([IMAGE_VERSION, kind, data], default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def table_image_key(result_table):
+    """ Builds the cache key of the image of a results table
+
+    Args:
+        result_table (ResultTable): the table to draw
+
+    Returns:
+        str: the key, see image_key
+    """
+    data = [result_table.title,
+            [str(column) for column in result_table.table.columns],
+            result_table.table.values.tolist(),
+            result_table.column_widths]
+    return image_key('table', data)
+
+def figure_png(fig):
+    """ Saves a figure as a PNG and releases what it has drawn
+
+    Args:
+        fig (matplotlib.figure.Figure): the figure
+
+    Returns:
+        bytes: the PNG image
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=IMAGE_DPI, bbox_inches='tight')
+    #figures made without pyplot aren't held anywhere else, clearing them
+    #frees the artists straight away instead of waiting for the collector
+    fig.clear()
+    return buffer.getvalue()
+
+def render_table_image(result_table):
+    """ Draws a results table as a PNG image, run in a worker process
+
+    Args:
+        result_table (ResultTable): the table to draw
+
+    Returns:
+        bytes: the PNG image
+    """
+    fig = result_table.render_mpl_table(col_width=TABLE_COLUMN_WIDTH, row_height=TABLE_ROW_HEIGHT,
+                                        font_size=TABLE_FONT_SIZE)
+    if result_table.title is not None:
+        fig.suptitle(result_table.title, fontweight='bold')
+    return figure_png(fig)
+
+def render_chart_image(chart):
+    """ Draws a bar chart of the average and standard deviation of each test
+    for each sample as a PNG image, run in a worker process
+    
+    Args:
+        chart (dict): the chart data with the keys title (str), samples (str[]),
+            tests (str[]), averages and stds (float[][], a list for each test with
+            a value for each sample, None where the sample has no results) and
+            horizontal (bool, True to draw horizontal bars)
+            
+    Returns:
+        bytes: the PNG image
+    """
+    
+    #matplotlib is only needed for rendering so import it on first use
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    fig = Figure(figsize=(CHART_WIDTH, CHART_HEIGHT))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    
+    positions = np.arange(len(chart['samples']))
+    bar_width = CHART_GROUP_WIDTH / max(len(chart['tests']), 1)
+    
+    for index, test in enumerate(chart['tests']):
+        #samples without results have no bar
+        averages = np.array(chart['averages'][index], dtype=float)
+        stds = np.array(chart['stds'][index], dtype=float)
+        offsets = positions - CHART_GROUP_WIDTH / 2 + bar_width * (index + 0.5)
+        
+        if chart['horizontal']:
+            ax.barh(offsets, averages, bar_width, xerr=stds, capsize=3, label=test)
+        else:
+            ax.bar(offsets, averages, bar_width, yerr=stds, capsize=3, label=test)
+            
+    if chart['horizontal']:
+        ax.set_yticks(positions)
+        ax.set_yticklabels(chart['samples'])
+        ax.invert_yaxis()
+    else:
+        ax.set_xticks(positions)
+        ax.set_xticklabels(chart['samples'], rotation=45, ha='right')
+    
+    if len(chart['tests']) > 1:
+        ax.legend()
+    if chart['title'] is not None:
+        ax.set_title(chart['title'], fontweight='bold')
+        
+    return figure_png(fig)
+
+class ReportImages:
+    """ Renders the images inserted in a report. Images are cached on disk by
+    a hash of the data they are drawn from so an image is only drawn once for
+    the same data, across jobs and restarts of the background process.
+    The modified time of a cached image is updated when it is used and the
+    least recently used images are removed once the folder is over max_bytes.
+    """
+
+    def __init__(self, folder=None, max_bytes=IMAGE_CACHE_BYTES):
+        """ Init function for the images
+
+        Args:
+            folder (str): the folder the images are cached in, None to draw
+                every image without caching
+            max_bytes (int): the most bytes of images kept in the folder
+
+        Attributes:
+            folder (str): the folder the images are cached in
+            max_bytes (int): the most bytes of images kept in the folder
+            hits (int): the number of images found in the cache
+            misses (int): the number of images that were drawn
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, requests, executor=None):
+        """ Gets the image of each request, drawing the images that aren't cached
+
+        Args:
+            requests ((str, callable, object)[]): the key, the module level
+                function that draws the image and the data passed to it
+            executor (concurrent.futures.Executor): executor to draw the images
+                in, None to draw them in this process
+
+        Returns:
+            dict: the PNG image of each key
+        """
+        images = {}
+        missing = {}
+        for key, function, data in requests:
+            if key in images or key in missing:
+                continue
+
+            image = self.load(key)
+            if image is None:
+                missing[key] = (function, data)
+            else:
+                images[key] = image
+
+        self.hits += len(images)
+        self.misses += len(missing)
+
+        if executor is None:
+            drawn = {key: function(data) for key, (function, data) in missing.items()}
+        else:
+            futures = {key: executor.submit(function, data) for key, (function, data) in missing.items()}
+            drawn = {key: future.result() for key, future in futures.items()}
+
+        for key, image in drawn.items():
+            self.save(key, image)
+            images[key] = image
+
+        if len(drawn) > 0:
+            self.prune()
+
+        return images
+
+    def path(self, key):
+        """ Gets the path of a cached image
+
+        Args:
+            key (str): the key of the image
+
+        Returns:
+            str: the path of the PNG file
+        """
+        return os.path.join(self.folder, key + '.png')
+
+    def load(self, key):
+        """ Loads a cached image
+
+        Args:
+            key (str): the key of the image
+
+        Returns:
+            bytes: the PNG image, None if it isn't cached
+        """
+        if self.folder is None:
+            return None
+
+        try:
+            with open(self.path(key), 'rb') as image_file:
+                image = image_file.read()
+            #mark the image as recently used so it is the last to be pruned
+            os.utime(self.path(key))
+            return image
+        except OSError:
+            return None
+
+    def save(self, key, image):
+        """ Caches an image
+
+        Args:
+            key (str): the key of the image
+            image (bytes): the PNG image
+        """
+        if self.folder is None:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+
+        #write to a temporary file first so other processes never read half an image
+        temp_path = "{0}.{1}.{2}.tmp".format(self.path(key), os.getpid(), threading.get_ident())
+        with open(temp_path, 'wb') as image_file:
+            image_file.write(image)
+        os.replace(temp_path, self.path(key))
+
+    def prune(self):
+        """ Removes the least recently used images until the cached images fit
+        in max_bytes
+        """
+        if self.folder is None:
+            return
+
+        cached = []
+        total = 0
+        try:
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith('.png'):
+                    stat = entry.stat()
+                    cached.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        except OSError:
+            return
+
+        cached.sort()
+        for mtime, size, path in cached:
+            if total <= self.max_bytes:
+                break
+            #another process may have removed the image already
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -1,7 +1,4 @@
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import six
 
 class ResultTable:
     """ A table class that hold calcualted result information """
@@ -13,11 +10,17 @@ class ResultTable:
             title (str): A title for the table
             table (Pandas.DataFrame): the table that holds all the results
             column_widths (str[]): an array of widths to use for the columns
+            image (bytes): a PNG image of the table inserted in the report in
+                place of a Word table, None to insert a Word table
+            chart (dict): the data to draw a chart of the table from, see
+                ReportImages.render_chart_image, None if the table isn't a chart
             
         """
         self.title = None
         self.table = pd.DataFrame()
         self.column_widths = None;
+        self.image = None
+        self.chart = None
         
     def transpose(self):
         """ Changes the orientation of the table from vertical to horizontal """
@@ -73,6 +76,7 @@ class ResultTable:
             edge_color (str): The hex colour for the border
             bbox (int[]): The bounding box
             header_columns (int), number of head columns
+            ax (matplotlib.axes.Axes): the axes to draw in, None to create a new figure
           
         Returns:
             fig: The created image
@@ -80,12 +84,24 @@ class ResultTable:
             
         """
         
+        #matplotlib is only needed for rendering so import it on first use
+        import numpy as np
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        import six
+        
         data = self.table
         
         if ax is None:
             size = (np.array(data.shape[::-1]) + np.array([0, 1])) * np.array([col_width, row_height])
-            fig, ax = plt.subplots(figsize=size)
+            #the figure isn't made with pyplot so it isn't kept open by pyplot's
+            #figure manager and is freed when the caller is done with it
+            fig = Figure(figsize=size)
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
             ax.axis('off')
+        else:
+            fig = ax.figure
     
         mpl_table = ax.table(cellText=data.values, bbox=bbox, colLabels=data.columns, **kwargs)
     
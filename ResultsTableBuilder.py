@@ -1,11 +1,130 @@
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import pandas as pd
 from ResultTable import ResultTable
-from StatCalculator import compare_anova
+from StatCalculator import BETTER, WORSE
+from ReportImages import ReportImages, image_key, table_image_key, render_table_image, render_chart_image
+from TablePlan import TablePlan, TableContext, SAMPLES_TABLE, SUMMARY_TABLE, SAMPLE_RESULTS_TABLE, STAT_COMPARE_TABLE, STAT_MATRIX_TABLE, CHART_TABLE, IMAGE_TABLE
+
+#symbols in the cells of a StatMatrixTable for the row sample compared to the column sample
+BETTER_SYMBOL = '+'
+WORSE_SYMBOL = '-'
+NO_DIFFERENCE_SYMBOL = '='
+
+#executor options for building independent tables in parallel
+THREAD_EXECUTOR = 'thread'
+PROCESS_EXECUTOR = 'process'
+
+@functools.lru_cache(maxsize=1024)
+def parse_test_factors(tests):
+    """ Parses the ordinal categories of the tests of a table command, the same
+    tests are parsed once however many commands use them
+    
+    Args:
+        tests (tuple): the tests of the command, see ResultsTableBuilder.test_factors
+        
+    Returns:
+        (tuple, dict): the test names with the factors removed and the factors
+            of each ordinal test, see ResultsTableBuilder.test_factors
+    """
+    
+    test_factors = {}
+    mod_tests = []
+    
+    #loop through all tests and look for a | which indicates test has ordinal values
+    for test in tests:
+        
+        #this test has ordinal values
+        if '|' in test:
+            
+            #strip the test name as the first part
+            t_f = test.split('|')
+            
+            #add to the test name array
+            test_name = t_f[0]
+            
+            test_name = test_name.strip()
+            
+            mod_tests.append(test_name)
+            
+            if len(t_f) > 1:
+                
+                #strip the possible categorical values separated by : and
+                #remove white space
+                factors = [factor.strip() for factor in t_f[1].split(':')]
+          
+                #assign these values to a dict with the test name as key
+                test_factors[test_name] = factors
+        else:
+            #normal numerical values so just add the test name
+            mod_tests.append(test)    
+    
+    return tuple(mod_tests), test_factors
+
+def build_command_table(table_command, job, context):
+    """ Builds the table of a single command, used to build tables in an executor
+    
+    Args:
+        table_command (TableCommand): the parsed command
+        job (SRGJob): job object that contains all the producst and their data
+        context (TableContext): the intermediate results shared between tables
+        
+    Returns:
+        ResultTable: the table or array of tables, see ResultsTableBuilder.build_table
+    """
+    return ResultsTableBuilder().build_table(table_command, job, context)
+
+def build_command_tables(table_commands, job, context):
+    """ Builds the tables of several commands, used to build tables in a pool
+    of processes so the job and context are sent once for all the commands
+    
+    Args:
+        table_commands (TableCommand[]): the parsed commands
+        job (SRGJob): job object that contains all the producst and their data
+        context (TableContext): the intermediate results shared between tables
+        
+    Returns:
+        (ResultTable, Exception)[]: the table of each command, see
+            ResultsTableBuilder.build_table, or the error building it
+    """
+    builder = ResultsTableBuilder()
+    built = []
+    for table_command in table_commands:
+        #errors are returned so they are raised in plan order by the caller
+        try:
+            built.append((builder.build_table(table_command, job, context), None))
+        except Exception as ex:
+            built.append((None, ex))
+    return built
 
 class ResultsTableBuilder:
     """ Builds the table objects from the table commands and sample data"""
     
-    def __init__(self):
-        pass
+    def __init__(self, executor=None, max_workers=None, image_folder=None):
+        """ Init function for the builder
+        
+        Args:
+            executor: None to build the tables one after another, 'thread' or
+                'process' to build independent tables in a pool of threads or
+                processes, or a concurrent.futures.Executor to use
+            max_workers (int): the size of the pool created for 'thread' or 'process',
+                None for the concurrent.futures default
+            image_folder (str): the folder images of tables are cached in, None
+                to draw the images without caching
+                
+        Attributes:
+            executor: how the tables are built, see Args
+            max_workers (int): the size of the pool created for 'thread' or 'process'
+            images (ReportImages): draws and caches the images of tables
+        """
+        if executor not in (None, THREAD_EXECUTOR, PROCESS_EXECUTOR) and not isinstance(executor, concurrent.futures.Executor):
+            raise ValueError("Unknown table executor {0}".format(executor))
+        
+        self.executor = executor
+        self.max_workers = max_workers
+        self.images = ReportImages(image_folder)
     
     def create_tables(self, table_commands, job):
         """ Builds an array of tables, one for each table command. 
@@ -20,91 +139,191 @@ class ResultsTableBuilder:
             ResultTable[]: an array of result tables with all the calcualted data
         """
         
+        #compile the commands into a plan so each distinct table is only built once
+        plan = TablePlan(table_commands)
+        
+        #intermediate results such as averages and anova fits shared between the tables
+        context = TableContext(job)
+        
         #create a dictionary to hold each table object (table is a 2d array)        
         #the key is the command and the value is the table
-        tables = {}
-        
-        #loop through each command
-        for command in table_commands:
-            command_split = command.split(';')
-            
-            #must have at least 2 parts, the table type (index 0) and the fields (index 1)
-            if len(command_split) >= 2:
-                table_type = command_split[0]
+        built = {}
+        if self.executor is None:
+            for table_command in plan.commands:
+                built[table_command.key] = self.build_table(table_command, job, context)
+            self.render_images(plan, built, None)
+        else:
+            executor, owned = self.open_executor()
+            try:
+                #results every table reads are calculated before the tables
+                #are built so the workers don't each calculate them again
+                job.aggregate()
+                context.prepare_comparisons(plan.stat_comparisons(), executor)
                 
-                #build a table based on the table type
-                table = None
+                if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+                    results = self.build_in_processes(plan.commands, job, context, executor)
+                else:
+                    results = [executor.submit(build_command_table, table_command, job, context).result
+                               for table_command in plan.commands]
                 
-                #Samples table will build a table with a row for each sample
-                #along with the required details in each column
-                if table_type == 'SamplesTable':
-                    #part 3 = widths of columns
-                    widths = None
-                    if len(command_split) == 3:
-                        widths = command_split[2]
-                    table = self.build_sample_table(command_split[1], widths, job)    
-                    
-                #summary table will list all samples and the avergae result
-                #for each test
-                if table_type == "SummaryTable" and len(command_split) > 4:
-               
-                    #part 2 = sample name, part 3 = test names, 
-                    #part 4 = number precision, part 5 is orientation
-                    #part 6 = widths of columns
-                    widths = None
-                    if len(command_split) == 6:
-                        widths = command_split[5]
-                    table = self.build_summary_table(command_split[1], 
-                                                     command_split[2],
-                                                     command_split[3],
-                                                     command_split[4],
-                                                     widths,
-                                                     job)              
-                    
-                #SampleResultsTable provides a separate table for each sample
-                #with the result for each replicate of each test, std and average
-                if table_type == "SampleResultsTable" and len(command_split) > 4:
-                    
-                    #part 2 = sample name, part 3 = test names, 
-                    #part 4 = number precision, part 5 is orientation
-                    #part 6 = widths of columns
-                    widths = None
-                    if len(command_split) == 6:
-                        widths = command_split[5]
-                    table = self.build_sample_results_table(command_split[1], 
-                                                     command_split[2],
-                                                     command_split[3],
-                                                     command_split[4],
-                                                     widths,
-                                                     job)  
-                #StatCompareTable provides a separate table for each sample
-                #with the result of a statistical comparison with every other sample in the set
-                #table will show which samples are statistically better tha, 
-                #no stat difference to and worse than.
-                if table_type == "StatCompareTable" and len(command_split) == 4:
-                            
-                    #part 2 = sample name, 
-                    #part 3 = comparing samples name (might be better to abreviate names here) 
-                    #part 4 = the name of the test to run the comparisons on
-                    #part 5 = widths of columns
-                    widths = None
-                    if len(command_split) == 5:
-                        widths = command_split[4]
-                    table = self.build_stat_compare_table(command_split[1], 
-                                                     command_split[2],
-                                                     command_split[3],
-                                                     widths,
-                                                     job)  
-
+                #collect in plan order so the output and the first error
+                #raised are the same as building the tables one after another
+                for table_command, result in zip(plan.commands, results):
+                    built[table_command.key] = result()
                 
-                if table is not None:
-                        tables[command] = table
-               
+                #matplotlib isn't thread safe so images are only drawn in the
+                #executor when it is a pool of processes
+                if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+                    self.render_images(plan, built, executor)
+                else:
+                    self.render_images(plan, built, None)
+            finally:
+                if owned:
+                    executor.shutdown(wait=True, cancel_futures=True)
+        
+        #every command in the template gets its table, including duplicates
+        tables = {}
+        for command, table_command in plan.aliases.items():
+            if built[table_command.key] is not None:
+                tables[command] = built[table_command.key]
                         
-                    
-                    
         return tables
     
+    def build_in_processes(self, table_commands, job, context, executor):
+        """ Builds the tables in a pool of processes. The commands are split
+        into one batch per process so the job and context are pickled once for
+        each batch rather than for every command
+        
+        Args:
+            table_commands (TableCommand[]): the parsed commands
+            job (SRGJob): job object that contains all the producst and their data
+            context (TableContext): the intermediate results shared between tables
+            executor (concurrent.futures.ProcessPoolExecutor): the pool
+            
+        Returns:
+            callable[]: for each command a function returning its table or
+                raising the error building it
+        """
+        batches = min(self.max_workers or os.cpu_count() or 1, len(table_commands))
+        
+        #the commands are dealt out in turn to spread the slow tables across the batches
+        futures = [executor.submit(build_command_tables, table_commands[start::batches], job, context)
+                   for start in range(batches)]
+        
+        def result(batch, index):
+            def get():
+                table, error = futures[batch].result()[index]
+                if error is not None:
+                    raise error
+                return table
+            return get
+        
+        return [result(position % batches, position // batches) for position in range(len(table_commands))]
+    
+    def open_executor(self):
+        """ Gets the executor to build the tables in
+        
+        Returns:
+            (concurrent.futures.Executor, bool): the executor and True if it was
+                created here and needs shutting down after the tables are built
+        """
+        if isinstance(self.executor, concurrent.futures.Executor):
+            return self.executor, False
+        
+        #daemon processes such as the SRGWorkerPool workers can't start
+        #processes of their own so they build tables in threads instead
+        if self.executor == PROCESS_EXECUTOR and not multiprocessing.current_process().daemon:
+            from SRGWorkerPool import worker_context
+            return concurrent.futures.ProcessPoolExecutor(self.max_workers, mp_context=worker_context()), True
+        
+        return concurrent.futures.ThreadPoolExecutor(self.max_workers), True
+    
+    def render_images(self, plan, built, executor):
+        """ Draws the images of the tables built for ImageTable and ChartTable commands
+        
+        Args:
+            plan (TablePlan): the plan the tables were built from
+            built (dict): the table built for each planned command by its key
+            executor (concurrent.futures.Executor): executor to draw the images
+                in, None to draw them in this process
+        """
+        image_tables = []
+        requests = []
+        for table_command in plan.commands:
+            table = built[table_command.key]
+            if table is None:
+                continue
+            
+            if table_command.table_type == IMAGE_TABLE:
+                for inner_table in (table if type(table) == list else [table]):
+                    image_tables.append(inner_table)
+                    requests.append((table_image_key(inner_table), render_table_image, inner_table))
+                    
+            elif table_command.table_type == CHART_TABLE:
+                image_tables.append(table)
+                requests.append((image_key('chart', table.chart), render_chart_image, table.chart))
+            
+        if len(requests) == 0:
+            return
+        
+        images = self.images.render(requests, executor)
+        
+        for table, request in zip(image_tables, requests):
+            table.image = images[request[0]]
+    
+    def build_table(self, table_command, job, context=None):
+        """ Builds the table for a single parsed table command
+        
+        Args:
+            table_command (TableCommand): the parsed command
+            job (SRGJob): job object that contains all the producst and their data
+            context (TableContext): the intermediate results shared between tables
+            
+        Returns:
+            ResultTable: the table, or an array of tables for the table types that
+                have a table per sample
+        """
+        
+        #Samples table will build a table with a row for each sample
+        #along with the required details in each column
+        if table_command.table_type == SAMPLES_TABLE:
+            return self.build_sample_table(*table_command.args, job)
+            
+        #summary table will list all samples and the avergae result
+        #for each test
+        if table_command.table_type == SUMMARY_TABLE:
+            return self.build_summary_table(*table_command.args, job, context)
+            
+        #SampleResultsTable provides a separate table for each sample
+        #with the result for each replicate of each test, std and average
+        if table_command.table_type == SAMPLE_RESULTS_TABLE:
+            return self.build_sample_results_table(*table_command.args, job, context)
+            
+        #StatCompareTable provides a separate table for each sample
+        #with the result of a statistical comparison with every other sample in the set
+        #table will show which samples are statistically better tha, 
+        #no stat difference to and worse than.
+        if table_command.table_type == STAT_COMPARE_TABLE:
+            return self.build_stat_compare_table(*table_command.args, job, context)
+        
+        #ImageTable builds the tables of the command it wraps, they are
+        #drawn as images once every table is built
+        if table_command.table_type == IMAGE_TABLE:
+            return self.build_table(table_command.args[0], job, context)
+        
+        #ChartTable provides a bar chart of the average and standard
+        #deviation of each test for each sample
+        if table_command.table_type == CHART_TABLE:
+            return self.build_chart_table(*table_command.args, job, context)
+        
+        #StatMatrixTable provides one table comparing every sample with every
+        #other sample, each cell shows if the row sample is statistically
+        #better than, the same as or worse than the column sample
+        if table_command.table_type == STAT_MATRIX_TABLE:
+            return self.build_stat_matrix_table(*table_command.args, job, context)
+        
+        return None
+    
     
     
     def build_sample_table(self, fields_string, widths, job):
@@ -158,7 +377,7 @@ class ResultsTableBuilder:
         return table
     
     
-    def build_summary_table(self, sample_name, tests, precision, orientation, widths, job):
+    def build_summary_table(self, sample_name, tests, precision, orientation, widths, job, context=None):
         """ The summary table lists each sample on a new line and the average
         result for each test that is specified. 
         
@@ -171,11 +390,15 @@ class ResultsTableBuilder:
                 samples horizontally
             widths (str): the widths string that specifies the column widths
             job (SRGJob): the job object that contains all the samples and thier data
+            context (TableContext): the intermediate results shared between tables
             
         Returns:
             ResultTable: table object containing the  data for the table   
         """
         
+        if context is None:
+            context = TableContext(job)
+        
         #The fields are separated by a comma        
         tests = tests.split(',')
         
@@ -222,11 +445,11 @@ class ResultsTableBuilder:
   
                     #get the average result of all the tests
                     if test in factor_values: #ordinal values          
-                        result = sample.result_average_ordinal(test, factor_values)
+                        result = context.ordinal_average(sample, test, factor_values)
                         val = factor_values[test][result]
                         
                     else: #numerical
-                        result = sample.result_average(test)                    
+                        result = context.average(sample, test)                    
                         #format this as a string to the correct precision
                         val = "{0}".format(round(result, report_precision))
                         #check if this is a percentage and add the percent sign
@@ -249,7 +472,7 @@ class ResultsTableBuilder:
         #return the final table
         return table
     
-    def build_sample_results_table(self, sample_name, tests, precision, orientation, widths, job):
+    def build_sample_results_table(self, sample_name, tests, precision, orientation, widths, job, context=None):
         """ The summary table lists each sample on a new line and the average
         result for each test that is specified. 
         
@@ -262,12 +485,16 @@ class ResultsTableBuilder:
                 tests horizontally
             widths (str): the widths string that specifies the column widths
             job (SRGJob): the job object that contains all the samples and thier data
+            context (TableContext): the intermediate results shared between tables
             
         Returns:
             ResultTable[]: an array of table objects containing the 
             data for the table. there is a table object for each sample   
         """
         
+        if context is None:
+            context = TableContext(job)
+        
         #this will return an array of tables, one for each sample    
         tables = []
         
@@ -337,7 +564,7 @@ class ResultsTableBuilder:
                     
                     #get the average result of all the tests
                     if test in factor_values: #ordinal values                  
-                        result = sample.result_average_ordinal(test, factor_values)
+                        result = context.ordinal_average(sample, test, factor_values)
                         std_val = "" #no standard deviation for these tests
                         result_val = "{0}".format(round(result, report_precision))
                     #non numerical results without factors won't have an everage or std
@@ -345,8 +572,8 @@ class ResultsTableBuilder:
                         result_val = "N/A"
                         std_val = "N/A"
                     else: #numerical
-                        result = sample.result_average(test)                        
-                        std = sample.result_std(test)
+                        result = context.average(sample, test)                        
+                        std = context.std(sample, test)
                         #format this as a string to the correct precision
                         std_val = "{0}".format(round(std, report_precision))
                         #format this as a string to the correct precision
@@ -379,7 +606,71 @@ class ResultsTableBuilder:
         #return the final array of samples tables
         return tables
     
-    def build_stat_compare_table(self, sample_name, comparing_sample_name, test, widths, job):
+    def build_chart_table(self, sample_name, tests, orientation, job, context=None):
+        """ The chart table is a bar chart of the average result of each test for
+        each sample with the standard deviation as error bars. It is inserted in
+        the report as an image
+        
+        Args:
+            sample_name (str): the label of each sample - full name of sample
+            tests (str): Comma seperated list of tests to include, ordinal
+                tests are left out as they have no average to draw
+            orientation (str): Horizontal-draws the bars horizontally, otherwise
+                the bars are vertical
+            job (SRGJob): the job object that contains all the samples and thier data
+            context (TableContext): the intermediate results shared between tables
+            
+        Returns:
+            ResultTable: table object with the average and standard deviation
+            of each sample and test, and the data of the chart
+        """
+        
+        if context is None:
+            context = TableContext(job)
+        
+        #The fields are separated by a comma        
+        tests, factor_values = self.test_factors(tests.split(','))
+        tests = [test.strip() for test in tests if test.strip() not in factor_values]
+        
+        #sample string can have a number of sample details included with each 
+        #detail separated by a +
+        name_fields = sample_name.split('+')
+        sample_names = [sample.build_name(name_fields) for sample in job.samples]
+        
+        table = ResultTable()
+        table.title = ", ".join(tests)
+        table.set_columns(["Sample", "Test", "Average", "Std"])
+        
+        averages = []
+        stds = []
+        for test in tests:
+            test_averages = []
+            test_stds = []
+            for sample, name in zip(job.samples, sample_names):
+                
+                #no bar if the sample has no results for the test
+                if context.stats(sample, test) is None:
+                    test_averages.append(None)
+                    test_stds.append(None)
+                    continue
+                
+                test_averages.append(context.average(sample, test))
+                test_stds.append(context.std(sample, test))
+                table.add_row([name, test, test_averages[-1], test_stds[-1]])
+                
+            averages.append(test_averages)
+            stds.append(test_stds)
+        
+        table.chart = {'title': table.title,
+                       'samples': sample_names,
+                       'tests': tests,
+                       'averages': averages,
+                       'stds': stds,
+                       'horizontal': orientation == "Horizontal"}
+        
+        return table
+    
+    def build_stat_compare_table(self, sample_name, comparing_sample_name, test, widths, job, context=None):
         """ The summary table lists each sample on a new line and the average
         result for each test that is specified. 
         
@@ -390,11 +681,16 @@ class ResultsTableBuilder:
             test: The name of the test to run the comparisons on
             widths (str): the widths string that specifies the column widths
             job (SRGJob): the job object that contains all the samples and thier data
+            context (TableContext): the intermediate results shared between tables
             
         Returns:
             ResultTable[]: an array of table objects containing the 
             data for the table. There is a table object for each sample   
         """
+        
+        if context is None:
+            context = TableContext(job)
+        
         test = test.strip()
         
         requires_flip = '(FLIP)' in test.upper()
@@ -428,10 +724,8 @@ class ResultsTableBuilder:
             
             #calculate the statistical comparisons of this product compared
             #to each other product in the set
-            all_results = job.get_all_results(compare_name_fields, test)
-            
             try:
-                better_than, no_diff, worse_than = compare_anova(all_results, sample.build_name(compare_name_fields))
+                better_than, no_diff, worse_than = context.compare(compare_name_fields, test, sample.build_name(compare_name_fields))
                 if requires_flip:
                     worse_than, better_than = better_than, worse_than
             except ValueError:     
@@ -494,6 +788,63 @@ class ResultsTableBuilder:
         #return the final array of samples tables
         return tables
     
+    def build_stat_matrix_table(self, sample_name, test, widths, job, context=None):
+        """ The stat matrix table compares every sample with every other sample in
+        a single table. There is a row and a column for each sample and each cell
+        shows if the row sample is statistically better than (+), no different
+        to (=) or worse than (-) the column sample
+        
+        Args:
+            sample_name (str): Sample details field with the sample name, ideally
+                use an abreviated name here
+            test: The name of the test to run the comparisons on
+            widths (str): the widths string that specifies the column widths
+            job (SRGJob): the job object that contains all the samples and thier data
+            context (TableContext): the intermediate results shared between tables
+            
+        Returns:
+            ResultTable: table object containing the data for the table
+        """
+        
+        if context is None:
+            context = TableContext(job)
+        
+        test = test.strip()
+        
+        requires_flip = '(FLIP)' in test.upper()
+        test = test.replace('(flip)','')
+        test = test.replace('(FLIP)','')
+        test = test.replace('(Flip)','')
+        
+        name_fields = sample_name.split('+')
+        
+        try:
+            sample_names, matrix = context.compare_matrix(name_fields, test)
+        except ValueError:     
+            raise ValueError("{0} error in values for ANOVA tables!".format(test))
+        
+        if requires_flip:
+            matrix = -matrix
+        
+        symbols = {BETTER: BETTER_SYMBOL, WORSE: WORSE_SYMBOL}
+        
+        #one row for each sample with the symbols against each other sample
+        rows = []
+        for index, comparisons in enumerate(matrix.tolist()):
+            row = [sample_names[index]] + [symbols.get(comparison, NO_DIFFERENCE_SYMBOL) for comparison in comparisons]
+            #no need to compare with itself
+            row[index + 1] = ""
+            rows.append(row)
+        
+        table = ResultTable()
+        if widths is not None:
+            table.column_widths = widths.split(',')
+        
+        table.title = test
+        table.table = pd.DataFrame(rows, columns=[""] + list(sample_names), dtype=object)
+        
+        return table
+    
     def test_factors(self, tests):
         """ Ordinal results need to get values for average calculations
         This function extracts the possible factors out of the table command and assigns
@@ -510,41 +861,10 @@ class ResultsTableBuilder:
             
         """
         
-        test_factors = {}
-        mod_tests = []
+        #the parse is cached so the results are copied before they are returned
+        mod_tests, test_factors = parse_test_factors(tuple(tests))
         
-        #loop through all tests and look for a | which indicates test has ordinal values
-        for test in tests:
-            
-            #this test has ordinal values
-            if '|' in test:
-                
-                #strip the test name as the first part
-                t_f = test.split('|')
-                
-                #add to the test name array
-                test_name = t_f[0]
-                
-                test_name = test_name.strip()
-                
-                mod_tests.append(test_name)
-                
-                if len(t_f) > 1:
-                    
-                    #strip the possible categorical values separated by :
-                    factors = t_f[1].split(':')    
-                    
-                    #remove white space
-                    for factor in factors:
-                        factor = factor.strip()
-              
-                    #assign these values to a dict with the test name as key
-                    test_factors[test_name] = factors
-            else:
-                #normal numerical values so just add the test name
-                mod_tests.append(test)    
-        
-        return mod_tests, test_factors     
+        return list(mod_tests), {test: list(factors) for test, factors in test_factors.items()}
         
         
                         
@@ -1,8 +1,8 @@
-import sys, os, glob
+import sys, os
+import SRGSession
 
-
-from SRGController import SRGController
-from SRGConsoleView import SRGConsoleView
+#The controller, view and profiler are imported inside the commands that use them
+#so 'SRG.py stop' doesn't pay for importing the google api, pandas and statsmodels
 
 def main():
     """ Main Entry point to program
@@ -10,21 +10,16 @@ def main():
     For linux use 'SRG.py start &'
     """
     
-    #full path for any session.loc files
-    #session.lock files are what keep the background threads running
-    #removing a session.lock file with terminate the background thread loop
-    #session.lock files are in the format session-{sessionId}.lock
-    session_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "session-*")
-        
     if 'start' in sys.argv:
         #Can only have one session running at a time
-        #remove any other session.lock files present to close
-        #the old threads            
-        for filename in glob.glob(session_path):
+        #signal any running background process to stop first
+        if SRGSession.session_pid() is not None:
             print("Shutting down open SRG background process ...")
-            #delete the session.lock file which will stop the loop   
-            os.remove(filename) 
+            SRGSession.stop_session()
 
+        from SRGController import SRGController
+        from SRGConsoleView import SRGConsoleView
+        
         #create the view and controller
         view = SRGConsoleView()
         controller = SRGController(view)
@@ -34,20 +29,60 @@ def main():
         
     elif 'stop' in sys.argv:
         
-        #delete the session.lock file which will stop the loop  
-        sessions = glob.glob(session_path)
-        
-        #delete all session files 
-        if len(sessions) > 0:
+        #SIGTERM the process in the pidfile, it stops once its current job is done
+        if SRGSession.session_pid() is not None:
             print("Shutting down SRG background process ...")
-            for filename in sessions:
-                os.remove(filename) 
-        else:
+        
+        if not SRGSession.stop_session():
             print("No SRG sessions running.")
         
+    elif 'batch' in sys.argv:
+        
+        #SRG.py batch <input-dir> <template> <out-dir> [processes]
+        args = sys.argv[sys.argv.index('batch') + 1:]
+        if len(args) < 3:
+            print("Usage: SRG.py batch <input-dir> <template> <out-dir> [processes]")
+            return
+        
+        processes = None
+        if len(args) > 3:
+            try:
+                processes = int(args[3])
+            except ValueError:
+                print("Number of processes must be an integer.")
+                return
+        
+        from SRGBatch import SRGBatch
+        from ReportImages import IMAGE_CACHE_FOLDER
+        from RenderPlan import RENDER_PLAN_FOLDER
+        
+        prog_path = os.path.dirname(os.path.realpath(__file__))
+        SRGBatch(processes, os.path.join(prog_path, IMAGE_CACHE_FOLDER),
+                 os.path.join(prog_path, RENDER_PLAN_FOLDER)).run(args[0], args[1], args[2])
+        
+    elif 'profile' in sys.argv:
+        
+        from SRGProfiler import PROFILE_CONTROL_FILE, DEFAULT_PROFILE_JOBS
+        
+        #number of jobs to profile can be given after the profile command
+        count = DEFAULT_PROFILE_JOBS
+        index = sys.argv.index('profile')
+        if len(sys.argv) > index + 1:
+            try:
+                count = int(sys.argv[index + 1])
+            except ValueError:
+                print("Number of jobs to profile must be an integer.")
+                return
+        
+        #the running background process picks up the control file before its next job
+        f=open(os.path.join(os.path.dirname(os.path.realpath(__file__)), PROFILE_CONTROL_FILE), "w+")
+        f.write(str(count))
+        f.close()
+        
+        print("Profiling the next {0} SRG jobs.".format(count))
     
     else:
-        print("GUI not currently supported.\nRun 'SRG.py start' to start the background process or 'SRG.py stop' to stop the process.")
+        print("GUI not currently supported.\nRun 'SRG.py start' to start the background process, 'SRG.py stop' to stop the process, 'SRG.py profile N' to profile the next N jobs or 'SRG.py batch <input-dir> <template> <out-dir>' to build the reports of a folder of workbooks.")
     
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+import os
+import shutil
+import time
+
+#Workbooks the batch command picks up from the input folder
+BATCH_EXTENSIONS = ('.xlsx', '.json')
+
+def batch_inputs(input_dir):
+    """ Gets the workbooks in a folder to run as a batch
+
+    Args:
+        input_dir (str): the folder of workbooks
+
+    Returns:
+        str[]: the paths of the workbooks sorted by name
+    """
+    return [os.path.join(input_dir, name) for name in sorted(os.listdir(input_dir))
+            if os.path.splitext(name)[1].lower() in BATCH_EXTENSIONS]
+
+def run_batch_job(input_path, template_path, out_path, table_commands, image_folder=None, plan_folder=None):
+    """ Builds the report of one workbook, run in a worker process
+
+    Args:
+        input_path (str): the path of the workbook
+        template_path (str): the path of the report template
+        out_path (str): the path to save the report to
+        table_commands (str[]): the table commands extracted from the template
+        image_folder (str): the folder images of tables are cached in
+        plan_folder (str): the folder compiled render plans are saved in
+
+    Returns:
+        dict: the seconds taken to parse the workbook, build the tables and
+            render the report
+    """
+    from LocalJobParser import LocalJobParser
+    from ResultsTableBuilder import ResultsTableBuilder
+    from MicrosoftDocxParser import MicrosoftDocxParser
+
+    start = time.perf_counter()
+    job = LocalJobParser().parse_file(input_path)
+    if job is None:
+        raise ValueError("No samples found")
+    parsed = time.perf_counter()
+
+    tables = ResultsTableBuilder(image_folder=image_folder).create_tables(table_commands, job)
+    built = time.perf_counter()
+
+    shutil.copyfile(template_path, out_path)
+    MicrosoftDocxParser().generate_report(out_path, job.fields, tables, plan_folder)
+    rendered = time.perf_counter()
+
+    return {'parse': parsed - start, 'tables': built - parsed, 'render': rendered - built}
+
+class SRGBatch:
+    """ Builds the reports of a folder of workbooks offline, without google
+    drive, across a pool of worker processes """
+
+    def __init__(self, processes=None, image_folder=None, plan_folder=None):
+        """ Init function for the batch
+
+        Args:
+            processes (int): the number of worker processes, None for one per CPU
+                and 0 or 1 to build the reports in this process
+            image_folder (str): the folder images of tables are cached in
+            plan_folder (str): the folder compiled render plans are saved in
+
+        Attributes:
+            processes (int): the number of worker processes
+            image_folder (str): the folder images of tables are cached in
+            plan_folder (str): the folder compiled render plans are saved in
+        """
+        self.processes = os.cpu_count() if processes is None else processes
+        self.image_folder = image_folder
+        self.plan_folder = plan_folder
+
+    def run(self, input_dir, template_path, out_dir):
+        """ Builds a report for each workbook in the input folder, printing the
+        time taken for each job as it finishes and the throughput at the end
+
+        Args:
+            input_dir (str): the folder of workbooks
+            template_path (str): the path of the report template
+            out_dir (str): the folder to save the reports to, a report has the
+                name of its workbook
+
+        Returns:
+            dict[]: the result of each job with the keys input, output, error
+                (None if the report was built) and the stage times
+        """
+        from MicrosoftDocxParser import MicrosoftDocxParser
+
+        inputs = batch_inputs(input_dir)
+        os.makedirs(out_dir, exist_ok=True)
+
+        #every report uses the same template so the commands are only extracted
+        #once, which also compiles the render plan before the workers need it
+        table_commands = MicrosoftDocxParser().extract_table_commands(template_path, self.plan_folder)
+
+        start = time.perf_counter()
+
+        pool = None
+        if self.processes > 1 and len(inputs) > 1:
+            from SRGWorkerPool import SRGWorkerPool
+            pool = SRGWorkerPool(min(self.processes, len(inputs)))
+
+        try:
+            pending = []
+            for input_path in inputs:
+                out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(input_path))[0] + '.docx')
+                args = (input_path, template_path, out_path, table_commands, self.image_folder, self.plan_folder)
+                pending.append((input_path, out_path, args, pool.submit(run_batch_job, *args) if pool is not None else None))
+
+            results = []
+            for input_path, out_path, args, async_result in pending:
+                result = {'input': input_path, 'output': out_path, 'error': None}
+                try:
+                    if async_result is None:
+                        result.update(run_batch_job(*args))
+                    else:
+                        result.update(async_result.get())
+                except Exception as ex:
+                    result['error'] = "{0}: {1}".format(type(ex).__name__, ex)
+
+                results.append(result)
+                print(self.job_summary(result))
+        finally:
+            if pool is not None:
+                pool.close()
+
+        print(self.batch_summary(results, time.perf_counter() - start))
+
+        return results
+
+    def job_summary(self, result):
+        """ Formats the time taken for a job
+
+        Args:
+            result (dict): the result of the job, see run
+
+        Returns:
+            str: the summary line
+        """
+        name = os.path.basename(result['input'])
+        if result['error'] is not None:
+            return "{0}: FAILED {1}".format(name, result['error'])
+
+        total = result['parse'] + result['tables'] + result['render']
+        return "{0}: {1:.2f}s (parse {2:.2f}s, tables {3:.2f}s, render {4:.2f}s)".format(
+            name, total, result['parse'], result['tables'], result['render'])
+
+    def batch_summary(self, results, elapsed):
+        """ Formats the throughput of a batch
+
+        Args:
+            results (dict[]): the result of each job, see run
+            elapsed (float): the seconds taken for the whole batch
+
+        Returns:
+            str: the summary line
+        """
+        built = [result for result in results if result['error'] is None]
+        job_seconds = sum(result['parse'] + result['tables'] + result['render'] for result in built)
+        throughput = len(built) / elapsed * 60 if elapsed > 0 else 0
+
+        return ("{0} of {1} reports built in {2:.1f}s, {3:.1f} reports per minute "
+                "({4:.1f}s of job time across {5} processes)").format(
+            len(built), len(results), elapsed, throughput, job_seconds, max(self.processes, 1))
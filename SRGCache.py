@@ -0,0 +1,115 @@
+import collections
+import pickle
+import threading
+
+class SRGCache:
+    """ Least recently used cache bounded by the total size of its values in
+    bytes. The size of a value is taken as the length of its pickle, which is
+    a good estimate for DataFrames and the other objects a job holds.
+    """
+
+    def __init__(self, max_bytes):
+        """ Init function for the cache
+
+        Args:
+            max_bytes (int): the maximum total size of the cached values
+
+        Attributes:
+            max_bytes (int): the maximum total size of the cached values
+            size (int): the current total size of the cached values
+            hits (int): the number of gets that found a value
+            misses (int): the number of gets that didn't find a value
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """ Gets a cached value, marking it as the most recently used
+
+        Args:
+            key (hashable): the key of the value
+            default (object): returned if the key isn't cached
+
+        Returns:
+            object: the cached value or the default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """ Caches a value, removing the least recently used values until the
+        cache fits in max_bytes. Values bigger than max_bytes aren't cached
+
+        Args:
+            key (hashable): the key of the value
+            value (object): the value to cache, must be picklable if no size is given
+            size (int): the size of the value in bytes, measured if None
+
+        Returns:
+            bool: True if the value was cached
+        """
+        if size is None:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+            if size > self.max_bytes:
+                return False
+
+            self._entries[key] = (value, size)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.size -= evicted[1]
+
+        return True
+
+    def remove(self, key):
+        """ Removes a value from the cache
+
+        Args:
+            key (hashable): the key of the value
+        """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+    def clear(self):
+        """ Removes every value from the cache """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def hit_rate(self):
+        """ Gets the fraction of gets that found a value
+
+        Returns:
+            float: the hit rate, 0 if there have been no gets
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return self.hits / total if total > 0 else 0
@@ -1,44 +1,201 @@
 import datetime
 import os
+import queue
+import threading
+import atexit
+
+#Size in bytes activity.log and errors.log are rotated at
+MAX_LOG_BYTES = 5 * 1024 * 1024
+#Number of rotated logs to keep eg. activity.log.1 to activity.log.3
+LOG_BACKUPS = 3
+
+ACTIVITY_LOG = "activity.log"
+ERROR_LOG = "errors.log"
+STATUS_FILE = "status.txt"
 
 class SRGConsoleView:
-    """ Basic View for displaying messages on the console """
-    
-    def __init__(self):
-        pass
-    
-    
-    def display_message(self, message):   
-        try:
-            f=open(os.path.join(os.path.dirname(__file__), "activity.log"), "a+")
-            f.write(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + ": " +  message + "\n")
-            f.close()
-        except PermissionError:
-            self.display_error("Can't access activity.log")
-            return False
-        return True
-        
-        
+    """ Basic View for displaying messages on the console
+
+    Messages are timestamped on the calling thread and queued. A background
+    writer thread batches the queued messages into the log files, keeping the
+    files open between writes so display calls never block on file I/O and
+    are safe to make from several threads.
+    """
+
+    def __init__(self, log_path=None):
+        """ Init function for the view
+
+        Args:
+            log_path (str): the folder the log files are written in, defaults
+                to the program folder
+
+        Attributes:
+            log_path (str): the folder the log files are written in
+        """
+        if log_path is None:
+            log_path = os.path.dirname(os.path.realpath(__file__))
+
+        self.log_path = log_path
+        self._queue = queue.Queue()
+        self._handles = {}
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._write_loop, name="SRGConsoleViewWriter", daemon=True)
+        self._writer.start()
+
+        #make sure queued messages are written when the program exits
+        atexit.register(self.close)
+
+
+    def display_message(self, message):
+        return self._put(ACTIVITY_LOG, message)
+
+
     def display_status(self, status):
-        try:
-            f=open(os.path.join(os.path.dirname(__file__), "status.txt"), "w+")
-            f.write(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + ": " + status + "\n")
-            f.close()
-        except PermissionError:
-            self.display_error("Can't access status.txt")
-            return False
-        return True
+        return self._put(STATUS_FILE, status)
 
     def display_error(self, message):
-        try:
-            f=open(os.path.join(os.path.dirname(__file__), "errors.log"), "a+")
-            f.write(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + ": " +  message + "\n")
+        return self._put(ERROR_LOG, message)
+
+    def flush(self):
+        """ Blocks until every queued message has been written """
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """ Writes any queued messages, stops the writer thread and closes the
+        log files. Messages displayed after closing are dropped
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+        for f in self._handles.values():
             f.close()
-        except PermissionError:
-            print("Can't access error.log")
+        self._handles = {}
+
+    def _put(self, filename, message):
+        """ Timestamps the message and queues it for the writer thread
+
+        Args:
+            filename (str): the log file to write the message to
+            message (str): the message to write
+
+        Returns:
+            bool: True if the message was queued
+        """
+        if self._closed:
             return False
+
+        self._queue.put((filename, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + ": " + message + "\n"))
         return True
 
+    def _write_loop(self):
+        """ Writer thread loop, waits for a message then writes it along with
+        every other message queued since in one batch
+        """
 
-        
-        
\ No newline at end of file
+        running = True
+        while running:
+            batch = [self._queue.get()]
+
+            #drain everything else that is already queued
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                #group the lines by file keeping their order
+                lines = {}
+                for item in batch:
+                    if item is None:
+                        running = False
+                        continue
+                    filename, line = item
+                    lines.setdefault(filename, []).append(line)
+
+                for filename, file_lines in lines.items():
+                    #an error writing one file mustn't stop the writer thread
+                    #or every later message would be lost
+                    try:
+                        if filename == STATUS_FILE:
+                            #only the latest status is kept
+                            self._write_status(file_lines[-1])
+                        else:
+                            self._write_log(filename, "".join(file_lines))
+                    except Exception as e:
+                        print("Can't write {0}: {1}".format(filename, e))
+            finally:
+                #flush waits on every message being marked done
+                for item in batch:
+                    self._queue.task_done()
+
+    def _write_log(self, filename, text):
+        """ Appends text to a log file, rotating the file when it is too big
+
+        Args:
+            filename (str): the name of the log file
+            text (str): the text to append
+        """
+        try:
+            f = self._handles.get(filename)
+            if f is None:
+                f = open(os.path.join(self.log_path, filename), "a+", encoding='utf-8')
+                self._handles[filename] = f
+
+            if f.tell() > 0 and f.tell() + len(text.encode('utf-8')) > MAX_LOG_BYTES:
+                f = self._rotate(filename)
+
+            f.write(text)
+            f.flush()
+        except OSError:
+            self._handles.pop(filename, None)
+            if filename == ERROR_LOG:
+                print("Can't access " + ERROR_LOG)
+            else:
+                self._write_log(ERROR_LOG, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + ": Can't access " + filename + "\n")
+
+    def _rotate(self, filename):
+        """ Closes the log and renames it to filename.1, shifting older logs up
+        one and deleting the oldest
+
+        Args:
+            filename (str): the name of the log file
+
+        Returns:
+            file: the handle of the new empty log file
+        """
+        self._handles.pop(filename).close()
+
+        path = os.path.join(self.log_path, filename)
+        for index in range(LOG_BACKUPS - 1, 0, -1):
+            if os.path.isfile("{0}.{1}".format(path, index)):
+                os.replace("{0}.{1}".format(path, index), "{0}.{1}".format(path, index + 1))
+        if LOG_BACKUPS > 0:
+            os.replace(path, path + ".1")
+        else:
+            os.remove(path)
+
+        f = open(path, "a+", encoding='utf-8')
+        self._handles[filename] = f
+        return f
+
+    def _write_status(self, line):
+        """ Replaces the status file atomically so readers never see it part written
+
+        Args:
+            line (str): the status line
+        """
+        path = os.path.join(self.log_path, STATUS_FILE)
+        try:
+            f = open(path + ".tmp", "w", encoding='utf-8')
+            f.write(line)
+            f.close()
+            os.replace(path + ".tmp", path)
+        except OSError:
+            self._write_log(ERROR_LOG, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f") + ": Can't access " + STATUS_FILE + "\n")
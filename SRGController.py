@@ -1,13 +1,22 @@
 from __future__ import print_function
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from google.auth import exceptions
-from apiclient import errors
 import time
 import datetime
 from GoogleSheetsJobParser import GoogleSheetsJobParser
-from ResultsTableBuilder import ResultsTableBuilder
-from MicrosoftDocxParser import MicrosoftDocxParser
+from SRGProfiler import SRGProfiler, DEFAULT_PROFILE_JOBS
+from SRGJobQueue import SRGJobQueue, DISCOVERED, PARSED, TABLES_BUILT, RENDERED, UPLOADED, SHARED
+from SRGCache import SRGCache
+from SRGMetrics import SRGMetrics, request_builder, rss_bytes
+from SRGWatchdog import SRGWatchdog, StageTimeout
+from SRGScheduler import SRGScheduler, estimate_cost, requester_key
+from SRGMemory import SRGMemory, ADMIT, DEFER, REJECT, format_bytes
+from ReportImages import IMAGE_CACHE_FOLDER
+from RenderPlan import RENDER_PLAN_FOLDER
+import SRGSession
+import copy
+import hashlib
+import json
+import signal
+import threading
 import os
 
 #Scope to give full access to the google drive account
@@ -16,6 +25,45 @@ SCOPES = ['https://www.googleapis.com/auth/drive']
 DEFAULT_CREDENTIALS_FILE = 'credentials.json'
 #Seconds between each poll for document changes
 POLL_TIME = 20
+#Worker processes for the CPU bound stages of a job (tables and report), the
+#tables of a job are dealt out across them. 0 runs them in the controller process
+WORKER_PROCESSES = 0
+#How the independent tables of a job are built: None one after another,
+#'thread' or 'process' in a pool of TABLE_WORKERS (None for one per CPU)
+TABLE_EXECUTOR = None
+TABLE_WORKERS = None
+#SQLite database of the job queue and stage checkpoints
+JOB_QUEUE_FILE = 'jobs.db'
+#Folder the reports of jobs in progress are rendered in
+JOBS_FOLDER = 'jobs'
+#Maximum bytes of parsed jobs and results tables kept in memory for re-runs of
+#an unchanged spreadsheet
+JOB_CACHE_BYTES = 256 * 1024 * 1024
+#Time limit in seconds of each stage of a job, a job with a stage that runs
+#longer is failed and abandoned so the other jobs keep being served. None for no limit
+STAGE_TIMEOUTS = {'parse': 15 * 60, 'tables': 30 * 60, 'render': 15 * 60, 'upload': 10 * 60, 'share': 5 * 60}
+#Seconds a google api request waits on its connection before it fails
+HTTP_TIMEOUT = 120
+#Folder the google api discovery documents are cached in so services are built
+#without fetching them
+DISCOVERY_FOLDER = 'discovery'
+#URL a discovery document is fetched from when it isn't cached or bundled
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/{0}/{1}/rest'
+#File the permission id and team drive id of the service account are cached in
+ACCOUNT_CACHE_FILE = 'account.json'
+#Seconds the cached account details are used before they are looked up again
+ACCOUNT_CACHE_SECONDS = 24 * 60 * 60
+#Port on localhost the health (/health) and metrics (/metrics) endpoint is
+#served on, None to not serve it
+METRICS_PORT = None
+#Measure the peak python memory of each job and stage with tracemalloc, written
+#to the activity log and metrics. Off by default as tracing makes building the
+#tables several times slower
+TRACE_MEMORY = False
+#Most bytes of python memory in use once a job has started, a job that doesn't
+#fit with the memory already in use waits for a later poll and a job measured
+#needing more on an earlier attempt is failed. Needs TRACE_MEMORY, None for no ceiling
+MEMORY_CEILING = None
 
 class SRGController:
     """ Controller for the Scientific Report Generator """
@@ -31,23 +79,68 @@ class SRGController:
             view (class): A view class that contains the appropriate functions for a 
                 SRGView
             service (googleapiclient.discovery.build): google drive service will all 
-                the functions required for accessing the drive
+                the functions required for accessing the drive, built on first use
+                in each thread
             sheets_service (googleapiclient.discovery.build): google sheets service will all 
-                the functions required for accessing google sheets
+                the functions required for accessing google sheets, built on first
+                use in each thread
             docs_service (googleapiclient.discovery.build): google docs service will all 
-                the functions required for accessing google docs
+                the functions required for accessing google docs, built on first
+                use in each thread
             permission_id (str): the permission id for the service account used
                 for adding and removing permissions to the files
             session_id (str): A unique id associated with this background process
             team_drive_id (string): The id of the google team drives used
+            profiler (SRGProfiler): turns on cProfile for the next jobs when requested
+            profile (cProfile.Profile): the profile of the job being processed,
+                None if it isn't profiled
+            stop_event (threading.Event): set to stop the main loop once the
+                current job has finished
+            worker_pool (SRGWorkerPool): pool of processes running the CPU bound
+                stages of a job, None to run them in this process
+            job_queue (SRGJobQueue): durable queue of discovered jobs and their
+                stage checkpoints, opened when the session starts
+            job_cache (SRGCache): parsed jobs and results tables keyed by the
+                spreadsheet id and content revision and parsed samples keyed
+                by the fingerprint of their tab
+            metrics (SRGMetrics): stage latencies, google api calls and the
+                gauges served on the metrics endpoint
+            watchdog (SRGWatchdog): runs the stages of a job with the time
+                limits in STAGE_TIMEOUTS
+            scheduler (SRGScheduler): orders the queued jobs by their estimated
+                cost and fair share of each requester
+            memory (SRGMemory): peak memory of each job and stage and the
+                memory ceiling jobs are started within
         """
         self.view = view  
-        self.service = None
-        self.sheets_service = None
-        self.docs_service = None
+        self._credentials = None
+        self._documents = {}
+        self._services = {}
+        self._local = threading.local()
         self.permission_id = None
         self.session_id = None
         self.team_drive_id = None
+        self.profiler = SRGProfiler(view, os.path.dirname(os.path.realpath(__file__)))
+        self.profile = None
+        self.stop_event = threading.Event()
+        self.worker_pool = None
+        self.job_queue = None
+        self.job_cache = SRGCache(JOB_CACHE_BYTES)
+        self.metrics = SRGMetrics()
+        self.metrics.add_gauge('queue_depth', "Unfinished jobs in the job queue",
+                               lambda: len(self.job_queue.pending()) if self.job_queue is not None else None)
+        self.metrics.add_gauge('job_cache_hit_ratio', "Fraction of job cache gets that found a value", self.job_cache.hit_rate)
+        self.metrics.add_gauge('job_cache_hits', "Job cache gets that found a value", lambda: self.job_cache.hits)
+        self.metrics.add_gauge('job_cache_misses', "Job cache gets that didn't find a value", lambda: self.job_cache.misses)
+        self.metrics.add_gauge('job_cache_bytes', "Size of the values in the job cache", lambda: self.job_cache.size)
+        self.metrics.add_gauge('resident_memory_bytes', "Resident memory of the background process", rss_bytes)
+        self.watchdog = SRGWatchdog()
+        self.scheduler = SRGScheduler()
+        self.memory = SRGMemory(MEMORY_CEILING)
+        self.metrics.add_gauge('job_peak_memory_bytes', "Peak python memory of the last job", lambda: self.memory.last_job_peak)
+        self.metrics.add_gauge('jobs_deferred', "Times a job was deferred by the memory ceiling", lambda: self.memory.deferred)
+        self.metrics.add_gauge('jobs_rejected', "Jobs rejected by the memory ceiling", lambda: self.memory.rejected)
+        self.metrics.add_gauge('stages_abandoned', "Stages that overran their time limit and were abandoned", lambda: self.watchdog.abandoned)
 
     def full_path(self, filename):
         """ Gets the full path of the passed filename
@@ -67,6 +160,9 @@ class SRGController:
         This is the unique keyword used to activate a document for processing
         If a new sheets document has been found the sheet is parsed and 
         a report produced. The report is shared back with the original user
+        
+        The process id is written to a pidfile and SIGTERM or SIGINT stops
+        the loop once the current job has finished
         """
         
         
@@ -76,18 +172,113 @@ class SRGController:
         #use a time stamp to keep track of the thread session
         self.session_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         
-        #create a session lock file required to keep the threads loop
-        #running. Delete this file to stop the thread
-        f=open(self.full_path("session-" + self.session_id + ".lock"), "w+")
-        f.write(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
-        f.close()
+        #record this process so 'SRG.py stop' can signal it
+        SRGSession.write_pidfile(self.session_id)
+        
+        #SIGTERM from 'SRG.py stop' or SIGINT from ctrl-c stop the loop
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        
+        #SIGUSR1 turns on profiling for the next job, not available on windows
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.request(DEFAULT_PROFILE_JOBS))
+        
+        #open the job queue, unfinished jobs from a previous session are resumed
+        self.job_queue = SRGJobQueue(self.full_path(JOB_QUEUE_FILE))
+        
+        #start the worker processes before the first job so their imports are done up front
+        if WORKER_PROCESSES > 0:
+            from SRGWorkerPool import SRGWorkerPool
+            self.worker_pool = SRGWorkerPool(WORKER_PROCESSES)
+        
+        #serve the health and metrics endpoint for monitoring if it is turned on
+        if METRICS_PORT is not None:
+            self.metrics.serve(METRICS_PORT)
+        
+        #trace python memory to measure the peak of each job, the heavy modules
+        #are imported first so their memory isn't counted as in use by jobs
+        if TRACE_MEMORY:
+            from SRGWorkerPool import preload
+            preload()
+            self.memory.start()
         
         #run the main program loop
-        self.main_loop()
+        try:
+            self.main_loop()
+        finally:
+            self.memory.stop()
+            self.metrics.close()
+            self.watchdog.close()
+            if self.worker_pool is not None:
+                self.worker_pool.close()
+            self.job_queue.close()
+            SRGSession.remove_pidfile()
+            
+    def stop(self):
+        """ Stops the main loop. A job in progress is finished first, an idle
+        loop stops straight away. Safe to call from a signal handler
+        """
+        self.stop_event.set()
+
+    @property
+    def service(self):
+        return self.thread_service('drive', 'v3')
+    
+    @service.setter
+    def service(self, service):
+        self._services['drive'] = service
+        
+    @property
+    def sheets_service(self):
+        return self.thread_service('sheets', 'v4')
+    
+    @sheets_service.setter
+    def sheets_service(self, service):
+        self._services['sheets'] = service
+        
+    @property
+    def docs_service(self):
+        return self.thread_service('docs', 'v1')
+    
+    @docs_service.setter
+    def docs_service(self, service):
+        self._services['docs'] = service
+        
+    def thread_service(self, name, version):
+        """ Gets the calling thread's google api service. The http transport of
+        a service isn't thread safe so each thread has its own services, each
+        with its own connections kept alive between requests. All the services
+        share the credentials so a token refreshed by one thread is used by all
+        
+        Args:
+            name (str): the name of the api eg. drive
+            version (str): the version of the api eg. v3
+            
+        Returns:
+            googleapiclient.discovery.Resource: the service, None if the
+                credentials haven't been loaded
+        """
+        #a service set on the controller is used by every thread
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        
+        if self._credentials is None:
+            return None
+        
+        services = getattr(self._local, 'services', None)
+        if services is None:
+            services = self._local.services = {}
+        if name not in services:
+            services[name] = self.build_service(name, version)
+        
+        return services[name]
 
     def create_service(self, cred_file):
-        """ Creates the google api services with the passed credentials file
-        this service is then used throughout the lifetime of this object
+        """ Loads the credentials the google api services are built with. The
+        services are built the first time they are used. The permission id and
+        team drive of the service account are looked up once and cached for
+        ACCOUNT_CACHE_SECONDS so a restart doesn't call the api for them
         
         Args:
             cred_file (str): the location of the credentials file
@@ -96,6 +287,11 @@ class SRGController:
             bool: True if the services was created sucessfully
         """
         
+        #google api modules are slow to import so only load them once they are needed
+        from google.oauth2 import service_account
+        from google.auth import exceptions
+        from googleapiclient import errors
+        
         try:
             creds = service_account.Credentials.from_service_account_file(cred_file, scopes=SCOPES)
         except FileNotFoundError:
@@ -105,11 +301,20 @@ class SRGController:
             self.display_error("Can't load credentials {0} is an invalid format.".format(cred_file))
             return False
             
-
-        #Create the google api service objects
-        self.service = build('drive', 'v3', credentials=creds)        
-        self.sheets_service = build('sheets', 'v4', credentials=creds)
-        self.docs_service = build('docs', 'v1', credentials=creds)
+        #the services are built from these credentials on first use
+        self._credentials = creds
+        self._services = {}
+        self._local = threading.local()
+        
+        #the account details are cached by the credentials so new credentials
+        #are always checked with the api
+        with open(cred_file, 'rb') as f:
+            account_key = hashlib.sha256(f.read()).hexdigest()
+        account = self.load_account(account_key)
+        if account is not None:
+            self.permission_id = account['permission_id']
+            self.team_drive_id = account['team_drive_id']
+            return True
         
         #get this service account permissions id - used for adding and removing permissions
         try:
@@ -130,9 +335,117 @@ class SRGController:
         team_drives = response.get('teamDrives', [])
         if len(team_drives) > 0:
             self.team_drive_id = team_drives[0].get('id')
+            
+        self.save_account(account_key)
         
         return True
     
+    def build_service(self, name, version):
+        """ Builds a google api service with its own authorized http transport
+        
+        Args:
+            name (str): the name of the api eg. drive
+            version (str): the version of the api eg. v3
+            
+        Returns:
+            googleapiclient.discovery.Resource: the service, every request is
+                counted in the metrics
+        """
+        
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+        
+        #a stalled request fails after HTTP_TIMEOUT instead of hanging the stage
+        http = AuthorizedHttp(self._credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        
+        return build_from_document(self.discovery_document(name, version), http=http,
+                                   requestBuilder=request_builder(self.metrics))
+    
+    def discovery_document(self, name, version):
+        """ Gets the discovery document of a google api. The document is read
+        from DISCOVERY_FOLDER, or from the documents bundled with the api client,
+        and is only fetched if neither has it. Documents are read once and kept
+        for the services built by other threads
+        
+        Args:
+            name (str): the name of the api eg. drive
+            version (str): the version of the api eg. v3
+            
+        Returns:
+            str: the discovery document
+        """
+        
+        document = self._documents.get((name, version))
+        if document is not None:
+            return document
+        
+        path = self.full_path(os.path.join(DISCOVERY_FOLDER, "{0}.{1}.json".format(name, version)))
+        try:
+            with open(path, 'r') as f:
+                document = f.read()
+        except OSError:
+            document = None
+            
+        if document is None:
+            #newer api clients bundle the documents, older ones fetch them
+            try:
+                from googleapiclient.discovery_cache import get_static_doc
+                document = get_static_doc(name, version)
+            except ImportError:
+                pass
+            
+            if document is None:
+                import urllib.request
+                with urllib.request.urlopen(DISCOVERY_URL.format(name, version)) as response:
+                    document = response.read().decode('utf-8')
+                    
+            #write to a temporary file first so a restart never reads half a document
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = "{0}.{1}.{2}.tmp".format(path, os.getpid(), threading.get_ident())
+            with open(temp_path, 'w') as f:
+                f.write(document)
+            os.replace(temp_path, path)
+        
+        self._documents[(name, version)] = document
+        
+        return document
+    
+    def load_account(self, account_key):
+        """ Loads the cached account details of the service account
+        
+        Args:
+            account_key (str): the hash of the credentials file
+            
+        Returns:
+            dict: the permission_id and team_drive_id, None if they aren't
+                cached for these credentials or are older than ACCOUNT_CACHE_SECONDS
+        """
+        try:
+            with open(self.full_path(ACCOUNT_CACHE_FILE), 'r') as f:
+                account = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if account.get('key') != account_key or time.time() - account.get('time', 0) > ACCOUNT_CACHE_SECONDS:
+            return None
+        
+        return account
+    
+    def save_account(self, account_key):
+        """ Caches the permission id and team drive id of the service account
+        
+        Args:
+            account_key (str): the hash of the credentials file
+        """
+        account = {'key': account_key, 'time': time.time(),
+                   'permission_id': self.permission_id, 'team_drive_id': self.team_drive_id}
+        try:
+            with open(self.full_path(ACCOUNT_CACHE_FILE), 'w') as f:
+                json.dump(account, f)
+        except OSError:
+            #the details are looked up again on the next start
+            pass
 
     def main_loop(self):
         """ Main loop that searches for documents starting with the keyword 
@@ -143,8 +456,8 @@ class SRGController:
         print("SRG session " + self.session_id + " Started.")
 
         #This is the main loop so keep looping on this thread until the program
-        #has been marked as not active by deleting the session.lock file
-        while os.path.isfile(self.full_path("session-" + self.session_id + ".lock")):        
+        #has been stopped by stop() or a SIGTERM/SIGINT
+        while not self.stop_event.is_set():        
 
             #different calls are rquired depending if team drives are being used
             #find files with the keyword 'PROCESS ' that are of type google sheets            
@@ -165,35 +478,142 @@ class SRGController:
                     pageSize=100,
                     fields="files(id, name, mimeType)").execute()
       
-            #check the details of each file found
+            #record each file found as a job in the queue, files that
+            #already have an unfinished job are not added again
             for file in results.get('files'):
+                job_id, is_new = self.job_queue.add(file.get('id'), file.get('name'))
+                if is_new:
+                    self.display_message("PROCESS command found for file: {0}".format(file.get('name')))
+                    self.estimate_job(job_id, file)
+      
+            #process every unfinished job, including jobs interrupted by a
+            #restart, in the order decided by the scheduler
+            polled = time.monotonic()
+            poll_again = False
+            for queued_job in self.scheduler.order(self.job_queue.pending()):
                 
                 #break the loop if the session is shutdown
-                if not os.path.isfile(self.full_path("session-" + self.session_id + ".lock")):
+                if self.stop_event.is_set():
                     break                                
-                                        
-                self.display_message("PROCESS command found for file: {0}".format(file.get('name')))
+                
+                #poll again once the poll time is up so newly flagged files are
+                #scheduled with the jobs still waiting
+                if time.monotonic() - polled > POLL_TIME:
+                    poll_again = True
+                    break
+                
+                #keep to the memory ceiling, a job that can't fit is failed and a
+                #job that doesn't fit with the memory in use waits for a later poll
+                if not self.admit_job(queued_job):
+                    continue
+                
+                #give up on jobs that keep failing
+                if not self.job_queue.start_attempt(queued_job['job_id']):
+                    self.display_error("Could not process job " + queued_job.get('name'))
+                    continue
                     
+                self.scheduler.charge(queued_job)
+                
+                #profile this job if profiling has been requested
+                profile = self.profiler.start_job()
+                self.profile = profile
+                self.memory.start_job()
+                
                 #process the google sheets document into a job
                 try:                            
-                    self.process_job(file)                        
+                    with self.metrics.track_job():
+                        self.process_job(queued_job)                        
                 #Just catch all errors here and log them to ensure the main
-                #loop continues to run without crashing
+                #loop continues to run without crashing, the job is tried again
+                #from its last checkpoint on the next poll
                 except Exception as e:
                     self.display_error(e.__str__())
-                    self.display_error("Could not process job " + file.get('name'))   
+                    self.display_error("Could not process job " + queued_job.get('name'))   
+                finally:
+                    #the profile is None if it was discarded with an abandoned stage
+                    profile, self.profile = self.profile, None
+                    self.profiler.finish_job(profile, queued_job.get('name'))
+                    self.finish_memory(queued_job)
                     
             
 
-            #display a status and sleep thread until the next poll
+            #display a status and wait until the next poll, waking straight
+            #away if the session is stopped
             now_string = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             self.display_status("Last poll: {0}".format(now_string))
-            time.sleep(POLL_TIME)
+            self.metrics.poll()
+            if not poll_again:
+                self.stop_event.wait(POLL_TIME)
             
         #main loop has exited so display the session stopped message
         self.display_message("SRG session " + self.session_id + " Stopped.")
         print("SRG session " + self.session_id + " Stopped.")
     
+    def admit_job(self, queued_job):
+        """ Checks a job can be started within the memory ceiling. A job that
+        doesn't fit with the memory in use is deferred, after emptying the job
+        cache to make room. Only a job measured needing more than the ceiling
+        on an earlier attempt is failed, an estimate alone never fails a job
+        
+        Args:
+            queued_job (dict): the queued job from SRGJobQueue.pending()
+            
+        Returns:
+            bool: True if the job can be started
+        """
+        #only the final decision is counted in the metrics
+        admission = self.memory.admit(queued_job, count=False)
+        if admission != ADMIT:
+            if admission == DEFER:
+                self.job_cache.clear()
+            admission = self.memory.admit(queued_job)
+            
+        if admission == REJECT:
+            error = "Needed {0} on an earlier attempt, more than the memory ceiling of {1}".format(format_bytes(self.memory.measured(queued_job)),
+                                                                                                    format_bytes(self.memory.ceiling))
+            self.display_error("Could not process job {0}: {1}".format(queued_job.get('name'), error))
+            self.job_queue.fail(queued_job['job_id'], error)
+            return False
+        
+        if admission == DEFER:
+            self.display_message("Deferring job {0}, needs about {1} with {2} in use".format(queued_job.get('name'),
+                                 format_bytes(self.memory.estimate(queued_job)), format_bytes(self.memory.in_use())))
+            return False
+        
+        return True
+    
+    def finish_memory(self, queued_job):
+        """ Writes the peak memory of a finished job and its stages to the
+        activity log and metrics
+        
+        Args:
+            queued_job (dict): the queued job from SRGJobQueue.pending()
+        """
+        if self.memory.finish_job(queued_job) is None:
+            return
+        
+        for stage, peak in self.memory.stage_peaks.items():
+            self.metrics.observe_memory(stage, peak)
+        self.display_message("Peak memory of {0}: {1}".format(queued_job.get('name'), self.memory.summary()))
+    
+    def estimate_job(self, job_id, file):
+        """ Records the estimated cost of a new job, from the size of the tabs
+        of the spreadsheet, and the ShareWith user or domain it is charged to
+        so the scheduler can order the jobs. A job that can't be estimated is
+        scheduled with the default cost
+        
+        Args:
+            job_id (int): the id of the job
+            file (dict): the google drive file the job was discovered from
+        """
+        try:
+            sheets, fields = GoogleSheetsJobParser(self.view).parse_metadata(self.sheets_service, file.get('id'))
+        except Exception as e:
+            self.display_error("Could not estimate job {0}: {1}".format(file.get('name'), e))
+            return
+        
+        self.job_queue.estimate(job_id, estimate_cost(sheets), requester_key(fields.get('ShareWith')))
+    
     def process_job(self, file):
         """ Completes all required tasks to process the google sheet into a 
         finished test report.
@@ -201,10 +621,104 @@ class SRGController:
         Calcualtes all the results, parses the results to the Microsoft Doc template
         to fill in the details.
         
+        Each stage is checkpointed in the job queue and the job starts from the
+        stage after its last checkpoint, so a job interrupted by a restart or
+        stop is resumed rather than processed from scratch
+        
+        Args:
+            file (dict): the queued job from SRGJobQueue.pending() with the
+                file id, name, job_id and state
+        """
+        
+        job_id = file.get('job_id')
+        state = file.get('state')
+        report_path = self.job_path(job_id)
+        
+        #the rendered report is kept on local storage, if it is gone the
+        #tables and report need building again
+        if state in (TABLES_BUILT, RENDERED) and not os.path.isfile(report_path):
+            state = PARSED
+            
+        if state == DISCOVERED:
+            job = self.run_stage(file, 'parse', self.parse_stage, file)
+            if job is None:
+                return
+            state = PARSED
+        else:
+            job = self.job_queue.load(job_id, PARSED)
+        
+        if state == PARSED:
+            if self.stop_event.is_set() or not self.run_stage(file, 'tables', self.tables_stage, file, job):
+                return
+            state = TABLES_BUILT
+            
+        if state == TABLES_BUILT:
+            if self.stop_event.is_set() or not self.run_stage(file, 'render', self.render_stage, file, job):
+                return
+            state = RENDERED
+            
+        if state == RENDERED:
+            if self.stop_event.is_set() or not self.run_stage(file, 'upload', self.upload_stage, file, job):
+                return
+            state = UPLOADED
+            
+        if state == UPLOADED:
+            self.run_stage(file, 'share', self.share_stage, file, job)
+            
+    def run_stage(self, file, stage, function, *args):
+        """ Runs a stage of a job with the time limit of the stage. A job with
+        a stage that overruns is failed with the name of the stage and the
+        stage is abandoned so the main loop can carry on with the other jobs
+        
         Args:
-            file (googlesheets.file): the file that was found to process
+            file (dict): the queued job
+            stage (str): the name of the stage, a key of STAGE_TIMEOUTS
+            function (callable): the stage
+            *args: the arguments for the stage
+            
+        Returns:
+            object: the return value of the stage, None if the stage overran
         """
+        profile = self.profile
+        if profile is not None:
+            #cProfile only sees the thread it is enabled in so the profile is
+            #moved to the stage thread for the stage
+            profile.disable()
+            function, args = profile.runcall, (function,) + args
+            
+        try:
+            with self.metrics.time_stage(stage), self.memory.measure_stage(stage):
+                return self.watchdog.run(stage, STAGE_TIMEOUTS.get(stage), function, *args)
+        except StageTimeout as ex:
+            self.display_error("{0} for {1}".format(ex, file.get('name')))
+            self.job_queue.fail(file.get('job_id'), str(ex))
+            
+            #a worker stuck on the stage would hold up the next jobs
+            if self.worker_pool is not None:
+                self.worker_pool.restart()
+                
+            #the abandoned stage thread is still running in the profile, using
+            #it in this thread as well would mix up its stats so it is discarded
+            if profile is not None:
+                self.display_message("Profile of {0} discarded, its {1} stage was abandoned".format(file.get('name'), stage))
+                self.profile = None
+                profile = None
+                
+            return None
+        finally:
+            if profile is not None:
+                profile.enable()
+    
+    def parse_stage(self, file):
+        """ Removes the PROCESS keyword from the spreadsheet name and parses the
+        spreadsheet into a job
         
+        Args:
+            file (dict): the queued job
+            
+        Returns:
+            SRGJob: the parsed job, None if the job failed
+        """
         
         file_id = file.get('id')
         sheet_name = file.get('name')
@@ -214,112 +728,328 @@ class SRGController:
         #remove the unique key PROCESS from the filename now the file has been processed
         self.service.files().update(fileId=file_id, body={'name': sheet_name.replace('PROCESS ', '')}, supportsTeamDrives=True).execute()
                 
-        #Create a sheet parser to generate a Job with a results collection
-        sheets_parser = GoogleSheetsJobParser(self.view)
+        #a spreadsheet flagged again without its data changing is taken from the cache
+        revision = self.sheet_revision(file_id)
+        job = None
+        if revision is not None:
+            job = self.job_cache.get(('job', file_id, revision))
+            
+        if job is not None:
+            #the later stages build indexes and frames on the job, they are
+            #kept off the cached job so its size stays as measured
+            job = copy.copy(job)
+            self.display_message("Spreedsheet {0} is unchanged, using the cached data.".format(sheet_name))
+        else:
+            #Create a sheet parser to generate a Job with a results collection,
+            #every tab is read but tabs that haven't changed since they were
+            #last parsed are taken from the job cache
+            sheets_parser = GoogleSheetsJobParser(self.view, self.job_cache)
+    
+            #Run sheets parser and get the results collection in a job object
+            job = sheets_parser.parse_document(self.sheets_service, file_id)
+            if sheets_parser.cached_tabs > 0:
+                self.display_message("Spreedsheet {0} has {1} unchanged tabs, using their cached samples.".format(sheet_name, sheets_parser.cached_tabs))
+            
+            if job is not None:
+                job.document_id = file_id
+                job.revision = revision
+                if revision is not None:
+                    #a copy without the indexes and frames, see SRGJob.__getstate__
+                    self.job_cache.put(('job', file_id, revision), copy.copy(job))
+        
+        if job is None:
+            self.job_queue.fail(file.get('job_id'), "No samples found")
+            return None
+        
+        self.display_message("Spreedsheet {0} has parsed {1} products successfully.".format(sheet_name, len(job.samples)))  
+        
+        #need to check all the required details are in the job
+        missing_data = ""
+        if 'ReportTemplate' not in job.fields:
+            missing_data += " ReportTemplate"
+        if  'UploadFilename' not in job.fields:
+            missing_data += " UploadFilename"
+        if  'ShareWith' not in job.fields:
+            missing_data += " ShareWith"
+        if len(missing_data) > 0:
+            self.display_error("Data sheet is missing " + missing_data + " in the Details tab")
+            self.job_queue.fail(file.get('job_id'), "Data sheet is missing " + missing_data)
+            return None
+        
+        self.job_queue.checkpoint(file.get('job_id'), PARSED, job)
+        
+        return job
+    
+    def tables_stage(self, file, job):
+        """ Downloads the report template to the job's report path and builds
+        the results tables for its table commands
+        
+        Args:
+            file (dict): the queued job
+            job (SRGJob): the parsed job
+            
+        Returns:
+            bool: True if the stage completed
+        """
+        
+        #the report building modules pull in docx, pandas and statsmodels
+        #so they are imported on the first job rather than at start up
+        from MicrosoftDocxParser import MicrosoftDocxParser
+        
+        job_id = file.get('job_id')
+        name = job.fields['ReportTemplate']
+        
+        #create the MicrosofDocxParser to parse the template daocument
+        doc_parser = MicrosoftDocxParser()
+        
+        #download the template file found in the fields dictionary. Each job
+        #renders into its own copy so the template is downloaded to the job's
+        #report path, an abandoned stage of another job using the same
+        #template can't still be writing to it
+        template_path = self.job_path(job_id)
+        success = False
+        try:
+            os.makedirs(os.path.dirname(template_path), exist_ok=True)
+            success = doc_parser.download_report_template(self.service, name, template_path, self.team_drive_id)
+        except IOError: 
+            self.display_error("Save template error. Can't save to " + template_path)
+            self.job_queue.fail(job_id, "Can't save template " + name)
+            return False
 
-        #Run sheets parser and get the results collection in a job object
-        job = sheets_parser.parse_document(self.sheets_service, file_id)
+        if not success:
+            self.display_error("Could not find report template")
+            self.job_queue.fail(job_id, "Could not find report template " + name)
+            return False
         
+        self.display_message("Downloaded template " + name)
         
+        #get the table commands so we can build the required tables from the data
+        table_commands = doc_parser.extract_table_commands(template_path, self.full_path(RENDER_PLAN_FOLDER))
         
-        if job is not None:
-            self.display_message("Spreedsheet {0} has parsed {1} products successfully.".format(sheet_name, len(job.samples)))  
-            
-            #need to check all the required details are in the job
-            missing_data = ""
-            if 'ReportTemplate' not in job.fields:
-                missing_data += " ReportTemplate"
-            if  'UploadFilename' not in job.fields:
-                missing_data += " UploadFilename"
-            if  'ShareWith' not in job.fields:
-                missing_data += " ShareWith"
-            if len(missing_data) > 0:
-                self.display_error("Data sheet is missing " + missing_data + " in the Details tab")
-                return
-                        
-            name = job.fields['ReportTemplate']
-            new_name = job.fields['UploadFilename']
+        #tables already built from this revision of the spreadsheet are
+        #taken from the cache, only the rest are built
+        tables = {}
+        if job.revision is not None:
+            for command in table_commands:
+                table = self.job_cache.get(('table', job.document_id, job.revision, command))
+                if table is not None:
+                    tables[command] = table
+        
+        #build the tables
+        try:
+            missing_commands = [command for command in table_commands if command not in tables]
+            if len(missing_commands) > 0:
+                built_tables = self.build_job_tables(missing_commands, job)
+                tables.update(built_tables)
+                if job.revision is not None:
+                    for command, table in built_tables.items():
+                        self.job_cache.put(('table', job.document_id, job.revision, command), table)
+        except (ValueError, KeyError) as ex:
+            self.display_error("Could not build the results tables")
+            self.display_error(str(ex))
+            self.job_queue.fail(job_id, "Could not build the results tables: " + str(ex))
+            return False
+        
+        self.job_queue.checkpoint(job_id, TABLES_BUILT, tables)
+        
+        return True
+    
+    def render_stage(self, file, job):
+        """ Generates the report from the job's copy of the template
+        
+        Args:
+            file (dict): the queued job
+            job (SRGJob): the parsed job
             
-            #create the MicrosofDocxParser to parse the template daocument
-            doc_parser = MicrosoftDocxParser()
+        Returns:
+            bool: True if the stage completed
+        """
+        
+        from SRGWorkerPool import render_report
+        
+        job_id = file.get('job_id')
+        tables = self.job_queue.load(job_id, TABLES_BUILT)
+        
+        #generate the word document now that all the data is ready to insert
+        try:
+            self.run_cpu_stage(render_report, self.job_path(job_id), job.fields, tables, self.full_path(RENDER_PLAN_FOLDER))
+        except KeyError as ex:
+            self.display_error(str(ex))
+        
+        self.display_message("Genereated report.")
+        
+        self.job_queue.checkpoint(job_id, RENDERED)
+        
+        return True
+    
+    def upload_stage(self, file, job):
+        """ Uploads the generated report back to google drive
+        
+        Args:
+            file (dict): the queued job
+            job (SRGJob): the parsed job
             
-            #download the template file found in the fields dictionary
-            success = False
-            try:
-                success = doc_parser.download_report_template(self.service, name, self.full_path(name), self.team_drive_id)
-            except IOError: 
-                self.display_error("Save template error. Can't save to " + name)
-                return
+        Returns:
+            bool: True if the stage completed
+        """
+        
+        from googleapiclient.http import MediaFileUpload
+        
+        job_id = file.get('job_id')
+        new_name = job.fields['UploadFilename']
 
-            if success:
-                self.display_message("Downloaded template " + name)
-                
-                #get the table commands so we can build the required tables from the data
-                table_commands = doc_parser.extract_table_commands(self.full_path(name))            
-                
-                #build the tables
-                table_builder = ResultsTableBuilder()
-                try:
-                    tables = table_builder.create_tables(table_commands, job)
-                except (ValueError, KeyError) as ex:
-                    self.display_error("Could not build the results tables")
-                    self.display_error(str(ex))
-                    return
-                
-                #generate the word document now that all the data is ready to insert
-                try:
-                    doc_parser.generate_report(self.full_path(name), job.fields, tables)
-                except KeyError as ex:
-                    self.display_error(str(ex))
-                
-                self.display_message("Genereated report.")
-                
-                #upload the document back to google drive
-                from googleapiclient.http import MediaFileUpload
-        
-                file_metadata = {'name': new_name}
-                media = MediaFileUpload(self.full_path(name),
-                                        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-                try:
-                    file = self.service.files().create(body=file_metadata,
-                                                    media_body=media,
-                                                    supportsTeamDrives=True,
-                                                    fields='id').execute()
-                except FileNotFoundError:
-                    self.display_error("Could not upload " + new_name)
-                    return
+        #upload the document back to google drive
+        file_metadata = {'name': new_name}
+        media = MediaFileUpload(self.job_path(job_id),
+                                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        try:
+            uploaded = self.service.files().create(body=file_metadata,
+                                                   media_body=media,
+                                                   supportsTeamDrives=True,
+                                                   fields='id').execute()
+        except FileNotFoundError:
+            self.display_error("Could not upload " + new_name)
+            self.job_queue.fail(job_id, "Could not upload " + new_name)
+            return False
+            
+        self.display_message("Uploaded report.")
+        
+        self.job_queue.checkpoint(job_id, UPLOADED, uploaded.get('id'))
+        
+        return True
+    
+    def share_stage(self, file, job):
+        """ Shares the uploaded report with the user or domain in the ShareWith field
+        
+        Args:
+            file (dict): the queued job
+            job (SRGJob): the parsed job
+            
+        Returns:
+            bool: True if the stage completed
+        """
+        
+        from googleapiclient import errors
+        
+        job_id = file.get('job_id')
+        new_name = job.fields['UploadFilename']
+        
+        #add the permissions for the user or domain given in ShareWith field
+        #When google api allows transfer of ownership that would be a better method
+        new_file_id = self.job_queue.load(job_id, UPLOADED)
+        
+        #sometimes permission can't be granted until afew seconds
+        #after the document has been created so try this
+        #a few times every 2 seconds to allow time for it to work
+        attempts = 0
+        perm_granted = False
+        while perm_granted == False and attempts < 4:
+            try:                                      
+                if '@' in job.fields['ShareWith']:
+                    self.service.permissions().create(fileId=new_file_id, body={'role': 'writer', 'type': 'user', 'emailAddress': job.fields['ShareWith']}).execute()
+                else:
+                    self.service.permissions().create(fileId=new_file_id, body={'role': 'writer', 'type': 'domain', 'domain': job.fields['ShareWith'], 'allowFileDiscovery': True}).execute()
                     
-                self.display_message("Uploaded report.")
+                perm_granted = True
                 
-                #add the permissions for the user or domain given in ShareWith field
-                #When google api allows transfer of ownership that would be a better method
-                new_file_id = file.get('id')  
-                
-                #sometimes permission can't be granted until afew seconds
-                #after the document has been created so try this
-                #a few times every 2 seconds to allow time for it to work
-                attempts = 0
+            except errors.HttpError:
+                time.sleep(2)
+                attempts += 1
                 perm_granted = False
-                while perm_granted == False and attempts < 4:
-                    try:                                      
-                        if '@' in job.fields['ShareWith']:
-                            self.service.permissions().create(fileId=new_file_id, body={'role': 'writer', 'type': 'user', 'emailAddress': job.fields['ShareWith']}).execute()
-                        else:
-                            self.service.permissions().create(fileId=new_file_id, body={'role': 'writer', 'type': 'domain', 'domain': job.fields['ShareWith'], 'allowFileDiscovery': True}).execute()
-                            
-                        perm_granted = True
-                        
-                    except errors.HttpError:
-                        time.sleep(2)
-                        attempts += 1
-                        perm_granted = False
-                        
-                if perm_granted:
-                    self.display_message("File {0} is now shared with {1}".format(new_name, job.fields['ShareWith']))
-                    
-            else:
-                self.display_error("Could not find report template")
-                        
+                
+        if not perm_granted:
+            self.display_error("Could not share {0} with {1}".format(new_name, job.fields['ShareWith']))
+            self.job_queue.fail(job_id, "Could not share with " + job.fields['ShareWith'])
+            return False
+        
+        self.display_message("File {0} is now shared with {1}".format(new_name, job.fields['ShareWith']))
+        
+        #the job is done so the local report isn't needed any more
+        self.job_queue.checkpoint(job_id, SHARED)
+        try:
+            os.remove(self.job_path(job_id))
+        except OSError:
+            pass
+        
+        return True
+        
+    def sheet_revision(self, file_id):
+        """ Gets the revision of a spreadsheet with one request for the file.
+        Drive only gives a head revision id for files with binary content so
+        for google sheets the modifiedTime is used. Renaming the file changes
+        its modifiedTime, a re-flagged sheet misses the cached job but its
+        unchanged tabs are still taken from the cache
+        
+        Args:
+            file_id (str): the google drive id of the spreadsheet
+            
+        Returns:
+            str: the head revision id or modified time, None if the file
+                can't be read
+        """
+        
+        from googleapiclient import errors
+        
+        try:
+            response = self.service.files().get(fileId=file_id,
+                                                supportsTeamDrives=True,
+                                                fields='headRevisionId,modifiedTime').execute()
+        except errors.HttpError:
+            return None
+            
+        return response.get('headRevisionId') or response.get('modifiedTime')
+        
+    def job_path(self, job_id):
+        """ Gets the path of the report a job is rendered into
+        
+        Args:
+            job_id (int): the id of the job in the queue
+            
+        Returns:
+            str: The full path of the job's report
+        """
+        return self.full_path(os.path.join(JOBS_FOLDER, "job-{0}.docx".format(job_id)))
+
+    def build_job_tables(self, table_commands, job):
+        """ Builds the results tables of a job. With a worker pool the table
+        commands are dealt out to the worker processes so the tables are built
+        on several cores at once
+        
+        Args:
+            table_commands (str[]): the table commands to build
+            job (SRGJob): the parsed job
+            
+        Returns:
+            dict: the result tables with the command as the key
+        """
+        from SRGWorkerPool import build_tables
+        
+        args = (job, TABLE_EXECUTOR, TABLE_WORKERS, self.full_path(IMAGE_CACHE_FOLDER))
+        
+        batches = 1 if self.worker_pool is None else min(self.worker_pool.processes, len(table_commands))
+        if batches <= 1:
+            return self.run_cpu_stage(build_tables, table_commands, *args)
+        
+        tables = {}
+        for built_tables in self.worker_pool.run_all([(build_tables, (table_commands[start::batches],) + args) for start in range(batches)]):
+            tables.update(built_tables)
+        return tables
+
+    def run_cpu_stage(self, function, *args):
+        """ Runs a CPU bound stage of a job in the worker pool if there is one
+        otherwise in this process. Exceptions from the stage are raised here
+        
+        Args:
+            function (callable): a module level function from SRGWorkerPool
+            *args: the arguments for the function
+            
+        Returns:
+            object: the return value of the function
+        """
+        if self.worker_pool is None:
+            return function(*args)
+        
+        return self.worker_pool.run(function, *args)
 
     def display_message(self, message):
         """Function that calls the self.view display_message function if it has one
@@ -1,15 +1,223 @@
-import pandas as pd
+from SampleData import parse_result, factor_codes
 
 class SRGJob:
     
     def __init__(self):
         self.samples = []
         self.fields = {}
+        #the spreadsheet and its content revision the job was parsed from
+        self.document_id = None
+        self.revision = None
+        #sample name indexes built by sample_index with the field tuple as the key
+        self._name_indexes = {}
+        #results_frame and aggregate with the sample result versions they were built from
+        self._frame = None
+        self._aggregate = None
+        #ordinal_averages with the test and categories as the key
+        self._ordinals = {}
+    
+    def __getstate__(self):
+        #the indexes and frames are rebuilt from the samples when they are
+        #needed, leaving them out keeps the pickle of a checkpoint or a
+        #cached copy of the job to its samples and fields
+        state = self.__dict__.copy()
+        state['_name_indexes'] = {}
+        state['_frame'] = None
+        state['_aggregate'] = None
+        state['_ordinals'] = {}
+        return state
     
     
     def add_sample(self, sample):
         self.samples.append(sample)
         
+    def sample_index(self, key_fields):
+        """ Index of the samples by the name built from the key fields, used to
+        look up the samples with a name in O(1). The index is rebuilt when
+        samples are added or their details change
+        
+        Args:
+            key_fields: the fields in the samples details to use to build the 
+                sample name
+                
+        Returns:
+            dict: the sample name as the key and the list of samples with that
+                name as the value, in the order of the samples
+        """
+        
+        key = tuple(field.strip() for field in key_fields)
+        versions = tuple(sample.details_version for sample in self.samples)
+        
+        cached = self._name_indexes.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+        
+        index = {}
+        for sample in self.samples:
+            index.setdefault(sample.build_name(key), []).append(sample)
+            
+        self._name_indexes[key] = (versions, index)
+        
+        return index
+        
+    def results_version(self):
+        """ Identifies the current results of all the samples, changes when a
+        sample or a result is added
+        
+        Returns:
+            tuple: the results_version of each sample
+        """
+        return tuple(sample.results_version for sample in self.samples)
+        
+    def results_frame(self):
+        """ Every result of every sample in one long format table, one row per
+        replicate. Built once and reused until results are added
+        
+        Returns:
+            DataFrame: columns are sample (the index of the sample in samples), 
+                test, replicate (numbered from 1), value (the number or NaN if
+                the result isn't a number), raw (the result string) and unit
+        """
+        
+        version = self.results_version()
+        if self._frame is not None and self._frame[0] == version:
+            return self._frame[1]
+        
+        import numpy as np
+        import pandas as pd
+        
+        #collect the columns then build the dataframe in one go
+        sample_col = []
+        test_col = []
+        replicate_col = []
+        value_col = []
+        raw_col = []
+        unit_col = []
+        
+        for position, sample in enumerate(self.samples):
+            for test_name, results in sample.test_results.items():
+                unit = sample.test_units.get(test_name, '')
+                for replicate, result in enumerate(results):
+                    try:
+                        value = parse_result(result)[0]
+                    except ValueError:
+                        value = None
+                    sample_col.append(position)
+                    test_col.append(test_name)
+                    replicate_col.append(replicate + 1)
+                    value_col.append(np.nan if value is None else value)
+                    raw_col.append(result)
+                    unit_col.append(unit)
+                    
+        frame = pd.DataFrame({'sample': np.array(sample_col, dtype=np.int64),
+                              'test': test_col,
+                              'replicate': np.array(replicate_col, dtype=np.int64),
+                              'value': np.array(value_col, dtype=np.float64),
+                              'raw': raw_col,
+                              'unit': unit_col},
+                             columns=['sample', 'test', 'replicate', 'value', 'raw', 'unit'])
+        
+        self._frame = (version, frame)
+        
+        return frame
+    
+    def aggregate(self):
+        """ Count, mean and standard deviation of the numeric results of every
+        (sample, test) pair, calculated for the whole job in one grouped pass
+        over results_frame. Built once and reused until results are added
+        
+        The sums are taken in extended precision so the means and standard
+        deviations match statistics.mean and statistics.stdev used by SampleData
+        
+        Returns:
+            DataFrame: indexed by (sample, test) with the columns count, mean
+                and std. Pairs without any numeric results are left out, std is
+                0 where there are less than 2 results
+        """
+        
+        version = self.results_version()
+        if self._aggregate is not None and self._aggregate[0] == version:
+            return self._aggregate[1]
+        
+        import numpy as np
+        import pandas as pd
+        
+        frame = self.results_frame()
+        numeric = frame[frame['value'].notna()]
+        
+        if len(numeric) == 0:
+            aggregate = pd.DataFrame({'count': np.array([], dtype=np.int64), 
+                                      'mean': np.array([], dtype=np.float64),
+                                      'std': np.array([], dtype=np.float64)},
+                                     index=pd.MultiIndex.from_arrays([[], []], names=['sample', 'test']))
+        else:
+            #number each (sample, test) group and sort the values so each
+            #group is a contiguous run that can be reduced in one call
+            grouped = numeric.groupby(['sample', 'test'], sort=True)
+            codes = grouped.ngroup().to_numpy()
+            order = np.argsort(codes, kind='stable')
+            codes = codes[order]
+            values = numeric['value'].to_numpy().astype(np.longdouble)[order]
+            
+            starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+            counts = np.diff(np.append(starts, len(values)))
+            
+            means = np.add.reduceat(values, starts) / counts
+            deviations = values - np.repeat(means, counts)
+            squares = np.add.reduceat(deviations * deviations, starts)
+            stds = np.where(counts > 1, np.sqrt(squares / np.maximum(counts - 1, 1)), 0)
+            
+            aggregate = pd.DataFrame({'count': counts.astype(np.int64),
+                                      'mean': means.astype(np.float64),
+                                      'std': stds.astype(np.float64)},
+                                     index=grouped.size().index)
+        
+        self._aggregate = (version, aggregate)
+        
+        return aggregate
+        
+    def ordinal_averages(self, test_name, factors):
+        """ Average category of an ordinal test for every sample, see
+        SampleData.result_average_ordinal. The results are encoded as category
+        codes and averaged for all the samples in one grouped pass over
+        results_frame. Built once for each test and categories and reused until
+        results are added
+        
+        Args:
+            test_name (str): the name of the test
+            factors (str[]): the categories of the test from the lowest up
+            
+        Returns:
+            int[]: the average category code of each sample rounded to the
+                nearest code, in the order of the samples. Zero for samples
+                without results for the test
+        """
+        
+        version = self.results_version()
+        key = (test_name, tuple(factors))
+        cached = self._ordinals.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        import numpy as np
+        
+        frame = self.results_frame()
+        results = frame[frame['test'] == test_name]
+        
+        #results that aren't one of the categories count as the lowest
+        codes = results['raw'].str.strip().map(factor_codes(factors)).fillna(0)
+        grouped = codes.groupby(results['sample'].to_numpy(), sort=True)
+        tallies = grouped.sum()
+        
+        #numpy rounds halves to even the same as round
+        averages = np.zeros(len(self.samples), dtype=np.int64)
+        averages[tallies.index.to_numpy()] = np.round(tallies.to_numpy() / grouped.size().to_numpy())
+        averages = averages.tolist()
+        
+        self._ordinals[key] = (version, averages)
+        
+        return averages
+        
     def get_all_results(self, key_fields, test_name):
         """ Gets all the result values from each product and compiles it into
         a table. One column is the sample name and another column is the test
@@ -24,18 +232,21 @@ class SRGJob:
             DataFrame: a dataframe with all the test result values for every sample
         """
         
-        all_results = pd.DataFrame(columns=['sample', 'result'])
+        import pandas as pd
         
-        for sample in self.samples:
-            
-            if test_name in sample.test_results_values:
-                sample_name = sample.build_name(key_fields)
-                
-                for value in sample.test_results_values[test_name]:
+        #collect the columns then build the dataframe in one go
+        names = []
+        values = []
+        
+        for sample_name, samples in self.sample_index(key_fields).items():
+            for sample in samples:
                 
-                    all_results = all_results.append({'sample': sample_name,
-                                                      'result': value}, ignore_index=True)
+                if test_name in sample.test_results_values:
+                    sample_values = sample.test_results_values[test_name]
+                    names.extend([sample_name] * len(sample_values))
+                    values.extend(sample_values)
     
+        all_results = pd.DataFrame({'sample': names, 'result': values}, columns=['sample', 'result'])
                 
         #make sure the results are interpreted as numeric
         all_results['result'] = pd.to_numeric(all_results['result'])
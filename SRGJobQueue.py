@@ -0,0 +1,216 @@
+import sqlite3
+import pickle
+import datetime
+import threading
+
+#Job states in the order the stages of a job complete
+DISCOVERED = 'discovered'
+PARSED = 'parsed'
+TABLES_BUILT = 'tables built'
+RENDERED = 'rendered'
+UPLOADED = 'uploaded'
+SHARED = 'shared'
+#A job that can't be completed, the error column has the reason
+FAILED = 'failed'
+
+STAGES = [DISCOVERED, PARSED, TABLES_BUILT, RENDERED, UPLOADED, SHARED]
+#States of jobs that are finished and won't be picked up again
+FINISHED_STATES = [SHARED, FAILED]
+
+#Number of times a job is started before it is marked as failed
+MAX_ATTEMPTS = 3
+#Format of the created and updated times of a job
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+class SRGJobQueue:
+    """ Durable queue of jobs stored in a local SQLite database.
+
+    Each discovered spreadsheet is recorded as a job and moves through the
+    STAGES as it is processed. The artifact of each completed stage (the parsed
+    SRGJob, the built tables, the uploaded file id) is checkpointed so a
+    restarted background process resumes a job from its last completed stage.
+    """
+
+    def __init__(self, path):
+        """ Init function for the queue, creates the database if it doesn't exist
+
+        Args:
+            path (str): the path of the SQLite database file
+
+        Attributes:
+            path (str): the path of the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                    file_id TEXT NOT NULL,
+                                    name TEXT NOT NULL,
+                                    state TEXT NOT NULL,
+                                    attempts INTEGER NOT NULL DEFAULT 0,
+                                    error TEXT,
+                                    created TEXT NOT NULL,
+                                    updated TEXT NOT NULL,
+                                    cost REAL,
+                                    requester TEXT)""")
+            #queues created before jobs were estimated don't have the estimate columns
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            for column, kind in (('cost', 'REAL'), ('requester', 'TEXT')):
+                if column not in columns:
+                    self._db.execute("ALTER TABLE jobs ADD COLUMN {0} {1}".format(column, kind))
+            self._db.execute("""CREATE TABLE IF NOT EXISTS checkpoints (
+                                    job_id INTEGER NOT NULL,
+                                    stage TEXT NOT NULL,
+                                    data BLOB,
+                                    PRIMARY KEY (job_id, stage))""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+
+    def add(self, file_id, name):
+        """ Records a discovered spreadsheet as a job unless it already has an
+        unfinished job
+
+        Args:
+            file_id (str): the google drive id of the spreadsheet
+            name (str): the name of the spreadsheet when it was discovered
+
+        Returns:
+            (int, bool): the id of the job and True if it is a new job
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT job_id FROM jobs WHERE file_id = ? AND state NOT IN (?, ?)",
+                                   (file_id, SHARED, FAILED)).fetchone()
+            if row is not None:
+                return row[0], False
+
+            now = self._now()
+            cursor = self._db.execute("INSERT INTO jobs (file_id, name, state, created, updated) VALUES (?, ?, ?, ?, ?)",
+                                      (file_id, name, DISCOVERED, now, now))
+            return cursor.lastrowid, True
+
+    def estimate(self, job_id, cost, requester):
+        """ Records the estimated cost of a job and who requested it, used by
+        SRGScheduler to order the jobs
+
+        Args:
+            job_id (int): the id of the job
+            cost (float): the estimated cost of the job
+            requester (str): the requester the job is charged to
+        """
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET cost = ?, requester = ? WHERE job_id = ?", (cost, requester, job_id))
+
+    def pending(self):
+        """ Gets every unfinished job, oldest first
+
+        Returns:
+            dict[]: the jobs with the keys job_id, id (the file id), name, state,
+                attempts, created (datetime), cost and requester (None if the
+                job hasn't been estimated). The keys match a google drive file so
+                a job can be used in place of the file it was discovered from
+        """
+        with self._lock:
+            rows = self._db.execute("""SELECT job_id, file_id, name, state, attempts, created, cost, requester
+                                       FROM jobs WHERE state NOT IN (?, ?) ORDER BY job_id""",
+                                    (SHARED, FAILED)).fetchall()
+
+        return [{'job_id': row[0], 'id': row[1], 'name': row[2], 'state': row[3], 'attempts': row[4],
+                 'created': datetime.datetime.strptime(row[5], TIME_FORMAT), 'cost': row[6], 'requester': row[7]}
+                for row in rows]
+
+    def start_attempt(self, job_id):
+        """ Counts a new attempt at processing the job, failing the job if it
+        has been attempted too many times already
+
+        Args:
+            job_id (int): the id of the job
+
+        Returns:
+            bool: True if the job can be attempted
+        """
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET attempts = attempts + 1, updated = ? WHERE job_id = ?", (self._now(), job_id))
+            attempts = self._db.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+        if attempts > MAX_ATTEMPTS:
+            self.fail(job_id, "Gave up after {0} attempts".format(MAX_ATTEMPTS))
+            return False
+
+        return True
+
+    def checkpoint(self, job_id, state, data=None):
+        """ Moves the job to the state of the completed stage saving its artifact.
+        A failed job is left failed, eg. a stage that finishes after it was
+        abandoned for overrunning doesn't bring its job back
+
+        Args:
+            job_id (int): the id of the job
+            state (str): the stage the job has completed, one of STAGES
+            data (object): the artifact of the stage, must be picklable. None
+                if the stage has no artifact
+        """
+        blob = None if data is None else sqlite3.Binary(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+        with self._lock, self._db:
+            updated = self._db.execute("UPDATE jobs SET state = ?, updated = ? WHERE job_id = ? AND state != ?",
+                                       (state, self._now(), job_id, FAILED)).rowcount
+            if updated == 0:
+                return
+            self._db.execute("INSERT OR REPLACE INTO checkpoints (job_id, stage, data) VALUES (?, ?, ?)", (job_id, state, blob))
+
+            #finished jobs don't need their artifacts
+            if state in FINISHED_STATES:
+                self._db.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    def load(self, job_id, stage):
+        """ Loads the artifact checkpointed by a completed stage
+
+        Args:
+            job_id (int): the id of the job
+            stage (str): the stage to load the artifact of
+
+        Returns:
+            object: the artifact or None if the stage has no checkpoint
+        """
+        with self._lock:
+            row = self._db.execute("SELECT data FROM checkpoints WHERE job_id = ? AND stage = ?", (job_id, stage)).fetchone()
+
+        if row is None or row[0] is None:
+            return None
+
+        return pickle.loads(row[0])
+
+    def fail(self, job_id, error):
+        """ Marks the job as failed so it isn't processed again
+
+        Args:
+            job_id (int): the id of the job
+            error (str): the reason the job failed
+        """
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET state = ?, error = ?, updated = ? WHERE job_id = ?", (FAILED, error, self._now(), job_id))
+            self._db.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    def state(self, job_id):
+        """ Gets the current state of a job
+
+        Args:
+            job_id (int): the id of the job
+
+        Returns:
+            str: the state or None if there is no such job
+        """
+        with self._lock:
+            row = self._db.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+        return None if row is None else row[0]
+
+    def close(self):
+        """ Closes the database """
+        with self._lock:
+            self._db.close()
+
+    def _now(self):
+        return datetime.datetime.now().strftime(TIME_FORMAT)
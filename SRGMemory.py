@@ -0,0 +1,228 @@
+import collections
+import contextlib
+import gc
+import statistics
+import sys
+import tracemalloc
+from SRGScheduler import job_cost
+
+#Frames of the call stack kept with each traced allocation, 1 keeps the overhead low
+TRACE_FRAMES = 1
+#Bytes a job is expected to need for each unit of its estimated cost until jobs have been measured
+BYTES_PER_COST = 4096
+#Number of recent jobs the bytes needed per unit of cost are learned from
+MEMORY_SAMPLES = 20
+#Number of jobs the measured peak is kept for, used if the job is tried again
+MEASURED_JOBS = 100
+
+#Decisions of SRGMemory.admit
+ADMIT = 'admit'
+DEFER = 'defer'
+REJECT = 'reject'
+
+def format_bytes(size):
+    """ Formats a number of bytes for the activity log
+
+    Args:
+        size (int): the number of bytes
+
+    Returns:
+        str: the size in MB eg. '12.3 MB'
+    """
+    return "{0:.1f} MB".format(size / (1024 * 1024))
+
+class SRGMemory:
+    """ Measures the peak memory of each job and each stage of a job with
+    tracemalloc and keeps the jobs started within a memory ceiling.
+
+    The peak of a stage is the most memory allocated by python during the stage
+    on top of what was allocated when it started. Only this process is traced,
+    stages run in the worker pool allocate in the worker processes.
+
+    The memory a job will need is estimated from its cost, the SRGScheduler
+    estimate from the size of the spreadsheet, times the median bytes per unit
+    of cost the recent jobs needed. Jobs that imported modules aren't learned
+    from as the memory of the imports stays after the job. A job tried again
+    is estimated from the peak measured on its earlier attempt if that is more.
+    """
+
+    def __init__(self, ceiling=None):
+        """ Init function for the memory accounting
+
+        Args:
+            ceiling (int): the most bytes of traced memory jobs are started
+                with, None for no ceiling
+
+        Attributes:
+            ceiling (int): the most bytes of traced memory jobs are started with
+            stage_peaks (OrderedDict): the peak of each stage of the current job
+            last_job_peak (int): the peak of the last finished job, None before
+                the first job
+            deferred (int): the number of times a job was deferred
+            rejected (int): the number of jobs rejected
+        """
+        self.ceiling = ceiling
+        self.stage_peaks = collections.OrderedDict()
+        self.last_job_peak = None
+        self.deferred = 0
+        self.rejected = 0
+        self._ratios = collections.deque(maxlen=MEMORY_SAMPLES)
+        #the peak of each recent job with the job id as the key
+        self._measured = collections.OrderedDict()
+        self._modules = len(sys.modules)
+        self._tracing = False
+
+    def start(self):
+        """ Starts tracing python memory allocations """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._tracing = True
+
+    def stop(self):
+        """ Stops tracing if tracing was started by start """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def start_job(self):
+        """ Clears the stage peaks for the next job """
+        self.stage_peaks = collections.OrderedDict()
+        self._modules = len(sys.modules)
+
+    @contextlib.contextmanager
+    def measure_stage(self, stage):
+        """ Measures the peak memory of the stage run in the with block
+
+        Args:
+            stage (str): the name of the stage
+        """
+        if not tracemalloc.is_tracing():
+            yield
+            return
+
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            peak = max(tracemalloc.get_traced_memory()[1] - start, 0)
+            self.stage_peaks[stage] = max(peak, self.stage_peaks.get(stage, 0))
+
+    def finish_job(self, job):
+        """ Records the peak memory of a finished job, learning the bytes
+        needed per unit of cost from it
+
+        Args:
+            job (dict): the queued job from SRGJobQueue.pending()
+
+        Returns:
+            int: the peak of the job, the largest peak of its stages, None if
+                no stages were measured
+        """
+        if len(self.stage_peaks) == 0:
+            return None
+
+        peak = max(self.stage_peaks.values())
+        self.last_job_peak = peak
+
+        job_id = job.get('job_id')
+        if job_id is not None:
+            self._measured[job_id] = max(peak, self._measured.pop(job_id, 0))
+            while len(self._measured) > MEASURED_JOBS:
+                self._measured.popitem(last=False)
+
+        #only a job that ran all of its stages shows what its cost needs, and
+        #the peak of a job that imported modules counts the imports too
+        imported = len(sys.modules) > self._modules
+        if job.get('cost') and len(self.stage_peaks) > 1 and not imported:
+            self._ratios.append(peak / job.get('cost'))
+
+        return peak
+
+    def summary(self):
+        """ Describes the peaks of the current job for the activity log
+
+        Returns:
+            str: the peak of the job and of each stage
+        """
+        stages = ", ".join("{0} {1}".format(stage, format_bytes(peak)) for stage, peak in self.stage_peaks.items())
+        return "{0} ({1})".format(format_bytes(max(self.stage_peaks.values(), default=0)), stages)
+
+    def bytes_per_cost(self):
+        """ Gets the bytes a job needs for each unit of its estimated cost
+
+        Returns:
+            float: the median of the recent jobs, BYTES_PER_COST if no jobs
+                have been measured
+        """
+        if len(self._ratios) == 0:
+            return BYTES_PER_COST
+        return statistics.median(self._ratios)
+
+    def measured(self, job):
+        """ Gets the peak measured on an earlier attempt of a job
+
+        Args:
+            job (dict): the queued job from SRGJobQueue.pending()
+
+        Returns:
+            int: the peak in bytes, None if the job hasn't been measured
+        """
+        return self._measured.get(job.get('job_id'))
+
+    def estimate(self, job):
+        """ Estimates the memory a job will need
+
+        Args:
+            job (dict): the queued job from SRGJobQueue.pending()
+
+        Returns:
+            float: the estimated peak of the job in bytes, the peak measured on
+                an earlier attempt if that is more
+        """
+        return max(job_cost(job) * self.bytes_per_cost(), self.measured(job) or 0)
+
+    def in_use(self):
+        """ Gets the memory in use by python in this process
+
+        Returns:
+            int: the traced memory in bytes, 0 if memory isn't being traced
+        """
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[0]
+
+    def admit(self, job, count=True):
+        """ Decides if a job can be started within the memory ceiling
+
+        Args:
+            job (dict): the queued job from SRGJobQueue.pending()
+            count (bool): False to not count a deferral or rejection, eg. for
+                a first check before making room for the job
+
+        Returns:
+            str: ADMIT to start the job, DEFER if it doesn't fit with the
+                memory in use and REJECT if an earlier attempt of the job was
+                measured needing more than the ceiling. A job only estimated
+                to need more than the ceiling is deferred as the estimate is
+                learned from other jobs
+        """
+        if self.ceiling is None:
+            return ADMIT
+
+        measured = self.measured(job)
+        if measured is not None and measured > self.ceiling:
+            if count:
+                self.rejected += 1
+            return REJECT
+
+        estimate = self.estimate(job)
+        if self.in_use() + estimate > self.ceiling:
+            #garbage from the last job may be holding the memory
+            gc.collect()
+            if self.in_use() + estimate > self.ceiling:
+                if count:
+                    self.deferred += 1
+                return DEFER
+
+        return ADMIT
@@ -0,0 +1,352 @@
+import collections
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+
+#Interface the health and metrics endpoint listens on, only this machine can reach it
+METRICS_HOST = '127.0.0.1'
+#Number of recent durations of each stage the latency percentiles are taken from
+LATENCY_SAMPLES = 1000
+#Percentiles of the stage durations reported
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+def percentile(samples, quantile):
+    """ Gets a percentile of some samples by the nearest rank method
+
+    Args:
+        samples (float[]): the samples
+        quantile (float): the percentile as a fraction eg. 0.9
+
+    Returns:
+        float: the smallest sample at least quantile of the samples are less
+            than or equal to, None if there are no samples
+    """
+    if len(samples) == 0:
+        return None
+
+    ordered = sorted(samples)
+    rank = min(max(math.ceil(quantile * len(ordered)), 1), len(ordered))
+    return ordered[rank - 1]
+
+def rss_bytes():
+    """ Gets the resident memory of this process
+
+    Returns:
+        int: the resident set size in bytes, None where it can't be read
+    """
+    #/proc is only on linux, the current size isn't available elsewhere
+    #without extra packages
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def label_value(value):
+    """ Escapes a label value for the Prometheus text format
+
+    Args:
+        value (str): the value
+
+    Returns:
+        str: the escaped value
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def request_builder(metrics):
+    """ Builds the requestBuilder passed to googleapiclient's build so every
+    request the service executes is counted
+
+    Args:
+        metrics (SRGMetrics): the metrics the requests are counted in
+
+    Returns:
+        class: an HttpRequest subclass counting its executions by methodId
+    """
+    #the google api modules are slow to import so only load them with the services
+    from googleapiclient.http import HttpRequest
+
+    class CountedHttpRequest(HttpRequest):
+
+        def execute(self, *args, **kwargs):
+            try:
+                response = super().execute(*args, **kwargs)
+            except Exception:
+                metrics.count_api_call(self.methodId, error=True)
+                raise
+
+            metrics.count_api_call(self.methodId)
+            return response
+
+    return CountedHttpRequest
+
+class SRGMetrics:
+    """ Metrics of the running background process. The controller records the
+    duration of each job stage, the jobs in flight and every google api call,
+    and gauges read on demand like the queue depth are registered as functions.
+    The metrics can be served on a localhost HTTP endpoint in the Prometheus
+    text format at /metrics with a JSON health check at /health
+    """
+
+    def __init__(self):
+        """ Init function for the metrics
+
+        Attributes:
+            started (float): the time the metrics were created
+            last_poll (float): the time of the last poll for documents, None
+                before the first poll
+            jobs_in_flight (int): the number of jobs being processed
+            server (ThreadingHTTPServer): the endpoint, None if it isn't being served
+        """
+        self.started = time.time()
+        self.last_poll = None
+        self.jobs_in_flight = 0
+        self.server = None
+        self._latencies = {}
+        self._stage_totals = collections.OrderedDict()
+        self._stage_errors = collections.Counter()
+        self._memory_peaks = collections.OrderedDict()
+        self._api_calls = collections.Counter()
+        self._api_errors = collections.Counter()
+        self._gauges = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage, seconds, error=False):
+        """ Records the duration of a stage of a job
+
+        Args:
+            stage (str): the name of the stage
+            seconds (float): the time the stage took
+            error (bool): True if the stage raised an exception
+        """
+        with self._lock:
+            if stage not in self._latencies:
+                self._latencies[stage] = collections.deque(maxlen=LATENCY_SAMPLES)
+                self._stage_totals[stage] = [0, 0.0]
+
+            self._latencies[stage].append(seconds)
+            self._stage_totals[stage][0] += 1
+            self._stage_totals[stage][1] += seconds
+            if error:
+                self._stage_errors[stage] += 1
+
+    def observe_memory(self, stage, peak):
+        """ Records the peak memory of a stage of a job
+
+        Args:
+            stage (str): the name of the stage
+            peak (int): the peak memory of the stage in bytes
+        """
+        with self._lock:
+            last, most = self._memory_peaks.get(stage, (0, 0))
+            self._memory_peaks[stage] = (peak, max(most, peak))
+
+    @contextlib.contextmanager
+    def time_stage(self, stage):
+        """ Times the stage of a job run in the with block
+
+        Args:
+            stage (str): the name of the stage
+        """
+        start = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start, error)
+
+    @contextlib.contextmanager
+    def track_job(self):
+        """ Counts the job processed in the with block as in flight """
+        with self._lock:
+            self.jobs_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.jobs_in_flight -= 1
+
+    def poll(self):
+        """ Records that the documents have just been polled """
+        self.last_poll = time.time()
+
+    def count_api_call(self, method, error=False):
+        """ Counts a google api call
+
+        Args:
+            method (str): the id of the api method eg. drive.files.list
+            error (bool): True if the call raised an exception
+        """
+        with self._lock:
+            self._api_calls[method] += 1
+            if error:
+                self._api_errors[method] += 1
+
+    def add_gauge(self, name, description, function):
+        """ Registers a gauge read when the metrics are reported
+
+        Args:
+            name (str): the metric name, prefixed with srg_ when reported
+            description (str): the help text of the metric
+            function (callable): returns the current value, None if there isn't one
+        """
+        self._gauges[name] = (description, function)
+
+    def snapshot(self):
+        """ Gets the current value of every metric
+
+        Returns:
+            dict: the metrics with the keys uptime, last_poll, jobs_in_flight,
+                stages (the count, sum, errors and percentiles of each stage),
+                memory (the last and max peak memory of each stage),
+                api_calls and api_errors (the calls of each method) and gauges
+        """
+        with self._lock:
+            latencies = {stage: list(samples) for stage, samples in self._latencies.items()}
+            stages = collections.OrderedDict()
+            for stage, (count, total) in self._stage_totals.items():
+                stages[stage] = {'count': count, 'sum': total, 'errors': self._stage_errors[stage]}
+            memory = collections.OrderedDict((stage, {'last': last, 'max': most})
+                                             for stage, (last, most) in self._memory_peaks.items())
+            api_calls = dict(self._api_calls)
+            api_errors = dict(self._api_errors)
+            jobs_in_flight = self.jobs_in_flight
+
+        for stage, values in stages.items():
+            values['quantiles'] = {quantile: percentile(latencies[stage], quantile) for quantile in LATENCY_QUANTILES}
+
+        gauges = collections.OrderedDict()
+        for name, (description, function) in self._gauges.items():
+            #a gauge that fails to read is left out rather than failing the scrape
+            try:
+                gauges[name] = function()
+            except Exception:
+                gauges[name] = None
+
+        return {'uptime': time.time() - self.started,
+                'last_poll': self.last_poll,
+                'jobs_in_flight': jobs_in_flight,
+                'stages': stages,
+                'memory': memory,
+                'api_calls': api_calls,
+                'api_errors': api_errors,
+                'gauges': gauges}
+
+    def prometheus_text(self):
+        """ Formats the metrics in the Prometheus text exposition format
+
+        Returns:
+            str: the metrics
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append("# HELP srg_{0} {1}".format(name, description))
+            lines.append("# TYPE srg_{0} {1}".format(name, kind))
+            for suffix, labels, value in samples:
+                label_text = ",".join('{0}="{1}"'.format(key, label_value(label)) for key, label in labels)
+                lines.append("srg_{0}{1}{2} {3}".format(name, suffix, "{" + label_text + "}" if label_text else "", repr(float(value))))
+
+        metric('uptime_seconds', 'gauge', "Seconds since the background process started",
+               [('', (), snapshot['uptime'])])
+        if snapshot['last_poll'] is not None:
+            metric('last_poll_timestamp_seconds', 'gauge', "Time of the last poll for documents",
+                   [('', (), snapshot['last_poll'])])
+        metric('jobs_in_flight', 'gauge', "Jobs being processed",
+               [('', (), snapshot['jobs_in_flight'])])
+
+        samples = []
+        for stage, values in snapshot['stages'].items():
+            for quantile, value in values['quantiles'].items():
+                samples.append(('', (('stage', stage), ('quantile', quantile)), value))
+            samples.append(('_sum', (('stage', stage),), values['sum']))
+            samples.append(('_count', (('stage', stage),), values['count']))
+        metric('stage_seconds', 'summary', "Seconds taken by each stage of a job, quantiles of the last {0}".format(LATENCY_SAMPLES), samples)
+        metric('stage_errors_total', 'counter', "Stages of a job that raised an error",
+               [('', (('stage', stage),), values['errors']) for stage, values in snapshot['stages'].items()])
+
+        if len(snapshot['memory']) > 0:
+            metric('stage_peak_memory_bytes', 'gauge', "Peak python memory of each stage of the last job",
+                   [('', (('stage', stage),), values['last']) for stage, values in snapshot['memory'].items()])
+            metric('stage_peak_memory_bytes_max', 'gauge', "Highest peak python memory of each stage of any job",
+                   [('', (('stage', stage),), values['max']) for stage, values in snapshot['memory'].items()])
+
+        metric('api_calls_total', 'counter', "Google api calls by method",
+               [('', (('method', method),), count) for method, count in sorted(snapshot['api_calls'].items())])
+        metric('api_errors_total', 'counter', "Google api calls that raised an error by method",
+               [('', (('method', method),), count) for method, count in sorted(snapshot['api_errors'].items())])
+
+        for name, value in snapshot['gauges'].items():
+            if value is not None:
+                metric(name, 'gauge', self._gauges[name][0], [('', (), value)])
+
+        return "\n".join(lines) + "\n"
+
+    def health(self):
+        """ Gets the health check of the process
+
+        Returns:
+            dict: status (always ok while the process is serving), uptime,
+                last_poll and jobs_in_flight
+        """
+        return {'status': 'ok',
+                'uptime': time.time() - self.started,
+                'last_poll': self.last_poll,
+                'jobs_in_flight': self.jobs_in_flight}
+
+    def serve(self, port, host=METRICS_HOST):
+        """ Serves the metrics on an HTTP endpoint in a background thread
+
+        Args:
+            port (int): the port to listen on, 0 for any free port
+            host (str): the interface to listen on
+
+        Returns:
+            int: the port the endpoint is listening on
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body = metrics.prometheus_text().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/health':
+                    body = json.dumps(metrics.health()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                #scrapes aren't written to stderr
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="SRGMetricsServer", daemon=True).start()
+
+        return self.server.server_address[1]
+
+    def close(self):
+        """ Stops the endpoint if it is being served """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
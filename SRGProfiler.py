@@ -0,0 +1,143 @@
+import cProfile
+import pstats
+import io
+import os
+import re
+import datetime
+
+#Control file written by 'SRG.py profile' to request profiling of the next jobs
+PROFILE_CONTROL_FILE = 'profile.ctl'
+#Folder the pstats files are saved in
+PROFILE_FOLDER = 'profiles'
+#Number of jobs to profile when no count is given
+DEFAULT_PROFILE_JOBS = 1
+#Number of hot functions written to the activity log for each profiled job
+PROFILE_SUMMARY_LINES = 15
+
+class SRGProfiler:
+    """ Turns on cProfile for a number of upcoming jobs in the running
+    background process. Profiling is requested either by a control file
+    written by 'SRG.py profile N' or by a signal handled by the controller
+    """
+
+    def __init__(self, view, base_path):
+        """ Init function for the profiler
+
+        Args:
+            view (class): A view class with a display_message function used to
+                report the hot function summary
+            base_path (str): the folder the control file and profiles folder are in
+
+        Attributes:
+            view (class): the view used to report the profile summaries
+            control_path (str): full path of the profile control file
+            profile_path (str): full path of the folder the pstats files are saved in
+            remaining (int): how many more jobs should be profiled
+        """
+        self.view = view
+        self.control_path = os.path.join(base_path, PROFILE_CONTROL_FILE)
+        self.profile_path = os.path.join(base_path, PROFILE_FOLDER)
+        self.remaining = 0
+        #jobs requested by request, only ever increased so a signal handler can
+        #add to it without a lock, and how many of them are in remaining
+        self._requested = 0
+        self._counted = 0
+
+    def request(self, count=DEFAULT_PROFILE_JOBS):
+        """ Requests profiling for the next count jobs. Safe to call from a
+        signal handler as it only increases a counter and takes no lock, the
+        main loop adds the requested jobs to remaining in start_job
+
+        Args:
+            count (int): the number of jobs to profile
+        """
+        self._requested += max(count, 0)
+
+    def check_control(self):
+        """ Reads and removes the control file if one has been written
+        adding the requested number of jobs to the profile count
+
+        Returns:
+            int: the number of jobs requested by the control file, 0 if none
+        """
+
+        if not os.path.isfile(self.control_path):
+            return 0
+
+        try:
+            f = open(self.control_path, "r")
+            content = f.read().strip()
+            f.close()
+            os.remove(self.control_path)
+        except OSError:
+            return 0
+
+        #an empty or invalid control file profiles the default number of jobs
+        try:
+            count = int(content)
+        except ValueError:
+            count = DEFAULT_PROFILE_JOBS
+
+        self.remaining += max(count, 0)
+
+        return count
+
+    def start_job(self):
+        """ Starts a profile for the job about to run if profiling is requested
+
+        Returns:
+            cProfile.Profile: the enabled profile or None if this job is not profiled
+        """
+
+        self.check_control()
+
+        requested = self._requested
+        self.remaining += requested - self._counted
+        self._counted = requested
+
+        if self.remaining <= 0:
+            return None
+        self.remaining -= 1
+
+        profile = cProfile.Profile()
+        profile.enable()
+
+        return profile
+
+    def finish_job(self, profile, sheet_name):
+        """ Stops the profile, saves the pstats file tagged with the spreadsheet
+        name and writes the hot function summary to the view
+
+        Args:
+            profile (cProfile.Profile): the profile returned by start_job
+            sheet_name (str): the name of the spreadsheet the job was for
+
+        Returns:
+            str: the path of the saved pstats file, None if it couldn't be saved
+        """
+
+        if profile is None:
+            return None
+
+        profile.disable()
+
+        #make the spreadsheet name safe to use as part of a filename
+        tag = re.sub(r'[^A-Za-z0-9_.-]+', '_', sheet_name.replace('PROCESS ', '')).strip('_')
+        filename = "{0}-{1}.pstats".format(datetime.datetime.now().strftime("%Y%m%d%H%M%S"), tag)
+        path = os.path.join(self.profile_path, filename)
+
+        try:
+            os.makedirs(self.profile_path, exist_ok=True)
+            profile.dump_stats(path)
+        except OSError:
+            self.view.display_error("Could not save profile " + path)
+            path = None
+
+        #summary of the hot functions sorted by cumulative time
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(PROFILE_SUMMARY_LINES)
+
+        self.view.display_message("Profile for {0} saved to {1}\n{2}".format(sheet_name, path, stream.getvalue()))
+
+        return path
@@ -0,0 +1,130 @@
+import datetime
+
+#Cost of a tab on top of its rows, the requests and parsing every tab needs
+TAB_COST = 100
+#Cost of a job without an estimate, eg. one queued before estimates were recorded
+DEFAULT_COST = 5000
+#Cost taken off a job for every second it has waited, so a large job moves
+#ahead of smaller jobs once it has waited long enough and is never starved
+AGING_RATE = 10
+#Seconds for the work charged to a requester to halve, older jobs count for less
+USAGE_HALF_LIFE = 60 * 60
+
+def estimate_cost(sheets):
+    """ Estimates the cost of processing a spreadsheet from its metadata
+
+    Args:
+        sheets (dict[]): the properties of each tab from the sheets api
+
+    Returns:
+        int: the estimated cost, the rows of every tab plus TAB_COST per tab
+    """
+    cost = 0
+    for properties in sheets:
+        cost += TAB_COST + properties.get('gridProperties', {}).get('rowCount', 0)
+    return cost
+
+def requester_key(share_with):
+    """ Gets the requester a job is charged to from its ShareWith field
+
+    Args:
+        share_with (str): the user email or domain the report is shared with,
+            None if the job doesn't have one
+
+    Returns:
+        str: the requester, jobs without a ShareWith field share the requester ''
+    """
+    if share_with is None:
+        return ''
+    return share_with.strip().lower()
+
+def job_cost(job):
+    """ Gets the estimated cost of a queued job
+
+    Args:
+        job (dict): the queued job from SRGJobQueue.pending()
+
+    Returns:
+        float: the estimated cost, DEFAULT_COST if the job wasn't estimated
+    """
+    cost = job.get('cost')
+    return DEFAULT_COST if cost is None else cost
+
+class SRGScheduler:
+    """ Decides the order the queued jobs are processed in.
+
+    Jobs are ordered by their estimated cost, shortest first, less AGING_RATE
+    for each second they have waited. Each requester (the ShareWith user or
+    domain) is charged the cost of the jobs processed for them and their
+    charge, decaying with USAGE_HALF_LIFE, is added to the cost of their jobs
+    so one requester flagging many spreadsheets doesn't hold up everyone else.
+    Charges are kept in memory and start again when the process restarts.
+    """
+
+    def __init__(self):
+        """ Init function for the scheduler """
+        #the charge of each requester and the time it was last updated
+        self._usage = {}
+
+    def usage(self, requester, now=None):
+        """ Gets the decayed charge of a requester
+
+        Args:
+            requester (str): the requester
+            now (datetime): the current time, None for now
+
+        Returns:
+            float: the charge of the requester
+        """
+        if requester not in self._usage:
+            return 0.0
+
+        now = datetime.datetime.now() if now is None else now
+        usage, updated = self._usage[requester]
+        elapsed = max((now - updated).total_seconds(), 0)
+        return usage * 0.5 ** (elapsed / USAGE_HALF_LIFE)
+
+    def charge(self, job, now=None):
+        """ Charges the requester of a job for the job, called as the job starts
+
+        Args:
+            job (dict): the queued job from SRGJobQueue.pending()
+            now (datetime): the current time, None for now
+        """
+        now = datetime.datetime.now() if now is None else now
+        requester = job.get('requester') or ''
+        self._usage[requester] = (self.usage(requester, now) + job_cost(job), now)
+
+    def order(self, jobs, now=None):
+        """ Orders jobs in the order they should be processed. Each job picked
+        is charged to its requester before the next is picked so the jobs of
+        requesters are interleaved
+
+        Args:
+            jobs (dict[]): the queued jobs from SRGJobQueue.pending(), oldest first
+            now (datetime): the current time, None for now
+
+        Returns:
+            dict[]: the jobs, first to process first
+        """
+        now = datetime.datetime.now() if now is None else now
+        usage = {}
+        for job in jobs:
+            requester = job.get('requester') or ''
+            if requester not in usage:
+                usage[requester] = self.usage(requester, now)
+
+        def priority(job):
+            waited = max((now - job.get('created', now)).total_seconds(), 0)
+            return job_cost(job) - AGING_RATE * waited + usage[job.get('requester') or '']
+
+        remaining = list(jobs)
+        ordered = []
+        while len(remaining) > 0:
+            #min keeps the oldest of jobs with the same priority first
+            job = min(remaining, key=priority)
+            remaining.remove(job)
+            ordered.append(job)
+            usage[job.get('requester') or ''] += job_cost(job)
+
+        return ordered
@@ -0,0 +1,156 @@
+import os
+import signal
+import time
+
+#pidfile holding the process id of the running background process
+PID_FILE = 'srg.pid'
+#Seconds to wait for a background process to stop after signalling it
+STOP_WAIT = 30
+
+def pid_path():
+    """ Gets the full path of the pidfile
+
+    Returns:
+        str: The full path of the pidfile in the program folder
+    """
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), PID_FILE)
+
+def process_start(pid):
+    """ Gets the start time of a process, which tells a process apart from a
+    later process given the same process id
+
+    Args:
+        pid (int): the process id
+
+    Returns:
+        str: the start time in clock ticks since boot from /proc, None if the
+            process isn't running or /proc isn't available
+    """
+    try:
+        f=open("/proc/{0}/stat".format(pid), "r")
+        stat = f.read()
+        f.close()
+    except OSError:
+        return None
+
+    #the command name in brackets can contain spaces, the start time is the
+    #20th field after it
+    try:
+        return stat[stat.rindex(')') + 2:].split()[19]
+    except (ValueError, IndexError):
+        return None
+
+def write_pidfile(session_id):
+    """ Records this process as the running background process
+
+    Args:
+        session_id (str): the id of the session, written after the process id
+    """
+    f=open(pid_path(), "w+")
+    f.write("{0}\n{1}\n{2}\n".format(os.getpid(), session_id, process_start(os.getpid()) or ''))
+    f.close()
+
+def remove_pidfile():
+    """ Removes the pidfile if it belongs to this process """
+    if read_pid() == os.getpid():
+        try:
+            os.remove(pid_path())
+        except OSError:
+            pass
+
+def read_pidfile():
+    """ Reads the pidfile of the running background process
+
+    Returns:
+        (int, str): the process id and its start time, see process_start. The
+            start time is None if it wasn't recorded. (None, None) if there
+            is no valid pidfile
+    """
+    try:
+        f=open(pid_path(), "r")
+        lines = f.read().splitlines()
+        f.close()
+        start = lines[2] if len(lines) > 2 and lines[2] != '' else None
+        return int(lines[0]), start
+    except (OSError, ValueError, IndexError):
+        return None, None
+
+def read_pid():
+    """ Reads the process id of the running background process
+
+    Returns:
+        int: the process id or None if there is no valid pidfile
+    """
+    return read_pidfile()[0]
+
+def is_running(pid, start=None):
+    """ Checks if a process is still running
+
+    Args:
+        pid (int): the process id to check
+        start (str): the start time recorded for the process, when given a
+            different process that was given the same process id isn't counted
+
+    Returns:
+        bool: True if the process is running. Always True on windows where
+            a process can't be checked without terminating it
+    """
+    if os.name == 'nt':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    #the start time can't be checked without /proc
+    current = process_start(pid)
+    return start is None or current is None or current == start
+
+def session_pid():
+    """ Gets the process id of the running background process, checking the
+    process in the pidfile is still the process that wrote it
+
+    Returns:
+        int: the process id or None if the background process isn't running
+    """
+    pid, start = read_pidfile()
+    if pid is None or not is_running(pid, start):
+        return None
+    return pid
+
+def stop_session(wait=STOP_WAIT):
+    """ Signals the running background process to stop with SIGTERM and
+    waits for it to finish its current job and remove the pidfile
+
+    Args:
+        wait (float): the maximum seconds to wait for the process to stop
+
+    Returns:
+        bool: True if a running process was signalled
+    """
+    pid, start = read_pidfile()
+    if pid is None:
+        return False
+
+    #stale pidfile left by a process that was killed, its process id may
+    #since have been given to another process
+    if not is_running(pid, start):
+        os.remove(pid_path())
+        return False
+
+    os.kill(pid, signal.SIGTERM)
+
+    #windows terminates the process straight away so it can't clean up
+    if os.name == 'nt':
+        os.remove(pid_path())
+        return True
+
+    #wait for the process to clean up its pidfile
+    deadline = time.time() + wait
+    while time.time() < deadline and read_pid() == pid and is_running(pid, start):
+        time.sleep(0.1)
+
+    return True
@@ -0,0 +1,110 @@
+import concurrent.futures
+import queue
+import threading
+
+class StageTimeout(Exception):
+    """ Raised when a stage of a job runs longer than its time limit """
+
+    def __init__(self, stage, seconds):
+        """ Init function for the error
+
+        Args:
+            stage (str): the name of the stage that overran
+            seconds (float): the time limit of the stage
+
+        Attributes:
+            stage (str): the name of the stage that overran
+            seconds (float): the time limit of the stage
+        """
+        super().__init__("Stage {0} took longer than {1} seconds".format(stage, seconds))
+        self.stage = stage
+        self.seconds = seconds
+
+class SRGWatchdog:
+    """ Runs the stages of a job on a stage thread and waits for each one for
+    at most its time limit. Python threads can't be killed so a stage that
+    overruns is abandoned, left to finish in the background while the caller
+    moves on, and the next stages are run on a new stage thread.
+
+    Stages run on the same thread until one is abandoned so the google api
+    services and connections of that thread are reused between stages.
+    """
+
+    def __init__(self):
+        """ Init function for the watchdog
+
+        Attributes:
+            abandoned (int): the number of stages that overran and were abandoned
+        """
+        self.abandoned = 0
+        self._tasks = None
+        self._lock = threading.Lock()
+
+    def run(self, stage, seconds, function, *args):
+        """ Runs a stage and waits for it to finish. Exceptions from the stage
+        are raised here
+
+        Args:
+            stage (str): the name of the stage
+            seconds (float): the time limit of the stage, None for no limit
+            function (callable): the stage
+            *args: the arguments for the function
+
+        Returns:
+            object: the return value of the function
+
+        Raises:
+            StageTimeout: if the stage is still running after its time limit
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._tasks is None:
+                self._tasks = self._start_thread()
+            tasks = self._tasks
+        tasks.put((future, function, args))
+
+        try:
+            return future.result(timeout=seconds)
+        except concurrent.futures.TimeoutError:
+            #the stuck thread stops once its stage ends, later stages get a new thread
+            with self._lock:
+                if self._tasks is tasks:
+                    self._tasks = None
+                self.abandoned += 1
+            tasks.put(None)
+            raise StageTimeout(stage, seconds)
+
+    def close(self):
+        """ Stops the stage thread once its current stage has finished """
+        with self._lock:
+            if self._tasks is not None:
+                self._tasks.put(None)
+                self._tasks = None
+
+    def _start_thread(self):
+        """ Starts a stage thread
+
+        Returns:
+            queue.Queue: the queue of stages for the thread, None stops the thread
+        """
+        tasks = queue.Queue()
+
+        def work():
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+
+                future, function, args = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    future.set_result(function(*args))
+                except BaseException as ex:
+                    future.set_exception(ex)
+
+        #a daemon thread so an abandoned stage never stops the process exiting
+        threading.Thread(target=work, name="SRGStageThread", daemon=True).start()
+
+        return tasks
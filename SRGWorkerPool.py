@@ -0,0 +1,147 @@
+import multiprocessing
+
+#modules imported by the parent of the worker processes so workers start with them loaded
+PRELOAD_MODULES = ['pandas', 'statsmodels.api', 'statsmodels.formula.api', 'scipy.stats',
+                   'docx', 'matplotlib.figure', 'matplotlib.backends.backend_agg',
+                   'ResultsTableBuilder', 'MicrosoftDocxParser']
+#Seconds between checks that the pool running a job's work hasn't been restarted
+RESTART_POLL = 1
+
+def preload():
+    """ Imports the heavy modules used by the CPU bound stages so a job
+    doesn't pay for the imports. Used as the worker initializer where workers
+    can't be forked from a preloaded parent
+    """
+    import importlib
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+
+def worker_context():
+    """ Gets the multiprocessing context worker processes are started with.
+    Where available workers are forked from a forkserver that has imported the
+    PRELOAD_MODULES, which keeps the caller's threads out of the workers
+
+    Returns:
+        multiprocessing.context.BaseContext: the forkserver or spawn context
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        return context
+
+    return multiprocessing.get_context('spawn')
+
+def build_tables(table_commands, job, executor=None, max_workers=None, image_folder=None):
+    """ Builds the results tables for a job, run in a worker process
+
+    Args:
+        table_commands (str[]): the table commands extracted from the template
+        job (SRGJob): job object that contains all the samples and their data
+        executor (str): 'thread' or 'process' to build independent tables in
+            parallel, None to build them one after another
+        max_workers (int): the number of threads or processes for the executor
+        image_folder (str): the folder images of tables are cached in
+
+    Returns:
+        dict: the result tables with the command as the key
+    """
+    from ResultsTableBuilder import ResultsTableBuilder
+    return ResultsTableBuilder(executor, max_workers, image_folder).create_tables(table_commands, job)
+
+def render_report(document_path, fields, tables, plan_folder=None):
+    """ Fills the report template with the fields and tables, run in a worker process
+
+    Args:
+        document_path (str): the path of the template doc file, overwritten with the report
+        fields (dict): the job fields to replace in the text
+        tables (dict): the result tables with the command as the key
+        plan_folder (str): the folder compiled render plans are saved in
+    """
+    from MicrosoftDocxParser import MicrosoftDocxParser
+    MicrosoftDocxParser().generate_report(document_path, fields, tables, plan_folder)
+
+class SRGWorkerPool:
+    """ Pool of worker processes that runs the CPU bound stages of a job
+    (statistics, DataFrame building and docx XML work) outside the GIL of the
+    controller.
+
+    Where available the workers are forked from a forkserver that has already
+    imported pandas, statsmodels and docx so there is no per worker import cost.
+    """
+
+    def __init__(self, processes):
+        """ Init function for the pool, starts the worker processes
+
+        Args:
+            processes (int): the number of worker processes
+
+        Attributes:
+            processes (int): the number of worker processes
+            pool (multiprocessing.Pool): the pool of worker processes
+        """
+        self.processes = processes
+
+        self.pool = worker_context().Pool(processes, initializer=preload)
+
+    def run(self, function, *args):
+        """ Runs the function in a worker process and waits for the result.
+        Exceptions raised in the worker are raised again here
+
+        Args:
+            function (callable): a module level function to run
+            *args: the arguments for the function, must be picklable
+
+        Returns:
+            object: the return value of the function
+        """
+        return self.run_all([(function, args)])[0]
+
+    def run_all(self, calls):
+        """ Runs the functions in the worker processes at the same time and
+        waits for all their results. The first exception raised in a worker
+        is raised again here
+
+        Args:
+            calls ((callable, tuple)[]): each module level function to run and
+                its arguments, which must be picklable
+
+        Returns:
+            object[]: the return value of each function in the order of calls
+        """
+        pool = self.pool
+        results = [(function, pool.apply_async(function, args)) for function, args in calls]
+        
+        #a restarted pool never finishes the work it had
+        for function, result in results:
+            while not result.ready():
+                result.wait(RESTART_POLL)
+                if pool is not self.pool and not result.ready():
+                    raise RuntimeError("Worker pool was restarted before {0} finished".format(function.__name__))
+        
+        return [result.get() for function, result in results]
+
+    def submit(self, function, *args):
+        """ Runs the function in a worker process without waiting
+
+        Args:
+            function (callable): a module level function to run
+            *args: the arguments for the function, must be picklable
+
+        Returns:
+            multiprocessing.pool.AsyncResult: call get() for the return value
+        """
+        return self.pool.apply_async(function, args)
+
+    def restart(self):
+        """ Stops the workers straight away, abandoning their work, and starts
+        new ones. Used when a stage overruns so a stuck worker doesn't hold up
+        the next jobs
+        """
+        old_pool = self.pool
+        self.pool = worker_context().Pool(self.processes, initializer=preload)
+        old_pool.terminate()
+
+    def close(self):
+        """ Waits for the submitted work to finish and stops the workers """
+        self.pool.close()
+        self.pool.join()
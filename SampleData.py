@@ -1,6 +1,48 @@
 import re
 import statistics
 
+#matches a result that starts with an int or float, compiled once for every result
+NUMBER_PATTERN = re.compile(r"(\d+(?:\.\d+)?)")
+
+def parse_result(result):
+    """Converts a result string to a number if it is one
+    
+    Args:
+        result (str): the results value, numbers are passed as strings
+        
+    Returns:
+        (float, str): the value or None if the result isn't a number and the
+            unit '%' if the result is a percentage otherwise None
+    """
+    unit = None
+    
+    #if results are expressed as a % then remove this from the string
+    if '%' in result:
+        result = result.replace('%', '')
+        unit = '%'
+    
+    #check string for regular expression matching a int or float
+    if NUMBER_PATTERN.match(result) is not None:
+        return float(result), unit
+    
+    return None, unit
+
+def factor_codes(factors):
+    """Encodes the categories of an ordinal test as integer codes
+    
+    Args:
+        factors (str[]): the categories of the test from the lowest up
+        
+    Returns:
+        dict: the code of each category with white space stripped from the
+            category as the key and its index in factors as the value
+    """
+    codes = {}
+    for code, factor in enumerate(factors):
+        #the first of any repeated categories is used, as list.index did
+        codes.setdefault(factor.strip(), code)
+    return codes
+
 
 class SampleData:
     """Object that stores all the sample details and test results. 
@@ -19,11 +61,25 @@ class SampleData:
                 the key and the value as a double representation of the result
             test_units (dict): A dictionary of test units with the test name as
                 the key and the test unit as the value
+            details_version (int): Counts the changes to the details, used to
+                check if names built from the details are still current
+            results_version (int): Counts the results added, used to check if
+                results collected from the sample are still current
         """
         self.details = {}
         self.test_results = {}
         self.test_results_values = {}
         self.test_units = {}
+        self.details_version = 0
+        self.results_version = 0
+        #names already built by build_name with the field tuple as the key
+        self._names = {}
+        
+    def __getstate__(self):
+        #built names are left out of pickles, they are built again when needed
+        state = self.__dict__.copy()
+        state['_names'] = {}
+        return state
         
     def get_max_replicates(self, tests = None):
         """Gets the maximum number of replicates across all tests. Used
@@ -53,6 +109,8 @@ class SampleData:
         """Compiles a decriptive sample string based on fields from the sample
         details
         
+        Names are cached for each set of fields until the details change
+        
         Args:
             fields (string[]): a list of fields to find in the sample details
          
@@ -60,11 +118,15 @@ class SampleData:
             string: The compiled name string
         """
         
+        key = tuple(field.strip() for field in fields)
+        
+        name = self._names.get(key)
+        if name is not None:
+            return name
+        
         name = ""
         
-        for field in fields:
-            
-            field = field.strip()
+        for field in key:
             
             if field in self.details:
                 #add a space between fields
@@ -73,6 +135,8 @@ class SampleData:
                 
                 #add the sample detail to the name string
                 name += self.details[field]
+        
+        self._names[key] = name
                 
         return name
     
@@ -93,17 +157,15 @@ class SampleData:
             self.test_results[test_name] = []
             
         self.test_results[test_name].append(result)
+        self.results_version += 1
         
         #check if this is a number and if so store it in the values dict
+        val, unit = parse_result(result)
         
-        #if results are expressed as a % then remove this from the string
-        if '%' in result:
-            result = result.replace('%', '')
-            self.test_units[test_name] = '%'
+        if unit is not None:
+            self.test_units[test_name] = unit
         
-        #check string for regular expression matching a int or float
-        if re.match("(\d+(?:\.\d+)?)", result) is not None:
-            val = float(result)
+        if val is not None:
             
             #add the key if it doesn't already exist
             if test_name not in self.test_results_values:
@@ -112,6 +174,72 @@ class SampleData:
             self.test_results_values[test_name].append(val)
         
         
+    def add_results(self, test_names, results):
+        """Adds a column of results at once, the same as calling add_result for
+        each test name and result in turn. The results are classified and
+        converted to numbers together instead of one at a time
+        
+        Args:
+            test_names (str[]): The name of the test of each result
+            results (str[]): the results values, numbers are passed as strings
+        """
+        
+        if len(results) == 0:
+            return
+        
+        #numpy is only needed for bulk results so import it on first use
+        import numpy as np
+        import pandas as pd
+        
+        #results repeat a lot, eg. ratings and rounded numbers, so each
+        #distinct result is only classified and converted once
+        result_objects = np.array(results, dtype=object)
+        result_codes, distinct = pd.factorize(result_objects, sort=False)
+        
+        distinct_percent = np.array(['%' in result for result in distinct], dtype=bool)
+        stripped = [result.replace('%', '') for result in distinct]
+        
+        #NUMBER_PATTERN matches when the result starts with a digit, the
+        #first character of each result is all that needs checking
+        distinct_numeric = np.array([result[:1].isdecimal() for result in stripped], dtype=bool)
+        distinct_values = np.zeros(len(distinct), dtype=float)
+        try:
+            distinct_values[distinct_numeric] = [float(result) for result, number in zip(stripped, distinct_numeric) if number]
+        except ValueError:
+            #raise at the same result with the same results added as add_result
+            for test_name, result in zip(test_names, results):
+                self.add_result(test_name, result)
+            return
+        
+        percent = distinct_percent[result_codes]
+        numeric = distinct_numeric[result_codes]
+        values = distinct_values[result_codes[numeric]]
+        
+        #group the rows of each test, keeping them in row order, so the results
+        #and values of each test are a slice
+        codes, tests = pd.factorize(pd.Series(test_names, dtype=object), sort=False)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(tests) + 1))
+        numeric_codes = codes[numeric]
+        value_order = np.argsort(numeric_codes, kind='stable')
+        value_bounds = np.searchsorted(numeric_codes[value_order], np.arange(len(tests) + 1))
+        values = values[value_order]
+        
+        for code, test_name in enumerate(tests):
+            rows = order[bounds[code]:bounds[code + 1]]
+            self.test_results.setdefault(test_name, []).extend(result_objects[rows].tolist())
+            
+        #new tests are added to the values and units in the order of their
+        #first number or percentage, as add_result adds them
+        for code in pd.unique(numeric_codes):
+            self.test_results_values.setdefault(tests[code], []).extend(
+                values[value_bounds[code]:value_bounds[code + 1]].tolist())
+            
+        for code in pd.unique(codes[percent]):
+            self.test_units[tests[code]] = '%'
+            
+        self.results_version += len(results)
+        
     def add_detail(self, name, value):
         """Adds a single sample detail
         
@@ -121,6 +249,10 @@ class SampleData:
         """
         self.details[name] = value
         
+        #names built from the old details are no longer valid
+        self.details_version += 1
+        self._names = {}
+        
     def result_average(self, test_name):
         """Averages the results of a single test
         
@@ -152,11 +284,10 @@ class SampleData:
         if test_name in self.test_results:
             if len(self.test_results[test_name]) > 0:
                 
+                codes = factor_codes(factor_values[test_name])
                 tally = 0
                 for result in self.test_results[test_name]:
-                    
-                    if result in factor_values[test_name]:
-                        tally += factor_values[test_name].index(result)
+                    tally += codes.get(result.strip(), 0)
                 
                 #round to the nearest factor
                 return round(tally / len(self.test_results[test_name]))
@@ -1,14 +1,31 @@
-import statsmodels.api as sm
-from statsmodels.formula.api import ols
-from scipy import stats
-
 def mean(list):
     if len(list) > 0:
         return sum(list) / len(list)
     
     return 0
+
+def anova_p(sample_results):
+    """ Runs a one way anova on the whole set of results
+    
+    Args:
+        sample_results (DataFrame): A dataframe of the all the results, one column is
+            sample name and another is result
+            
+    Returns:
+        float: the p value that all the sample means are the same
+    """
+    
+    #statsmodels is slow to import so load it on first use
+    import statsmodels.api as sm
+    from statsmodels.formula.api import ols
     
-def compare_anova(sample_results, comparison_sample_name, min_p=0.05):
+    mod = ols('result ~ sample', data=sample_results).fit()              
+    
+    aov_table = sm.stats.anova_lm(mod, typ=2)
+    
+    return aov_table['PR(>F)'][0]
+    
+def compare_anova(sample_results, comparison_sample_name, min_p=0.05, anova_p_value=None):
     """ Run a anova analysis on the whole set of results and then compare
     the comparison_sample_name to each other product in the set. Creates 3 lists
     of samples that the comnparison sample is better than, no statistical difference
@@ -20,6 +37,8 @@ def compare_anova(sample_results, comparison_sample_name, min_p=0.05):
         comparison_sample_name (str): the name of the sample to run the
             comparisons against
         min_p (float): minimum p value to be insignificant ie. 0.05 = 95% confidence level
+        anova_p_value (float): the result of anova_p for the sample results if it has
+            already been calculated, saves refitting the model for each comparison sample
             
     Returns:
         (str[], str[], str[]): Tuple of arrays, the first being the list of product names
@@ -28,13 +47,13 @@ def compare_anova(sample_results, comparison_sample_name, min_p=0.05):
             the comparison sample is worse than
     """
     
-    mod = ols('result ~ sample', data=sample_results).fit()              
-    
-    aov_table = sm.stats.anova_lm(mod, typ=2)
+    #scipy is slow to import so load it on first use
+    from scipy import stats
     
-    anova_p = aov_table['PR(>F)'][0]
+    if anova_p_value is None:
+        anova_p_value = anova_p(sample_results)
     
-    if anova_p < min_p:
+    if anova_p_value < min_p:
         #At least one of the sample means is statistically different
         
         #POST HOC Analysis - Bonferroni correction method
@@ -47,8 +66,12 @@ def compare_anova(sample_results, comparison_sample_name, min_p=0.05):
         K = (k * (k-1)) / 2        
         bon_corr = min_p / K
                 
+        #results of each sample indexed by the sample name
+        sample_groups = dict(list(sample_results.groupby('sample', sort=False)['result']))
+        no_results = sample_results['result'][0:0]
+                
         #data for comparison sample
-        comparison_sample_data = sample_results['result'][sample_results['sample'] == comparison_sample_name]
+        comparison_sample_data = sample_groups.get(comparison_sample_name, no_results)
         comparison_mean = mean(comparison_sample_data)
         
         
@@ -64,7 +87,7 @@ def compare_anova(sample_results, comparison_sample_name, min_p=0.05):
                 continue
             
             #data for this sample
-            sample_data = sample_results['result'][sample_results['sample'] == sample_name]
+            sample_data = sample_groups[sample_name]
             this_mean = mean(sample_data)
                         
             #conduct the t-test
@@ -97,4 +120,70 @@ def compare_anova(sample_results, comparison_sample_name, min_p=0.05):
         return ([], no_stat_diff, [])
     
     
-    pass
\ No newline at end of file
+    pass
+
+#Results of comparing one sample to another in a pairwise comparison matrix
+BETTER = 1
+NO_DIFFERENCE = 0
+WORSE = -1
+
+def compare_matrix(sample_results, min_p=0.05, anova_p_value=None):
+    """ Compares every sample with every other sample in one pass. Uses the same
+    anova and bonferroni corrected t-tests as compare_anova, but each pair of
+    samples is only tested once and the t-tests are calculated together from
+    the mean and variance of each sample
+    
+    Args:
+        sample_results (DataFrame): A dataframe of the all the results, one column is
+            sample name and another is result
+        min_p (float): minimum p value to be insignificant ie. 0.05 = 95% confidence level
+        anova_p_value (float): the result of anova_p for the sample results if it has
+            already been calculated
+            
+    Returns:
+        (str[], numpy.ndarray): the sample names in the order they appear in the
+            results and a k x k array where [i, j] is BETTER if sample i is
+            statistically better than sample j, WORSE if it is worse and
+            NO_DIFFERENCE otherwise, including the diagonal
+    """
+    
+    import numpy as np
+    
+    sample_names = list(sample_results['sample'].unique())
+    k = len(sample_names)
+    matrix = np.full((k, k), NO_DIFFERENCE, dtype=int)
+    
+    if anova_p_value is None:
+        anova_p_value = anova_p(sample_results)
+    
+    if not anova_p_value < min_p:
+        #No statistical difference between all samples
+        return sample_names, matrix
+    
+    #scipy is slow to import so load it on first use
+    from scipy import stats
+    
+    #calculate the bonferroni correction for alpha
+    K = (k * (k-1)) / 2        
+    bon_corr = min_p / K
+    
+    groups = sample_results.groupby('sample', sort=False)['result']
+    counts = groups.count().reindex(sample_names).to_numpy(dtype=float)
+    means = np.array([mean(groups.get_group(name)) for name in sample_names], dtype=float)
+    squares = groups.var(ddof=0).reindex(sample_names).to_numpy(dtype=float) * counts
+    
+    #pooled variance two sample t-test of every pair, the same as ttest_ind
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = counts[:, None] + counts[None, :] - 2
+        pooled = (squares[:, None] + squares[None, :]) / df
+        t = (means[:, None] - means[None, :]) / np.sqrt(pooled * (1 / counts[:, None] + 1 / counts[None, :]))
+        p = 2 * stats.t.sf(np.abs(t), df)
+    
+    #nan p values (too few results) are never significant
+    different = p < bon_corr
+    np.fill_diagonal(different, False)
+    
+    matrix[different & (means[:, None] > means[None, :])] = BETTER
+    matrix[different & ~(means[:, None] > means[None, :])] = WORSE
+    
+    return sample_names, matrix
\ No newline at end of file
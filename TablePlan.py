@@ -0,0 +1,427 @@
+import threading
+from concurrent.futures import Future
+from StatCalculator import anova_p, compare_anova, compare_matrix
+
+#Table types and the number of command parts each accepts
+SAMPLES_TABLE = 'SamplesTable'
+SUMMARY_TABLE = 'SummaryTable'
+SAMPLE_RESULTS_TABLE = 'SampleResultsTable'
+STAT_COMPARE_TABLE = 'StatCompareTable'
+STAT_MATRIX_TABLE = 'StatMatrixTable'
+CHART_TABLE = 'ChartTable'
+#Wraps any other table command to insert its tables as images
+IMAGE_TABLE = 'ImageTable'
+
+class TableCommand:
+    """ A table command from the template parsed into its parts """
+
+    def __init__(self, command, table_type, args, key):
+        """ Init function for the command
+
+        Args:
+            command (str): the command string from the template
+            table_type (str): the type of table, the first part of the command
+            args (str[]): the arguments for the builder function of the table type
+            key (tuple): the normalized command, commands with the same key
+                build the same table
+
+        Attributes:
+            command (str): the command string from the template
+            table_type (str): the type of table
+            args (str[]): the arguments for the builder function of the table type
+            key (tuple): the normalized command
+        """
+        self.command = command
+        self.table_type = table_type
+        self.args = args
+        self.key = key
+
+    def stat_comparison(self):
+        """ Gets the sample name fields and test compared by a StatCompareTable
+        or StatMatrixTable
+
+        Returns:
+            (tuple, str): the stripped compare name fields and the test, None if
+                this isn't a comparison table
+        """
+        if self.table_type == IMAGE_TABLE:
+            return self.args[0].stat_comparison()
+        
+        if self.table_type == STAT_COMPARE_TABLE:
+            fields, test = self.args[1], self.args[2]
+        elif self.table_type == STAT_MATRIX_TABLE:
+            fields, test = self.args[0], self.args[1]
+        else:
+            return None
+
+        test = test.strip()
+        for flip in ['(flip)', '(FLIP)', '(Flip)']:
+            test = test.replace(flip, '')
+
+        return tuple(field.strip() for field in fields.split('+')), test
+
+def parse_command(command):
+    """ Parses a table command with the same rules create_tables has always used.
+    A command consists of the format TableType;part1;part2 ect..
+
+    Args:
+        command (str): the command string from the template
+
+    Returns:
+        TableCommand: the parsed command, None if the command isn't a valid table command
+    """
+    command_split = command.split(';')
+
+    #must have at least 2 parts, the table type (index 0) and the fields (index 1)
+    if len(command_split) < 2:
+        return None
+
+    table_type = command_split[0]
+
+    #the rest of the command is the table command to draw as an image
+    if table_type == IMAGE_TABLE:
+        inner = parse_command(';'.join(command_split[1:]))
+        if inner is None:
+            return None
+        return TableCommand(command, table_type, [inner], (table_type, inner.key))
+
+    #part 2 = fields, part 3 = widths of columns
+    if table_type == SAMPLES_TABLE:
+        widths = command_split[2] if len(command_split) == 3 else None
+        args = [command_split[1], widths]
+        key = (table_type, tuple(command_split[1].split(',')), widths)
+
+    #part 2 = sample name, part 3 = test names, part 4 = number precision,
+    #part 5 is orientation, part 6 = widths of columns
+    elif table_type in (SUMMARY_TABLE, SAMPLE_RESULTS_TABLE) and len(command_split) > 4:
+        widths = command_split[5] if len(command_split) == 6 else None
+        args = command_split[1:5] + [widths]
+        try:
+            precision = int(command_split[3])
+        except ValueError:
+            precision = 0
+        key = (table_type,
+               tuple(field.strip() for field in command_split[1].split('+')),
+               tuple(test.strip() for test in command_split[2].split(',')),
+               precision,
+               command_split[4] == "Horizontal",
+               widths)
+
+    #part 2 = sample name, part 3 = comparing samples name,
+    #part 4 = the name of the test to run the comparisons on
+    elif table_type == STAT_COMPARE_TABLE and len(command_split) == 4:
+        args = command_split[1:4] + [None]
+        key = (table_type,
+               tuple(field.strip() for field in command_split[1].split('+')),
+               tuple(field.strip() for field in command_split[2].split('+')),
+               command_split[3].strip())
+
+    #part 2 = sample name, part 3 = test names, part 4 = orientation of the bars
+    elif table_type == CHART_TABLE and len(command_split) in (3, 4):
+        orientation = command_split[3] if len(command_split) == 4 else None
+        args = command_split[1:3] + [orientation]
+        key = (table_type,
+               tuple(field.strip() for field in command_split[1].split('+')),
+               tuple(test.strip() for test in command_split[2].split(',')),
+               orientation == "Horizontal")
+
+    #part 2 = sample name, part 3 = the name of the test to run the comparisons on,
+    #part 4 = widths of columns
+    elif table_type == STAT_MATRIX_TABLE and len(command_split) in (3, 4):
+        widths = command_split[3] if len(command_split) == 4 else None
+        args = command_split[1:3] + [widths]
+        key = (table_type,
+               tuple(field.strip() for field in command_split[1].split('+')),
+               command_split[2].strip(),
+               widths)
+
+    else:
+        return None
+
+    return TableCommand(command, table_type, args, key)
+
+class TablePlan:
+    """ Execution plan for the table commands of a template. Commands are
+    parsed once, duplicate and equivalent commands are built once and the
+    statistics shared between tables are listed so they can be computed once
+    """
+
+    def __init__(self, table_commands):
+        """ Init function for the plan, compiles the commands
+
+        Args:
+            table_commands (str[]): the table commands extracted from the template
+
+        Attributes:
+            commands (TableCommand[]): one command for each table to build, in
+                the order they first appear in the template
+            aliases (dict): every valid command string as the key and the
+                TableCommand that builds its table as the value
+            invalid (str[]): command strings that aren't valid table commands
+        """
+        self.commands = []
+        self.aliases = {}
+        self.invalid = []
+
+        by_key = {}
+        for command in table_commands:
+            if command in self.aliases or command in self.invalid:
+                continue
+
+            parsed = parse_command(command)
+            if parsed is None:
+                self.invalid.append(command)
+                continue
+
+            #equivalent commands share the table of the first one
+            if parsed.key not in by_key:
+                by_key[parsed.key] = parsed
+                self.commands.append(parsed)
+
+            self.aliases[command] = by_key[parsed.key]
+
+    def stat_comparisons(self):
+        """ Gets the distinct anova comparisons the StatCompareTables need
+
+        Returns:
+            (tuple, str)[]: the compare name fields and test of each comparison
+        """
+        comparisons = []
+        for command in self.commands:
+            comparison = command.stat_comparison()
+            if comparison is not None and comparison not in comparisons:
+                comparisons.append(comparison)
+
+        return comparisons
+
+class TableContext:
+    """ Intermediate results shared by the tables built for a job. Each result
+    is calculated the first time a table asks for it and reused by every other
+    table that needs it.
+
+    Tables built on several threads calculate different results at the same
+    time, a table asking for a result another thread is calculating waits for
+    that result rather than calculating it again
+    """
+
+    def __init__(self, job):
+        """ Init function for the context
+
+        Args:
+            job (SRGJob): the job the tables are built for
+
+        Attributes:
+            job (SRGJob): the job the tables are built for
+        """
+        self.job = job
+        self._stats = None
+        self._positions = None
+        self._ordinals = {}
+        self._results = {}
+        self._anova = {}
+        self._anova_errors = {}
+        self._comparisons = {}
+        #futures of the results being calculated with the results dict and key as the key
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def __getstate__(self):
+        #the locks and futures can't be pickled and the samples are keyed by id
+        #which changes when the job is pickled, those are rebuilt after unpickling
+        state = self.__dict__.copy()
+        state['_pending'] = {}
+        state['_lock'] = None
+        state['_stats_lock'] = None
+        state['_stats'] = None
+        state['_positions'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _calculate(self, results, key, function, *args):
+        """ Gets a result, calculating it if no other thread has. The lock is
+        only held to look up and publish the result so results with different
+        keys are calculated at the same time
+
+        Args:
+            results (dict): the calculated results
+            key (hashable): the key of the result in results
+            function (callable): calculates the result
+            *args: the arguments for the function
+
+        Returns:
+            object: the result
+        """
+        if key in results:
+            return results[key]
+
+        pending_key = (id(results), key)
+        with self._lock:
+            if key in results:
+                return results[key]
+            future = self._pending.get(pending_key)
+            calculate = future is None
+            if calculate:
+                future = self._pending[pending_key] = Future()
+
+        if not calculate:
+            return future.result()
+
+        try:
+            value = function(*args)
+        except BaseException as ex:
+            #the error goes to the threads waiting on the result, the next
+            #table to ask for it calculates it again
+            with self._lock:
+                del self._pending[pending_key]
+            future.set_exception(ex)
+            raise
+
+        with self._lock:
+            results[key] = value
+            del self._pending[pending_key]
+        future.set_result(value)
+        return value
+
+    def prepare_comparisons(self, comparisons, executor):
+        """ Fits the anova of each comparison in parallel so the StatCompareTables
+        built afterwards only run the post hoc tests
+
+        Args:
+            comparisons (tuple, str)[]: the compare name fields and test of each
+                comparison, see TablePlan.stat_comparisons
+            executor (concurrent.futures.Executor): the executor to fit the models in
+        """
+        futures = {}
+        for fields, test in comparisons:
+            if (fields, test) not in self._anova:
+                futures[(fields, test)] = executor.submit(anova_p, self.all_results(fields, test))
+
+        for key, future in futures.items():
+            #errors are raised when a table asks for the comparison so they
+            #are reported the same way as when the tables are built in order
+            try:
+                self._anova[key] = future.result()
+            except Exception as ex:
+                self._anova_errors[key] = ex
+
+    def stats(self, sample, test):
+        """ The count, mean and standard deviation of the numeric results of a
+        test, read from the job's aggregate which is calculated for every sample
+        and test at once the first time it is needed
+
+        Args:
+            sample (SampleData): the sample
+            test (str): the name of the test
+
+        Returns:
+            (int, float, float): the count, mean and std, None if the sample has
+                no numeric results for the test
+        """
+        if self._stats is None:
+            #every sample and test is read from the one aggregate so it has its own lock
+            with self._stats_lock:
+                if self._stats is None:
+                    aggregate = self.job.aggregate()
+                    self._stats = dict(zip(aggregate.index, zip(aggregate['count'].tolist(),
+                                                                aggregate['mean'].tolist(),
+                                                                aggregate['std'].tolist())))
+
+        return self._stats.get((self.position(sample), test))
+
+    def position(self, sample):
+        """ The index of a sample in the job's samples
+
+        Args:
+            sample (SampleData): the sample
+
+        Returns:
+            int: the index, None if the sample isn't in the job
+        """
+        if self._positions is None:
+            self._positions = {id(job_sample): position for position, job_sample in enumerate(self.job.samples)}
+        return self._positions.get(id(sample))
+
+    def average(self, sample, test):
+        """ The average result of a test, see SampleData.result_average """
+        stats = self.stats(sample, test)
+        if stats is None:
+            #return zero by default
+            return 0
+        return stats[1]
+
+    def std(self, sample, test):
+        """ The standard deviation of a test, see SampleData.result_std """
+        stats = self.stats(sample, test)
+        if stats is None or stats[0] < 2:
+            #return zero by default
+            return 0
+        return stats[2]
+
+    def ordinal_average(self, sample, test, factor_values):
+        """ The average of an ordinal test, see SampleData.result_average_ordinal.
+        Read from SRGJob.ordinal_averages which averages every sample at once """
+        key = (test, tuple(factor_values[test]))
+        averages = self._calculate(self._ordinals, key, self.job.ordinal_averages, test, factor_values[test])
+        return averages[self.position(sample)]
+
+    def all_results(self, key_fields, test):
+        """ Every result of a test by sample name, see SRGJob.get_all_results """
+        key = (tuple(field.strip() for field in key_fields), test)
+        return self._calculate(self._results, key, self.job.get_all_results, key_fields, test)
+
+    def anova(self, key_fields, test):
+        """ The p value of the anova of a test, fitted once for all the samples
+
+        Args:
+            key_fields (str[]): the fields used to build the sample names
+            test (str): the name of the test
+
+        Returns:
+            float: see StatCalculator.anova_p
+        """
+        key = (tuple(field.strip() for field in key_fields), test)
+        if key in self._anova_errors:
+            raise self._anova_errors[key]
+
+        if key in self._anova:
+            return self._anova[key]
+        return self._calculate(self._anova, key, anova_p, self.all_results(key_fields, test))
+
+    def compare(self, key_fields, test, sample_name):
+        """ Compares a sample with every other sample in the anova of a test,
+        the anova is fitted once for all the samples
+
+        Args:
+            key_fields (str[]): the fields used to build the sample names
+            test (str): the name of the test to compare
+            sample_name (str): the name of the sample to compare the others to
+
+        Returns:
+            (str[], str[], str[]): see StatCalculator.compare_anova
+        """
+        key = (tuple(field.strip() for field in key_fields), test, sample_name)
+        return self._calculate(self._comparisons, key, self._compare, key_fields, test, sample_name)
+
+    def _compare(self, key_fields, test, sample_name):
+        """ Calculates a comparison for compare """
+        anova_p_value = self.anova(key_fields, test)
+        return compare_anova(self.all_results(key_fields, test), sample_name, anova_p_value=anova_p_value)
+
+    def compare_matrix(self, key_fields, test):
+        """ Compares every sample with every other sample in the anova of a
+        test, sharing the anova with the StatCompareTables of the test
+
+        Args:
+            key_fields (str[]): the fields used to build the sample names
+            test (str): the name of the test to compare
+
+        Returns:
+            (str[], numpy.ndarray): see StatCalculator.compare_matrix
+        """
+        anova_p_value = self.anova(key_fields, test)
+        return compare_matrix(self.all_results(key_fields, test), anova_p_value=anova_p_value)
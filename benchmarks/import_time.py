@@ -0,0 +1,153 @@
+""" Import time report for the SRG modules, in the style of 'python -X importtime'
+
+Times the control commands of SRG.py and lists the slowest imports of each
+module so heavy dependencies can't creep back into the start up path.
+
+The commands are run from a copy of the program modules in a temporary
+folder so they never signal a running background process or write its
+profile control file.
+
+Run with 'python benchmarks/import_time.py'
+"""
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROG_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+#modules to report the import cost of
+MODULES = ['SRG', 'SRGController', 'SRGConsoleView', 'GoogleSheetsJobParser',
+           'ResultsTableBuilder', 'MicrosoftDocxParser', 'StatCalculator']
+#SRG.py commands that should start quickly
+COMMANDS = [['stop'], ['profile', '0']]
+#target start up time in ms for the control commands
+TARGET_MS = 100
+#number of runs to take the best time from
+RUNS = 5
+#number of the slowest imports to list for each module
+TOP_IMPORTS = 5
+
+def import_times(module):
+    """ Imports the module in a fresh interpreter with -X importtime
+    
+    Args:
+        module (str): the name of the module to import
+        
+    Returns:
+        (int, (int, str)[]): the cumulative import time of the module in us and
+            a list of (cumulative us, module name) for every module it imported
+    """
+    
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=PROG_PATH, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                            universal_newlines=True)
+    
+    #format is 'import time: self | cumulative | name' with the name indented
+    #by the import depth. Children are listed before their parent
+    lines = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        name = parts[2].rstrip()
+        depth = len(name) - len(name.lstrip())
+        lines.append((int(parts[1]), depth, name.strip()))
+    
+    #the module line is the last top level entry with the module name, 
+    #anything imported at interpreter start up by site is not counted
+    for index in range(len(lines) - 1, -1, -1):
+        if lines[index][2] == module:
+            break
+    else:
+        return 0, []
+    
+    total, depth, name = lines[index]
+    
+    #walk back through the children of the module
+    imports = []
+    child = index - 1
+    while child >= 0 and lines[child][1] > depth:
+        imports.append((lines[child][0], lines[child][2]))
+        child -= 1
+            
+    return total, imports
+    
+def isolated_program(folder):
+    """ Copies the program modules to a folder so SRG.py run from there uses
+    its own pidfile and profile control file
+    
+    Args:
+        folder (str): the folder to copy the modules to
+        
+    Returns:
+        str: the path of the copied SRG.py
+    """
+    for module in glob.glob(os.path.join(PROG_PATH, '*.py')):
+        shutil.copy(module, folder)
+    return os.path.join(folder, 'SRG.py')
+
+def command_time(args, program):
+    """ Best wall clock time of running SRG.py with the passed arguments
+    
+    Args:
+        args (str[]): the command line arguments for SRG.py
+        program (str): the path of the SRG.py to run, see isolated_program
+        
+    Returns:
+        float: the fastest run in ms
+    """
+    
+    best = None
+    for i in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, program] + args,
+                       cwd=os.path.dirname(program), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+            
+    return best
+
+def main():
+    
+    print("Interpreter start up: {0:.1f} ms".format(command_time_python()))
+    
+    with tempfile.TemporaryDirectory() as folder:
+        program = isolated_program(folder)
+        for args in COMMANDS:
+            elapsed = command_time(args, program)
+            status = "OK" if elapsed < TARGET_MS else "SLOW"
+            print("SRG.py {0}: {1:.1f} ms [{2}, target {3} ms]".format(' '.join(args), elapsed, status, TARGET_MS))
+    
+    print("")
+    for module in MODULES:
+        total, imports = import_times(module)
+        print("import {0}: {1:.1f} ms".format(module, total / 1000))
+        imports.sort(reverse=True)
+        for cumulative, name in imports[:TOP_IMPORTS]:
+            print("    {0:>8.1f} ms  {1}".format(cumulative / 1000, name))
+    
+def command_time_python():
+    """ Best wall clock time of starting an empty interpreter, the floor for
+    the SRG.py commands
+    
+    Returns:
+        float: the fastest run in ms
+    """
+    
+    best = None
+    for i in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'])
+        elapsed = (time.perf_counter() - start) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+            
+    return best
+
+if __name__ == '__main__':
+    main()
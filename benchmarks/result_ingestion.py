@@ -0,0 +1,75 @@
+""" Time taken to add the results of a large sample tab to a SampleData, one
+result at a time with add_result and all together with add_results
+
+Run with 'python benchmarks/result_ingestion.py [rows]'
+"""
+import random
+import sys
+import time
+
+import sample_jobs
+from SampleData import SampleData
+
+#number of result rows in the sample tab
+ROWS = 100000
+#tests the rows are spread across
+TESTS = 20
+#times each way is run, the fastest run is reported
+REPEATS = 5
+
+def make_rows(rows, seed=0):
+    """ Builds the Test Name and Result columns of a sample tab with a mix of
+    numbers, percentages and text results
+    
+    Args:
+        rows (int): the number of rows
+        seed (int): the random seed so runs are repeatable
+        
+    Returns:
+        (str[], str[]): the test names and results
+    """
+    rand = random.Random(seed)
+    test_names = ['Test {0}'.format(row % TESTS + 1) for row in range(rows)]
+    results = [rand.choice(["{0:.2f}".format(rand.gauss(50, 5)), "{0}%".format(rand.randint(1, 99)),
+                            'N/A', 'High']) for row in range(rows)]
+    return test_names, results
+
+def add_each(test_names, results):
+    sample = SampleData()
+    for test_name, result in zip(test_names, results):
+        sample.add_result(test_name, result)
+    return sample
+    
+def add_all(test_names, results):
+    sample = SampleData()
+    sample.add_results(test_names, results)
+    return sample
+
+def fastest(function, *args):
+    best = None
+    for repeat in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+    
+def main():
+    
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    test_names, results = make_rows(rows)
+    
+    #the two ways must give the same sample
+    each = add_each(test_names, results)
+    every = add_all(test_names, results)
+    assert each.test_results == every.test_results
+    assert each.test_results_values == every.test_results_values
+    assert each.test_units == every.test_units
+    
+    each_time = fastest(add_each, test_names, results)
+    all_time = fastest(add_all, test_names, results)
+    print("{0} rows: add_result {1:.3f}s  add_results {2:.3f}s  {3:4.2f}x".format(
+        rows, each_time, all_time, each_time / all_time))
+
+if __name__ == '__main__':
+    main()
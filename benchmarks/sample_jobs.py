@@ -0,0 +1,73 @@
+""" Synthetic jobs and report templates used by the benchmarks """
+import os
+import random
+import sys
+
+PROG_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PROG_PATH not in sys.path:
+    sys.path.insert(0, PROG_PATH)
+
+from SRGJob import SRGJob
+from SampleData import SampleData
+
+#table commands used in the benchmark template
+TABLE_COMMANDS = ['SamplesTable;Name,Batch',
+                  'SummaryTable;Name;Test 1,Test 2,Test 3,Rating|Low:Medium:High;2;Vertical',
+                  'SampleResultsTable;Name;Test 1,Test 2,Test 3;2;Vertical',
+                  'StatCompareTable;Name;Code;Test 1']
+
+def make_job(samples=10, tests=3, replicates=5, seed=0):
+    """ Builds a job of random results
+    
+    Args:
+        samples (int): the number of samples
+        tests (int): the number of numeric tests, named Test 1, Test 2 ...
+        replicates (int): the number of results for each test
+        seed (int): the random seed so runs are repeatable
+        
+    Returns:
+        SRGJob: the job with the fields needed by the template
+    """
+    
+    rand = random.Random(seed)
+    
+    job = SRGJob()
+    job.fields['ReportTemplate'] = 'BenchmarkTemplate.docx'
+    job.fields['UploadFilename'] = 'Benchmark Report'
+    job.fields['ShareWith'] = 'example.com'
+    job.fields['Title'] = 'Benchmark'
+    
+    for s in range(samples):
+        sample = SampleData()
+        sample.add_detail('Name', 'Sample {0}'.format(s + 1))
+        sample.add_detail('Code', 'S{0}'.format(s + 1))
+        sample.add_detail('Batch', 'B{0}'.format(s % 3))
+        
+        for t in range(tests):
+            mean = 50 + 5 * t + rand.uniform(-10, 10)
+            for r in range(replicates):
+                sample.add_result('Test {0}'.format(t + 1), "{0:.2f}".format(rand.gauss(mean, 3)))
+                
+        for r in range(replicates):
+            sample.add_result('Rating', rand.choice(['Low', 'Medium', 'High']))
+            
+        job.add_sample(sample)
+        
+    return job
+
+def make_template(path, commands=TABLE_COMMANDS):
+    """ Saves a report template with a field and a table cell for each command
+    
+    Args:
+        path (str): where to save the docx template
+        commands (str[]): the table commands to put in the template
+    """
+    
+    from docx import Document
+    
+    document = Document()
+    document.add_paragraph('Report for <<Field:Title>> on <<Field:Date>>')
+    for command in commands:
+        table = document.add_table(rows=1, cols=1)
+        table.rows[0].cells[0].text = '<<' + command + '>>'
+    document.save(path)
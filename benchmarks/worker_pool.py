@@ -0,0 +1,105 @@
+""" Time taken by SRGController to run the CPU bound stages of a job (tables
+and report) with SRGWorkerPool for 1 up to the number of cores worth of worker
+processes.
+
+Jobs are run one after another as the background process runs them, so more
+workers only speed up building the tables of a job, which are dealt out
+across the workers. The report of a job is rendered by one worker.
+
+Run with 'python benchmarks/worker_pool.py [jobs] [tables]'
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import multiprocessing
+
+import sample_jobs
+from SRGController import SRGController
+from SRGWorkerPool import SRGWorkerPool, render_report
+
+#number of jobs run for each pool size
+JOBS = 8
+#number of copies of the sample table commands in the template
+TABLE_COPIES = 4
+
+def table_commands(copies):
+    """ Gets distinct table commands for a template with many tables, the
+    sample commands that have a number of decimal places with a different
+    number for each copy
+    
+    Args:
+        copies (int): the number of copies of the sample commands
+        
+    Returns:
+        str[]: the table commands
+    """
+    commands = []
+    for copy in range(copies):
+        for command in sample_jobs.TABLE_COMMANDS:
+            parts = command.split(';')
+            #tables with decimal places have them as the 4th of 5 parts
+            if len(parts) == 5:
+                parts[3] = str(copy)
+            commands.append(';'.join(parts))
+    return list(dict.fromkeys(commands))
+
+def run_job(controller, commands, template_path, report_path, job):
+    """ Runs the CPU bound stages of one job through the controller as the
+    tables and render stages do, copying the template first as the report
+    is written over it
+    
+    Args:
+        controller (SRGController): the controller with the worker pool
+        commands (str[]): the table commands of the template
+        template_path (str): the path of the report template
+        report_path (str): the path to write the report to
+        job (SRGJob): the job to build the report for
+    """
+    tables = controller.build_job_tables(commands, job)
+    shutil.copyfile(template_path, report_path)
+    controller.run_cpu_stage(render_report, report_path, job.fields, tables)
+    
+def main():
+    
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else JOBS
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else TABLE_COPIES
+    
+    folder = tempfile.mkdtemp()
+    try:
+        commands = table_commands(copies)
+        template_path = os.path.join(folder, 'template.docx')
+        sample_jobs.make_template(template_path, commands)
+        job = sample_jobs.make_job(samples=10, tests=3, replicates=5)
+        report_path = os.path.join(folder, 'report.docx')
+        
+        #the image cache and render plans are kept in the temporary folder
+        controller = SRGController(None)
+        controller.full_path = lambda filename: os.path.join(folder, filename)
+        
+        base = None
+        cores = multiprocessing.cpu_count()
+        for processes in sorted(set([1, 2, 4, cores])):
+            if processes > cores:
+                continue
+            
+            controller.worker_pool = SRGWorkerPool(processes)
+            
+            #warm up every worker so start up isn't counted
+            run_job(controller, commands, template_path, report_path, job)
+            
+            start = time.perf_counter()
+            for i in range(jobs):
+                run_job(controller, commands, template_path, report_path, job)
+            elapsed = (time.perf_counter() - start) / jobs
+            controller.worker_pool.close()
+            
+            if base is None:
+                base = elapsed
+            print("{0:>2} workers: {1:7.1f} ms per job  {2:4.2f}x".format(processes, elapsed * 1000, base / elapsed))
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import unittest
+import re
+from GoogleSheetsJobParser import GoogleSheetsJobParser, tab_fingerprint
+from LocalJobParser import sheet_values
+from SRGCache import SRGCache
+
+class Request:
+    """ Request of the fake sheets service """
+    
+    def __init__(self, result):
+        self.result = result
+        
+    def execute(self):
+        return self.result
+
+class FakeSheetsService:
+    """ Sheets service reading the values of tabs held in memory """
+    
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.requests = 0
+        self.ranges = []
+        
+    def spreadsheets(self):
+        return self
+    
+    def values(self):
+        return self
+    
+    def get(self, spreadsheetId, fields=None, range=None):
+        self.requests += 1
+        if range is not None:
+            title, cells = range.split('!')
+            return Request({'values': sheet_values(self.tabs[title], re.sub(r'\d+$', '', cells))})
+        return Request({'sheets': [{'properties': {'title': title, 'sheetId': index,
+                                                   'gridProperties': {'rowCount': 1000}}}
+                                   for index, title in enumerate(self.tabs)]})
+    
+    def batchGet(self, spreadsheetId, ranges):
+        self.requests += 1
+        self.ranges += ranges
+        value_ranges = []
+        for cell_range in ranges:
+            title, cells = cell_range.split('!')
+            value_ranges.append({'values': sheet_values(self.tabs[title], re.sub(r'\d+$', '', cells))})
+        return Request({'valueRanges': value_ranges})
+
+class FakeView:
+    
+    def display_message(self, message):
+        pass
+
+def sample_rows(name, results):
+    rows = [['Detail', 'Value', 'Test Name', 'Result']]
+    for index, result in enumerate(results):
+        rows.append(['Name' if index == 0 else '', name if index == 0 else '', 'Gloss', result])
+    return rows
+
+class GoogleSheetsJobParserTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.tabs = {'Details': [['Field', 'Value'], ['ReportTemplate', 'Template.docx']],
+                     'Sample 1': sample_rows('A', ['85', '86']),
+                     'Notes': [['Anything']],
+                     'Sample 2': sample_rows('B', ['90', '91', '92'])}
+        self.service = FakeSheetsService(self.tabs)
+
+    def test_parse_document(self):
+        job = GoogleSheetsJobParser(FakeView()).parse_document(self.service, 'doc')
+        self.assertEqual(job.fields, {'ReportTemplate': 'Template.docx'})
+        self.assertEqual([sample.details['Name'] for sample in job.samples], ['A', 'B'])
+        self.assertEqual(job.samples[1].test_results['Gloss'], ['90', '91', '92'])
+        #the spreadsheet and two batches of ranges
+        self.assertEqual(self.service.requests, 3)
+        
+    def test_unchanged_tabs_reused(self):
+        cache = SRGCache(1024 * 1024)
+        parser = GoogleSheetsJobParser(FakeView(), cache)
+        first = parser.parse_document(self.service, 'doc')
+        self.assertEqual((parser.parsed_tabs, parser.cached_tabs), (2, 0))
+        
+        self.tabs['Sample 2'] = sample_rows('B', ['90', '91', '93'])
+        second = parser.parse_document(self.service, 'doc')
+        self.assertEqual((parser.parsed_tabs, parser.cached_tabs), (1, 1))
+        self.assertIs(second.samples[0], first.samples[0])
+        self.assertEqual(second.samples[1].test_results['Gloss'], ['90', '91', '93'])
+        
+    def test_tab_fingerprint(self):
+        values = [[['Name', 'A']], [['Gloss']], [['85']]]
+        self.assertEqual(tab_fingerprint(1, 'Sample 1', values), tab_fingerprint(1, 'Sample 1', values))
+        self.assertNotEqual(tab_fingerprint(1, 'Sample 1', values), tab_fingerprint(2, 'Sample 1', values))
+        self.assertNotEqual(tab_fingerprint(1, 'Sample 1', values), tab_fingerprint(1, 'Sample 1', values[:2] + [[['86']]]))
+        
+    def test_parse_metadata(self):
+        sheets, fields = GoogleSheetsJobParser(FakeView()).parse_metadata(self.service, 'doc')
+        self.assertEqual([properties['title'] for properties in sheets], list(self.tabs.keys()))
+        self.assertEqual(fields, {'ReportTemplate': 'Template.docx'})
+        self.assertEqual(self.service.requests, 2)
+        
+    def test_no_samples(self):
+        service = FakeSheetsService({'Details': self.tabs['Details']})
+        self.assertIsNone(GoogleSheetsJobParser(FakeView()).parse_document(service, 'doc'))
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(GoogleSheetsJobParserTestCase('test_parse_document'))
+    suite.addTest(GoogleSheetsJobParserTestCase('test_unchanged_tabs_reused'))
+    suite.addTest(GoogleSheetsJobParserTestCase('test_tab_fingerprint'))
+    suite.addTest(GoogleSheetsJobParserTestCase('test_parse_metadata'))
+    suite.addTest(GoogleSheetsJobParserTestCase('test_no_samples'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,57 @@
+import unittest
+import collections
+import json
+import os
+import tempfile
+from LocalJobParser import LocalJobParser, sheet_values, cell_text
+
+TABS = collections.OrderedDict([
+    ('Details', [['Field', 'Value'], ['Title', 'Study'], ['Note', None]]),
+    ('Sample 1', [['Detail', 'Value', 'Test Name', 'Result'],
+                  ['Name', 'Sample A', 'Gloss', 85.0],
+                  ['Code', 'A', 'Gloss', '86.5'],
+                  [None, None, None, None],
+                  [None, None, 'Haze', 12]]),
+    ('Sample 2', [['Detail', 'Value', 'Notes'], ['Name', 'Sample B', 'No results']]),
+    ])
+
+class LocalJobParserTestCase(unittest.TestCase):
+
+    def test_cell_text(self):
+        self.assertEqual([cell_text(value) for value in [None, 85.0, 86.5, 12, True]], ['', '85', '86.5', '12', 'TRUE'])
+
+    def test_sheet_values_trimmed(self):
+        self.assertEqual(sheet_values(TABS['Details'], 'A2:B101'), [['Title', 'Study'], ['Note']])
+        self.assertEqual(sheet_values(TABS['Sample 1'], 'C2:C'), [['Gloss'], ['Gloss'], [], ['Haze']])
+        self.assertEqual(sheet_values(TABS['Sample 1'], 'A6:B101'), [])
+
+    def test_parse_tabs(self):
+        job = LocalJobParser().parse_tabs(TABS)
+        self.assertEqual(job.fields, {'Title': 'Study'})
+        self.assertEqual(len(job.samples), 1)
+        self.assertEqual(job.samples[0].details, {'Name': 'Sample A', 'Code': 'A'})
+        self.assertEqual(job.samples[0].test_results, {'Gloss': ['85', '86.5'], 'Haze': ['12']})
+
+    def test_parse_json_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'study.json')
+            with open(path, 'w') as workbook_file:
+                json.dump(TABS, workbook_file)
+            job = LocalJobParser().parse_file(path)
+            self.assertEqual(job.samples[0].test_results['Gloss'], ['85', '86.5'])
+
+    def test_no_samples(self):
+        self.assertIsNone(LocalJobParser().parse_tabs({'Details': TABS['Details']}))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(LocalJobParserTestCase('test_cell_text'))
+    suite.addTest(LocalJobParserTestCase('test_sheet_values_trimmed'))
+    suite.addTest(LocalJobParserTestCase('test_parse_tabs'))
+    suite.addTest(LocalJobParserTestCase('test_parse_json_file'))
+    suite.addTest(LocalJobParserTestCase('test_no_samples'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+import docx
+from RenderPlan import RenderPlans, compile_plan, element_path, find_element
+from MicrosoftDocxParser import MicrosoftDocxParser
+
+def make_template(path):
+    document = docx.Document()
+    document.add_paragraph('Report <<Field:Title>>')
+    document.add_paragraph('No fields')
+    document.sections[0].header.paragraphs[0].text = 'Header <<Field:Title>>'
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = '<<SamplesTable;Name>>'
+    table.cell(1, 0).merge(table.cell(1, 1)).text = '<<Field:Title>> <<SamplesTable;Code>>'
+    document.save(path)
+
+class RenderPlanTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.template = os.path.join(self.folder.name, 'template.docx')
+        make_template(self.template)
+        
+    def tearDown(self):
+        """ Run after each use case """
+        self.folder.cleanup()
+
+    def test_element_path(self):
+        body = docx.Document(self.template).element.body
+        paragraph = body[1]
+        self.assertIs(find_element(body, element_path(paragraph, body)), paragraph)
+        
+    def test_compile_plan(self):
+        plan = compile_plan(docx.Document(self.template))
+        self.assertEqual([(slot['part'], slot['fields']) for slot in plan['fields']],
+                         [('body', ['Title']), ('header', ['Title']), ('body', ['Title'])])
+        #the merged cell is only filled once
+        self.assertEqual([slot['commands'] for slot in plan['cells']], [['SamplesTable;Name'], ['SamplesTable;Code']])
+        self.assertEqual(plan['table_commands'], ['SamplesTable;Name', 'Field:Title', 'SamplesTable;Code',
+                                                  'Field:Title', 'SamplesTable;Code'])
+        
+    def test_plan_saved_by_template_hash(self):
+        plans = RenderPlans(os.path.join(self.folder.name, 'plans'))
+        plan = plans.get(self.template)
+        self.assertEqual(len(os.listdir(plans.folder)), 1)
+        self.assertEqual(plans.get(self.template), plan)
+        
+    def test_generate_report(self):
+        MicrosoftDocxParser().generate_report(self.template, {'Title': 'Study'}, {}, os.path.join(self.folder.name, 'plans'))
+        document = docx.Document(self.template)
+        self.assertEqual(document.paragraphs[0].text, 'Report Study')
+        self.assertEqual(document.sections[0].header.paragraphs[0].text, 'Header Study')
+        self.assertEqual(document.tables[0].cell(0, 0).text, '')
+        
+    def test_missing_field(self):
+        self.assertRaises(KeyError, MicrosoftDocxParser().generate_report, self.template, {}, {})
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(RenderPlanTestCase('test_element_path'))
+    suite.addTest(RenderPlanTestCase('test_compile_plan'))
+    suite.addTest(RenderPlanTestCase('test_plan_saved_by_template_hash'))
+    suite.addTest(RenderPlanTestCase('test_generate_report'))
+    suite.addTest(RenderPlanTestCase('test_missing_field'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
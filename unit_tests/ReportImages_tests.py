@@ -0,0 +1,79 @@
+import unittest
+import os
+import tempfile
+from ReportImages import ReportImages, image_key, table_image_key, render_table_image, render_chart_image
+from ResultTable import ResultTable
+
+PNG_SIGNATURE = b'\x89PNG'
+
+def make_table(value):
+    table = ResultTable()
+    table.title = 'Test 1'
+    table.set_columns(['Sample', 'Average'])
+    table.add_row(['Sample A', value])
+    return table
+
+def draw(data):
+    return PNG_SIGNATURE + data.encode('utf-8')
+
+class ReportImagesTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.images = ReportImages(self.folder.name)
+        
+    def tearDown(self):
+        """ Run after each use case """
+        self.folder.cleanup()
+
+    def test_key_follows_content(self):
+        self.assertEqual(table_image_key(make_table('1.0')), table_image_key(make_table('1.0')))
+        self.assertNotEqual(table_image_key(make_table('1.0')), table_image_key(make_table('1.1')))
+        self.assertNotEqual(image_key('table', [1]), image_key('chart', [1]))
+        
+    def test_cached_images_not_drawn_again(self):
+        images = self.images.render([('a', draw, 'a'), ('a', draw, 'a'), ('b', draw, 'b')])
+        self.assertEqual(images['a'], draw('a'))
+        self.assertEqual(self.images.misses, 2)
+        
+        again = ReportImages(self.folder.name)
+        self.assertEqual(again.render([('a', draw, 'a')]), {'a': draw('a')})
+        self.assertEqual((again.hits, again.misses), (1, 0))
+        self.assertEqual(sorted(os.listdir(self.folder.name)), ['a.png', 'b.png'])
+        
+    def test_least_recently_used_pruned(self):
+        images = ReportImages(self.folder.name, max_bytes=2 * len(draw('a')))
+        images.render([('a', draw, 'a'), ('b', draw, 'b')])
+        os.utime(images.path('a'), (1000, 1000))
+        os.utime(images.path('b'), (2000, 2000))
+        
+        #using a marks it as recently used so b is pruned for c
+        images.render([('a', draw, 'a')])
+        images.render([('c', draw, 'c')])
+        self.assertEqual(sorted(os.listdir(self.folder.name)), ['a.png', 'c.png'])
+        
+    def test_render_table_image(self):
+        import matplotlib.pyplot as plt
+        image = render_table_image(make_table('1.0'))
+        self.assertTrue(image.startswith(PNG_SIGNATURE))
+        #the figure is not left open in pyplot
+        self.assertEqual(plt.get_fignums(), [])
+        
+    def test_render_chart_image(self):
+        chart = {'title': 'Test 1, Test 2', 'samples': ['A', 'B'], 'tests': ['Test 1', 'Test 2'],
+                 'averages': [[1.0, 2.0], [3.0, None]], 'stds': [[0.1, 0.2], [0.3, None]], 'horizontal': False}
+        self.assertTrue(render_chart_image(chart).startswith(PNG_SIGNATURE))
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(ReportImagesTestCase('test_key_follows_content'))
+    suite.addTest(ReportImagesTestCase('test_cached_images_not_drawn_again'))
+    suite.addTest(ReportImagesTestCase('test_least_recently_used_pruned'))
+    suite.addTest(ReportImagesTestCase('test_render_table_image'))
+    suite.addTest(ReportImagesTestCase('test_render_chart_image'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
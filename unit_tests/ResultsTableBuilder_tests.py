@@ -0,0 +1,136 @@
+import unittest
+import concurrent.futures
+import threading
+from ResultsTableBuilder import ResultsTableBuilder
+from SampleData import SampleData
+from SRGJob import SRGJob
+
+COMMANDS = ['SamplesTable;Name,Code',
+            'StatMatrixTable;Name;Test 1',
+            'SummaryTable;Name;Test 1,Test 2;1;Vertical',
+            'SampleResultsTable;Name;Test 1;2;Horizontal',
+            'StatCompareTable;Name;Name;Test 1',
+            'StatCompareTable;Name;Name;Test 2(FLIP)']
+
+def make_job(results):
+    job = SRGJob()
+    for name, values in results.items():
+        sample = SampleData()
+        sample.add_detail('Name', name)
+        sample.add_detail('Code', name[-1])
+        for test, value in values:
+            sample.add_result(test, value)
+        job.add_sample(sample)
+    return job
+
+def table_values(tables):
+    return {command: [(table.title, table.table.values.tolist()) for table in (value if isinstance(value, list) else [value])]
+            for command, value in tables.items()}
+
+class ResultsTableBuilderTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.job = make_job({'Sample A': [('Test 1', '1.0'), ('Test 1', '1.2'), ('Test 1', '0.9'), ('Test 2', '5'), ('Test 2', '5.5')],
+                             'Sample B': [('Test 1', '2.0'), ('Test 1', '2.1'), ('Test 1', '1.8'), ('Test 2', '6'), ('Test 2', '6.4')],
+                             'Sample C': [('Test 1', '1.1'), ('Test 1', '1.0'), ('Test 1', '1.3'), ('Test 2', '4'), ('Test 2', '4.1')]})
+
+    def test_thread_executor_matches_serial(self):
+        serial = ResultsTableBuilder().create_tables(COMMANDS, self.job)
+        threaded = ResultsTableBuilder('thread', 3).create_tables(COMMANDS, self.job)
+        self.assertEqual(list(threaded.keys()), list(serial.keys()))
+        self.assertEqual(table_values(threaded), table_values(serial))
+        
+    def test_process_executor_matches_serial(self):
+        serial = ResultsTableBuilder().create_tables(COMMANDS, self.job)
+        processes = ResultsTableBuilder('process', 2).create_tables(COMMANDS, self.job)
+        self.assertEqual(list(processes.keys()), list(serial.keys()))
+        self.assertEqual(table_values(processes), table_values(serial))
+        
+    def test_context_results_calculated_once(self):
+        from TablePlan import TableContext
+        context = TableContext(self.job)
+        calls = []
+        get_all_results = self.job.get_all_results
+        def counted(key_fields, test):
+            calls.append(test)
+            return get_all_results(key_fields, test)
+        self.job.get_all_results = counted
+        
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda name: context.compare(['Name'], 'Test 1', name), ['Sample A', 'Sample B', 'Sample C'] * 4))
+        self.assertEqual(calls, ['Test 1'])
+        
+    def test_context_results_calculated_concurrently(self):
+        from TablePlan import TableContext
+        context = TableContext(self.job)
+        #each test waits for the other to start, which only happens if the
+        #context doesn't hold its lock while calculating
+        started = threading.Barrier(2, timeout=5)
+        get_all_results = self.job.get_all_results
+        def waiting(key_fields, test):
+            started.wait()
+            return get_all_results(key_fields, test)
+        self.job.get_all_results = waiting
+        
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            results = list(executor.map(lambda test: context.all_results(['Name'], test), ['Test 1', 'Test 2']))
+        for test, result in zip(['Test 1', 'Test 2'], results):
+            self.assertTrue(result.equals(get_all_results(['Name'], test)))
+        
+    def test_given_executor_not_shut_down(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            tables = ResultsTableBuilder(executor).create_tables(COMMANDS, self.job)
+            self.assertEqual(len(tables), len(COMMANDS))
+            self.assertEqual(executor.submit(len, COMMANDS).result(), len(COMMANDS))
+        
+    def test_stat_matrix_matches_stat_compare(self):
+        tables = ResultsTableBuilder().create_tables(['StatMatrixTable;Name;Test 1', 'StatCompareTable;Name;Name;Test 1'], self.job)
+        matrix = tables['StatMatrixTable;Name;Test 1'].table
+        self.assertEqual(list(matrix.columns), ['', 'Sample A', 'Sample B', 'Sample C'])
+        
+        for row, compare_table in zip(matrix.values.tolist(), tables['StatCompareTable;Name;Name;Test 1']):
+            names = matrix.columns[1:]
+            better = ", ".join(name for name, symbol in zip(names, row[1:]) if symbol == '+')
+            worse = ", ".join(name for name, symbol in zip(names, row[1:]) if symbol == '-')
+            self.assertEqual(compare_table.table.values.tolist()[0][0], better)
+            self.assertEqual(compare_table.table.values.tolist()[0][2], worse)
+        
+    def test_chart_data(self):
+        self.job.samples[2].add_result('Rating', 'High')
+        table = ResultsTableBuilder().create_tables(['ChartTable;Name;Test 2,Rating|Low:High'], self.job)['ChartTable;Name;Test 2,Rating|Low:High']
+        self.assertEqual(table.chart['tests'], ['Test 2'])
+        self.assertEqual(table.chart['averages'], [[5.25, 6.2, 4.05]])
+        self.assertEqual(table.chart['stds'][0][0], self.job.samples[0].result_std('Test 2'))
+        self.assertIsNotNone(table.image)
+        
+    def test_ordinal_summary(self):
+        job = make_job({'Sample A': [('Rating', 'Low'), ('Rating', ' High'), ('Rating', 'High')],
+                        'Sample B': [('Rating', 'Medium'), ('Rating', 'Unknown')]})
+        tests, factor_values = ResultsTableBuilder().test_factors(['Rating| Low : Medium :High ', 'Test 1'])
+        self.assertEqual(tests, ['Rating', 'Test 1'])
+        self.assertEqual(factor_values, {'Rating': ['Low', 'Medium', 'High']})
+        
+        tables = ResultsTableBuilder().create_tables(['SummaryTable;Name;Rating| Low : Medium :High;0;Vertical'], job)
+        self.assertEqual(table_values(tables)['SummaryTable;Name;Rating| Low : Medium :High;0;Vertical'],
+                         [(None, [['Sample A', 'Medium'], ['Sample B', 'Low']])])
+        
+    def test_unknown_executor(self):
+        self.assertRaises(ValueError, ResultsTableBuilder, 'cluster')
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(ResultsTableBuilderTestCase('test_thread_executor_matches_serial'))
+    suite.addTest(ResultsTableBuilderTestCase('test_process_executor_matches_serial'))
+    suite.addTest(ResultsTableBuilderTestCase('test_context_results_calculated_once'))
+    suite.addTest(ResultsTableBuilderTestCase('test_context_results_calculated_concurrently'))
+    suite.addTest(ResultsTableBuilderTestCase('test_given_executor_not_shut_down'))
+    suite.addTest(ResultsTableBuilderTestCase('test_stat_matrix_matches_stat_compare'))
+    suite.addTest(ResultsTableBuilderTestCase('test_chart_data'))
+    suite.addTest(ResultsTableBuilderTestCase('test_ordinal_summary'))
+    suite.addTest(ResultsTableBuilderTestCase('test_unknown_executor'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
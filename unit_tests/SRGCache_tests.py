@@ -0,0 +1,49 @@
+import unittest
+from SRGCache import SRGCache
+
+class CacheTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.c = SRGCache(100)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.c.get('missing'))
+        self.assertEqual(self.c.misses, 1)
+        
+    def test_evicts_least_recently_used(self):
+        self.c.put('a', 'A', size=40)
+        self.c.put('b', 'B', size=40)
+        self.c.get('a')
+        self.c.put('c', 'C', size=40)
+        self.assertIn('a', self.c)
+        self.assertNotIn('b', self.c)
+        self.assertEqual(self.c.size, 80)
+        
+    def test_too_big_not_cached(self):
+        self.assertFalse(self.c.put('a', 'A', size=101))
+        self.assertEqual(len(self.c), 0)
+        
+    def test_measures_pickled_size(self):
+        self.c.put('a', 'x' * 10)
+        self.assertGreater(self.c.size, 10)
+        self.assertEqual(self.c.get('a'), 'x' * 10)
+        self.assertEqual(self.c.hit_rate(), 1)
+        
+    def test_clear(self):
+        self.c.put('a', 'A', size=40)
+        self.c.clear()
+        self.assertEqual((len(self.c), self.c.size), (0, 0))
+
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(CacheTestCase('test_get_missing'))
+    suite.addTest(CacheTestCase('test_evicts_least_recently_used'))
+    suite.addTest(CacheTestCase('test_too_big_not_cached'))
+    suite.addTest(CacheTestCase('test_measures_pickled_size'))
+    suite.addTest(CacheTestCase('test_clear'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+import threading
+import os
+import SRGConsoleView as view_module
+from SRGConsoleView import SRGConsoleView
+
+class ConsoleViewTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.v = SRGConsoleView(self.folder.name)
+        
+    def tearDown(self):
+        self.v.close()
+        self.folder.cleanup()
+        
+    def read(self, filename):
+        f = open(os.path.join(self.folder.name, filename), "r", encoding='utf-8')
+        text = f.read()
+        f.close()
+        return text
+
+    def test_messages_from_many_threads(self):
+        def log(thread_index):
+            for i in range(100):
+                self.v.display_message("thread {0} message {1}".format(thread_index, i))
+        threads = [threading.Thread(target=log, args=(t,)) for t in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.v.flush()
+        lines = self.read("activity.log").splitlines()
+        self.assertEqual(len(lines), 400)
+        self.assertEqual(sum(1 for line in lines if line.endswith(": thread 3 message 99")), 1)
+        
+    def test_status_keeps_latest(self):
+        self.v.display_status("first")
+        self.v.display_status("second")
+        self.v.flush()
+        self.assertTrue(self.read("status.txt").endswith(": second\n"))
+        self.assertFalse(os.path.isfile(os.path.join(self.folder.name, "status.txt.tmp")))
+        
+    def test_error_log_rotates(self):
+        old_max = view_module.MAX_LOG_BYTES
+        view_module.MAX_LOG_BYTES = 200
+        try:
+            for i in range(20):
+                self.v.display_error("error number {0}".format(i))
+                self.v.flush()
+        finally:
+            view_module.MAX_LOG_BYTES = old_max
+        self.assertTrue(os.path.isfile(os.path.join(self.folder.name, "errors.log.1")))
+        self.assertLessEqual(os.path.getsize(os.path.join(self.folder.name, "errors.log")), 200)
+        self.assertIn("error number 19", self.read("errors.log"))
+
+
+    def test_writer_survives_errors(self):
+        self.v.display_message("Processing: Échantillon µ 5")
+        self.v.flush()
+        self.assertIn("Échantillon µ 5", self.read("activity.log"))
+        
+        #an unexpected error drops its batch but later messages are still written
+        write_log = self.v._write_log
+        def fail(filename, text):
+            self.v._write_log = write_log
+            raise ValueError("unexpected")
+        self.v._write_log = fail
+        self.v.display_message("lost")
+        self.v.flush()
+        self.v.display_message("written")
+        self.v.flush()
+        self.assertIn("written", self.read("activity.log"))
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(ConsoleViewTestCase('test_messages_from_many_threads'))
+    suite.addTest(ConsoleViewTestCase('test_status_keeps_latest'))
+    suite.addTest(ConsoleViewTestCase('test_error_log_rotates'))
+    suite.addTest(ConsoleViewTestCase('test_writer_survives_errors'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -1,6 +1,10 @@
 import unittest
+import os
+import tempfile
+import SRGController as controller_module
 from SRGController import SRGController
 from SRGConsoleView import SRGConsoleView
+from SRGJobQueue import SRGJobQueue, FAILED
 
 class ControllerTestCase(unittest.TestCase):
     
@@ -32,6 +36,169 @@ class ControllerTestCase(unittest.TestCase):
         self.assertTrue(self.c.clear_job_files())
 
 
+        
+class ServiceCacheTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.saved = (controller_module.DISCOVERY_FOLDER, controller_module.ACCOUNT_CACHE_FILE)
+        controller_module.DISCOVERY_FOLDER = os.path.join(self.folder.name, 'discovery')
+        controller_module.ACCOUNT_CACHE_FILE = os.path.join(self.folder.name, 'account.json')
+        self.c = SRGController(None)
+        
+    def tearDown(self):
+        """ Run after each use case """
+        controller_module.DISCOVERY_FOLDER, controller_module.ACCOUNT_CACHE_FILE = self.saved
+        self.folder.cleanup()
+        
+    def test_services_built_on_first_use(self):
+        from google.auth.credentials import AnonymousCredentials
+        self.assertIsNone(self.c.service)
+        
+        self.c._credentials = AnonymousCredentials()
+        sheets = self.c.sheets_service
+        self.assertIs(self.c.sheets_service, sheets)
+        self.assertEqual(list(self.c._local.services.keys()), ['sheets'])
+        
+        #the discovery document is cached for the next start
+        self.assertTrue(os.path.isfile(os.path.join(controller_module.DISCOVERY_FOLDER, 'sheets.v4.json')))
+        
+    def test_service_per_thread(self):
+        import threading
+        from google.auth.credentials import AnonymousCredentials
+        self.c._credentials = AnonymousCredentials()
+        
+        services = []
+        thread = threading.Thread(target=lambda: services.append(self.c.service))
+        thread.start()
+        thread.join()
+        
+        self.assertIsNot(self.c.service, services[0])
+        self.assertIsNot(self.c.service._http, services[0]._http)
+        self.assertIs(self.c.service._http.credentials, services[0]._http.credentials)
+        
+        #a service set on the controller is shared by every thread
+        self.c.service = services[0]
+        self.assertIs(self.c.service, services[0])
+        
+    def test_account_cache(self):
+        self.assertIsNone(self.c.load_account('key'))
+        self.c.permission_id = '123'
+        self.c.team_drive_id = 'drive'
+        self.c.save_account('key')
+        self.assertEqual(self.c.load_account('key')['team_drive_id'], 'drive')
+        self.assertIsNone(self.c.load_account('other key'))
+        
+class JobQueueTestCase(unittest.TestCase):
+    """ Controller with a job queue in a temporary folder, has no tests of its own """
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.c = SRGController(None)
+        self.c.job_queue = SRGJobQueue(os.path.join(self.folder.name, 'jobs.db'))
+        self.saved = dict(controller_module.STAGE_TIMEOUTS)
+        
+    def tearDown(self):
+        """ Run after each use case """
+        controller_module.STAGE_TIMEOUTS.clear()
+        controller_module.STAGE_TIMEOUTS.update(self.saved)
+        self.c.watchdog.close()
+        self.c.job_queue.close()
+        self.folder.cleanup()
+        
+class StageTimeoutTestCase(JobQueueTestCase):
+        
+    def test_stage_timeout_fails_job(self):
+        import threading
+        job_id, is_new = self.c.job_queue.add("file1", "PROCESS Study")
+        file = {'job_id': job_id, 'id': "file1", 'name': "PROCESS Study"}
+        release = threading.Event()
+        controller_module.STAGE_TIMEOUTS['render'] = 0.1
+        
+        self.assertEqual(self.c.run_stage(file, 'parse', lambda: 'job'), 'job')
+        self.assertIsNone(self.c.run_stage(file, 'render', release.wait))
+        release.set()
+        
+        self.assertEqual(self.c.job_queue.state(job_id), FAILED)
+        self.assertEqual(self.c.job_queue.pending(), [])
+        self.assertEqual(self.c.metrics.snapshot()['gauges']['stages_abandoned'], 1)
+        
+    def test_abandoned_stage_discards_profile(self):
+        import cProfile
+        import threading
+        job_id, is_new = self.c.job_queue.add("file1", "PROCESS Study")
+        file = {'job_id': job_id, 'id': "file1", 'name': "PROCESS Study"}
+        release = threading.Event()
+        controller_module.STAGE_TIMEOUTS['render'] = 0.1
+        
+        profile = cProfile.Profile()
+        profile.enable()
+        self.c.profile = profile
+        try:
+            self.assertEqual(self.c.run_stage(file, 'parse', lambda: 'job'), 'job')
+            self.assertIs(self.c.profile, profile)
+            self.assertIsNone(self.c.run_stage(file, 'render', release.wait))
+            self.assertIsNone(self.c.profile)
+        finally:
+            release.set()
+            profile.disable()
+            
+    def test_template_downloaded_to_job_path(self):
+        from unittest import mock
+        from SRGJob import SRGJob
+        job_id, is_new = self.c.job_queue.add("file1", "PROCESS Study")
+        file = {'job_id': job_id, 'id': "file1", 'name': "PROCESS Study"}
+        job = SRGJob()
+        job.fields['ReportTemplate'] = 'Template.docx'
+        self.c.full_path = lambda filename: os.path.join(self.folder.name, filename)
+        
+        #a stage abandoned by an earlier job can still be writing the shared
+        #template so each job downloads its own copy
+        saved = []
+        def download(doc_parser, service, name, save_path, team_drive_id):
+            saved.append(save_path)
+            return False
+        with mock.patch('MicrosoftDocxParser.MicrosoftDocxParser.download_report_template', download):
+            self.assertFalse(self.c.tables_stage(file, job))
+        self.assertEqual(saved, [self.c.job_path(job_id)])
+        self.assertEqual(self.c.job_queue.state(job_id), FAILED)
+        
+class MemoryCeilingTestCase(JobQueueTestCase):
+        
+    def test_memory_ceiling_rejects_job(self):
+        job_id, is_new = self.c.job_queue.add("file1", "PROCESS Study")
+        self.c.job_queue.estimate(job_id, 1000, 'example.com')
+        queued_job = self.c.job_queue.pending()[0]
+        self.assertTrue(self.c.admit_job(queued_job))
+        
+        #an estimate over the ceiling defers the job
+        self.c.memory.ceiling = self.c.memory.estimate(queued_job) - 1
+        self.assertFalse(self.c.admit_job(queued_job))
+        self.assertNotEqual(self.c.job_queue.state(job_id), FAILED)
+        
+        #a job measured over the ceiling on an earlier attempt is failed
+        self.c.memory.start_job()
+        self.c.memory.stage_peaks['parse'] = self.c.memory.ceiling + 1
+        self.c.memory.finish_job(queued_job)
+        self.assertFalse(self.c.admit_job(queued_job))
+        self.assertEqual(self.c.job_queue.state(job_id), FAILED)
+        self.assertEqual(self.c.memory.rejected, 1)
+        
+    def test_memory_ceiling_defers_job_once(self):
+        job_id, is_new = self.c.job_queue.add("file1", "PROCESS Study")
+        self.c.job_queue.estimate(job_id, 1000, 'example.com')
+        queued_job = self.c.job_queue.pending()[0]
+        
+        #the memory in use doesn't leave room for the job even with the job cache emptied
+        self.c.memory.ceiling = self.c.memory.estimate(queued_job) + 1
+        self.c.memory.in_use = lambda: 2
+        self.assertFalse(self.c.admit_job(queued_job))
+        self.assertEqual(self.c.memory.deferred, 1)
+        self.assertNotEqual(self.c.job_queue.state(job_id), FAILED)
+
+
 
 def suite():
     suite = unittest.TestSuite()  
@@ -42,6 +209,14 @@ def suite():
     suite.addTest(ControllerTestCase('test_create_service_success'))
     suite.addTest(ControllerTestCase('test_clear_job_files_failure'))
     suite.addTest(ControllerTestCase('test_clear_job_files_success'))
+    suite.addTest(ServiceCacheTestCase('test_services_built_on_first_use'))
+    suite.addTest(ServiceCacheTestCase('test_service_per_thread'))
+    suite.addTest(ServiceCacheTestCase('test_account_cache'))
+    suite.addTest(StageTimeoutTestCase('test_stage_timeout_fails_job'))
+    suite.addTest(StageTimeoutTestCase('test_abandoned_stage_discards_profile'))
+    suite.addTest(StageTimeoutTestCase('test_template_downloaded_to_job_path'))
+    suite.addTest(MemoryCeilingTestCase('test_memory_ceiling_rejects_job'))
+    suite.addTest(MemoryCeilingTestCase('test_memory_ceiling_defers_job_once'))
     return suite
 
 if __name__ == '__main__':
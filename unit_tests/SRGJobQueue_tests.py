@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+import os
+from SRGJobQueue import MAX_ATTEMPTS
+from SRGJobQueue import SRGJobQueue, DISCOVERED, PARSED, TABLES_BUILT, SHARED, FAILED
+
+class JobQueueTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "jobs.db")
+        self.q = SRGJobQueue(self.path)
+        
+    def tearDown(self):
+        self.q.close()
+        self.folder.cleanup()
+
+    def test_add_only_once_while_unfinished(self):
+        job_id, is_new = self.q.add("file1", "PROCESS Study")
+        self.assertTrue(is_new)
+        self.assertEqual(self.q.add("file1", "PROCESS Study"), (job_id, False))
+        self.q.checkpoint(job_id, SHARED)
+        self.assertTrue(self.q.add("file1", "PROCESS Study")[1])
+        
+    def test_checkpoint_survives_restart(self):
+        job_id, is_new = self.q.add("file1", "PROCESS Study")
+        self.q.checkpoint(job_id, PARSED, {'samples': [1, 2, 3]})
+        self.q.checkpoint(job_id, TABLES_BUILT, ['table'])
+        self.q.close()
+        
+        self.q = SRGJobQueue(self.path)
+        pending = self.q.pending()
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(pending[0]['state'], TABLES_BUILT)
+        self.assertEqual(pending[0]['id'], "file1")
+        self.assertEqual(self.q.load(job_id, PARSED), {'samples': [1, 2, 3]})
+        self.assertIsNone(self.q.load(job_id, DISCOVERED))
+        
+    def test_fail_after_max_attempts(self):
+        job_id, is_new = self.q.add("file1", "PROCESS Study")
+        for i in range(MAX_ATTEMPTS):
+            self.assertTrue(self.q.start_attempt(job_id))
+        self.assertFalse(self.q.start_attempt(job_id))
+        self.assertEqual(self.q.state(job_id), FAILED)
+        self.assertEqual(self.q.pending(), [])
+        
+    def test_checkpoint_after_fail(self):
+        job_id, is_new = self.q.add("file1", "PROCESS Study")
+        self.q.fail(job_id, "Stage parse took longer than 1 seconds")
+        #an abandoned stage finishing late doesn't bring the job back
+        self.q.checkpoint(job_id, PARSED, {'samples': [1]})
+        self.assertEqual(self.q.state(job_id), FAILED)
+        self.assertIsNone(self.q.load(job_id, PARSED))
+
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(JobQueueTestCase('test_add_only_once_while_unfinished'))
+    suite.addTest(JobQueueTestCase('test_checkpoint_survives_restart'))
+    suite.addTest(JobQueueTestCase('test_fail_after_max_attempts'))
+    suite.addTest(JobQueueTestCase('test_checkpoint_after_fail'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
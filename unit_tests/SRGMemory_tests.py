@@ -0,0 +1,93 @@
+import unittest
+import sys
+import types
+from SRGMemory import SRGMemory, ADMIT, DEFER, REJECT, BYTES_PER_COST, format_bytes
+
+class SRGMemoryTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.memory = SRGMemory()
+        self.memory.start()
+        
+    def tearDown(self):
+        """ Run after each use case """
+        self.memory.stop()
+
+    def test_stage_peaks(self):
+        self.memory.start_job()
+        with self.memory.measure_stage('parse'):
+            data = bytearray(4 * 1024 * 1024)
+            del data
+        with self.memory.measure_stage('tables'):
+            data = bytearray(1024 * 1024)
+            del data
+            
+        peaks = self.memory.stage_peaks
+        self.assertEqual(list(peaks.keys()), ['parse', 'tables'])
+        self.assertGreaterEqual(peaks['parse'], 4 * 1024 * 1024)
+        self.assertLess(peaks['tables'], peaks['parse'])
+        
+        job = {'cost': 1000}
+        self.assertEqual(self.memory.finish_job(job), peaks['parse'])
+        self.assertEqual(self.memory.bytes_per_cost(), peaks['parse'] / 1000)
+        self.assertTrue(self.memory.summary().startswith(format_bytes(peaks['parse']) + " (parse"))
+        
+    def test_admit(self):
+        job = {'cost': 1000}
+        self.assertEqual(self.memory.admit(job), ADMIT)
+        
+        #an estimate over the ceiling waits, only a measured peak fails the job
+        self.memory.ceiling = 1000 * BYTES_PER_COST - 1
+        self.assertEqual(self.memory.admit(job), DEFER)
+        
+        self.memory.ceiling = self.memory.in_use() + 1000 * BYTES_PER_COST + 1024 * 1024
+        self.assertEqual(self.memory.admit(job), ADMIT)
+        held = bytearray(2 * 1024 * 1024)
+        self.assertEqual(self.memory.admit(job), DEFER)
+        self.assertEqual((self.memory.deferred, self.memory.rejected), (2, 0))
+        del held
+        
+    def test_measured_job_rejected(self):
+        job = {'job_id': 1, 'cost': 1000}
+        self.memory.ceiling = 1000 * BYTES_PER_COST
+        self.memory.start_job()
+        self.memory.stage_peaks['parse'] = self.memory.ceiling + 1
+        self.memory.finish_job(job)
+        
+        self.assertEqual(self.memory.measured(job), self.memory.ceiling + 1)
+        self.assertEqual(self.memory.admit(job), REJECT)
+        self.assertEqual(self.memory.admit({'job_id': 2, 'cost': 10}), ADMIT)
+        self.assertEqual(self.memory.rejected, 1)
+        
+    def test_bytes_per_cost_median(self):
+        job = {'cost': 1000}
+        for peak in [1000, 2000, 3000, 80000]:
+            self.memory.start_job()
+            self.memory.stage_peaks['parse'] = peak
+            self.memory.stage_peaks['tables'] = 0
+            self.memory.finish_job(job)
+        self.assertEqual(self.memory.bytes_per_cost(), 2.5)
+        
+        #the peak of a job that imported modules includes the imports
+        self.memory.start_job()
+        self.memory.stage_peaks['parse'] = 10 ** 9
+        self.memory.stage_peaks['tables'] = 0
+        sys.modules['srg_memory_test_import'] = types.ModuleType('srg_memory_test_import')
+        try:
+            self.memory.finish_job(job)
+        finally:
+            del sys.modules['srg_memory_test_import']
+        self.assertEqual(self.memory.bytes_per_cost(), 2.5)
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(SRGMemoryTestCase('test_stage_peaks'))
+    suite.addTest(SRGMemoryTestCase('test_admit'))
+    suite.addTest(SRGMemoryTestCase('test_measured_job_rejected'))
+    suite.addTest(SRGMemoryTestCase('test_bytes_per_cost_median'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
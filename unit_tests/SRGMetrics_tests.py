@@ -0,0 +1,99 @@
+import unittest
+import json
+import urllib.request
+from googleapiclient.http import HttpMockSequence
+from googleapiclient.errors import HttpError
+from SRGMetrics import SRGMetrics, percentile, request_builder, rss_bytes
+
+class SRGMetricsTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.metrics = SRGMetrics()
+        
+    def tearDown(self):
+        """ Run after each use case """
+        self.metrics.close()
+
+    def test_percentile(self):
+        samples = [5, 1, 4, 2, 3, 6, 7, 8, 9, 10]
+        self.assertEqual(percentile(samples, 0.5), 5)
+        self.assertEqual(percentile(samples, 0.9), 9)
+        self.assertEqual(percentile(samples, 0.99), 10)
+        self.assertIsNone(percentile([], 0.5))
+        
+    def test_stage_latency(self):
+        for seconds in [1.0, 2.0, 3.0]:
+            self.metrics.observe_stage('parse', seconds)
+        with self.assertRaises(ValueError):
+            with self.metrics.time_stage('render'):
+                raise ValueError()
+            
+        stages = self.metrics.snapshot()['stages']
+        self.assertEqual(stages['parse']['count'], 3)
+        self.assertEqual(stages['parse']['sum'], 6.0)
+        self.assertEqual(stages['parse']['quantiles'][0.5], 2.0)
+        self.assertEqual(stages['render']['errors'], 1)
+        
+    def test_stage_memory(self):
+        self.metrics.observe_memory('tables', 2000)
+        self.metrics.observe_memory('tables', 1000)
+        self.assertEqual(self.metrics.snapshot()['memory']['tables'], {'last': 1000, 'max': 2000})
+        text = self.metrics.prometheus_text()
+        self.assertIn('srg_stage_peak_memory_bytes{stage="tables"} 1000.0', text)
+        self.assertIn('srg_stage_peak_memory_bytes_max{stage="tables"} 2000.0', text)
+        
+    def test_jobs_in_flight(self):
+        with self.metrics.track_job():
+            self.assertEqual(self.metrics.snapshot()['jobs_in_flight'], 1)
+        self.assertEqual(self.metrics.snapshot()['jobs_in_flight'], 0)
+        
+    def test_api_calls_counted(self):
+        http = HttpMockSequence([({'status': '200'}, '{}'), ({'status': '404'}, '{}')])
+        requests = request_builder(self.metrics)
+        requests(http, lambda response, content: content, 'https://example.com/files', methodId='drive.files.list').execute()
+        with self.assertRaises(HttpError):
+            requests(http, lambda response, content: content, 'https://example.com/files', methodId='drive.files.get').execute()
+            
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['api_calls'], {'drive.files.list': 1, 'drive.files.get': 1})
+        self.assertEqual(snapshot['api_errors'], {'drive.files.get': 1})
+        
+    def test_prometheus_text(self):
+        self.metrics.observe_stage('tables', 0.5)
+        self.metrics.count_api_call('sheets.spreadsheets.get')
+        self.metrics.add_gauge('queue_depth', "Unfinished jobs", lambda: 3)
+        self.metrics.add_gauge('broken', "Raises", lambda: 1 / 0)
+        text = self.metrics.prometheus_text()
+        self.assertIn('srg_stage_seconds{stage="tables",quantile="0.5"} 0.5', text)
+        self.assertIn('srg_stage_seconds_count{stage="tables"} 1.0', text)
+        self.assertIn('srg_api_calls_total{method="sheets.spreadsheets.get"} 1.0', text)
+        self.assertIn('srg_queue_depth 3.0', text)
+        self.assertNotIn('srg_broken ', text)
+        
+    def test_serve(self):
+        self.metrics.add_gauge('resident_memory_bytes', "Resident memory", rss_bytes)
+        port = self.metrics.serve(0)
+        base = 'http://127.0.0.1:{0}'.format(port)
+        
+        with urllib.request.urlopen(base + '/health') as response:
+            self.assertEqual(json.loads(response.read().decode('utf-8'))['status'], 'ok')
+        with urllib.request.urlopen(base + '/metrics') as response:
+            self.assertIn('srg_jobs_in_flight 0.0', response.read().decode('utf-8'))
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(base + '/missing')
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(SRGMetricsTestCase('test_percentile'))
+    suite.addTest(SRGMetricsTestCase('test_stage_latency'))
+    suite.addTest(SRGMetricsTestCase('test_stage_memory'))
+    suite.addTest(SRGMetricsTestCase('test_jobs_in_flight'))
+    suite.addTest(SRGMetricsTestCase('test_api_calls_counted'))
+    suite.addTest(SRGMetricsTestCase('test_prometheus_text'))
+    suite.addTest(SRGMetricsTestCase('test_serve'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+import os
+from SRGProfiler import SRGProfiler, PROFILE_CONTROL_FILE
+
+class RecordingView:
+    """ View that keeps the messages instead of writing them to the logs """
+    
+    def __init__(self):
+        self.messages = []
+        self.errors = []
+        
+    def display_message(self, message):
+        self.messages.append(message)
+        return True
+    
+    def display_error(self, message):
+        self.errors.append(message)
+        return True
+
+class ProfilerTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.view = RecordingView()
+        self.p = SRGProfiler(self.view, self.folder.name)
+        
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_not_profiled_by_default(self):
+        self.assertIsNone(self.p.start_job())
+        
+    def test_control_file_requests_jobs(self):
+        f = open(os.path.join(self.folder.name, PROFILE_CONTROL_FILE), "w+")
+        f.write("2")
+        f.close()
+        profile = self.p.start_job()
+        self.assertIsNotNone(profile)
+        profile.disable()
+        self.assertFalse(os.path.isfile(os.path.join(self.folder.name, PROFILE_CONTROL_FILE)))
+        self.assertEqual(self.p.remaining, 1)
+        
+    def test_signal_requests_jobs(self):
+        #the signal handler only counts the request, start_job picks it up
+        self.p.request(2)
+        self.assertEqual(self.p.remaining, 0)
+        profile = self.p.start_job()
+        profile.disable()
+        self.assertEqual(self.p.remaining, 1)
+        self.p.request(1)
+        profile = self.p.start_job()
+        profile.disable()
+        self.assertEqual(self.p.remaining, 1)
+        
+    def test_finish_job_saves_tagged_pstats(self):
+        self.p.request(1)
+        profile = self.p.start_job()
+        sum(range(1000))
+        path = self.p.finish_job(profile, "PROCESS Study 12/A")
+        self.assertTrue(os.path.isfile(path))
+        self.assertTrue(path.endswith("-Study_12_A.pstats"))
+        self.assertEqual(len(self.view.messages), 1)
+
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(ProfilerTestCase('test_not_profiled_by_default'))
+    suite.addTest(ProfilerTestCase('test_control_file_requests_jobs'))
+    suite.addTest(ProfilerTestCase('test_signal_requests_jobs'))
+    suite.addTest(ProfilerTestCase('test_finish_job_saves_tagged_pstats'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,75 @@
+import unittest
+import datetime
+import tempfile
+import os
+from SRGScheduler import SRGScheduler, estimate_cost, requester_key, AGING_RATE, DEFAULT_COST, TAB_COST, USAGE_HALF_LIFE
+from SRGJobQueue import SRGJobQueue
+
+NOW = datetime.datetime(2020, 1, 1, 12, 0, 0)
+
+def queued(job_id, cost, requester, waited=0):
+    return {'job_id': job_id, 'cost': cost, 'requester': requester,
+            'created': NOW - datetime.timedelta(seconds=waited)}
+
+class SRGSchedulerTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.scheduler = SRGScheduler()
+        
+    def order(self, jobs):
+        return [job['job_id'] for job in self.scheduler.order(jobs, NOW)]
+
+    def test_estimate(self):
+        sheets = [{'title': 'Details', 'gridProperties': {'rowCount': 100}},
+                  {'title': 'Sample 1', 'gridProperties': {'rowCount': 1000}}]
+        self.assertEqual(estimate_cost(sheets), 1100 + 2 * TAB_COST)
+        self.assertEqual(requester_key(' Someone@Example.com '), 'someone@example.com')
+        self.assertEqual(requester_key(None), '')
+        
+    def test_shortest_first(self):
+        jobs = [queued(1, DEFAULT_COST + 1, 'a'), queued(2, 1000, 'b'), queued(3, None, 'c'), queued(4, 1000, 'd')]
+        #equal costs keep their queue order and unestimated jobs cost DEFAULT_COST
+        self.assertEqual(self.order(jobs), [2, 4, 3, 1])
+        
+    def test_aging(self):
+        waited = (50000 - 1000) / AGING_RATE + 1
+        jobs = [queued(1, 50000, 'a', waited), queued(2, 1000, 'b')]
+        self.assertEqual(self.order(jobs), [1, 2])
+        self.assertEqual(self.order([queued(1, 50000, 'a', waited - 2), queued(2, 1000, 'b')]), [2, 1])
+        
+    def test_fair_share(self):
+        #one requester flagging many spreadsheets is interleaved with another
+        jobs = [queued(job_id, 20000, 'busy.com') for job_id in range(1, 6)] + [queued(6, 20000, 'other.com'), queued(7, 20000, 'other.com')]
+        self.assertEqual(self.order(jobs), [1, 6, 2, 7, 3, 4, 5])
+        
+        #work already done for a requester counts against them, less as time passes
+        self.scheduler.charge(queued(8, 30000, 'busy.com'), NOW)
+        self.assertEqual(self.order([queued(1, 1000, 'busy.com'), queued(2, 20000, 'other.com')]), [2, 1])
+        later = NOW + datetime.timedelta(seconds=USAGE_HALF_LIFE)
+        self.assertAlmostEqual(self.scheduler.usage('busy.com', later), 15000)
+        
+    def test_queue_estimate(self):
+        folder = tempfile.TemporaryDirectory()
+        queue = SRGJobQueue(os.path.join(folder.name, 'jobs.db'))
+        job_id, is_new = queue.add("file1", "PROCESS Study")
+        self.assertIsNone(queue.pending()[0]['cost'])
+        queue.estimate(job_id, 1200, 'example.com')
+        job = queue.pending()[0]
+        self.assertEqual((job['cost'], job['requester']), (1200, 'example.com'))
+        self.assertIsInstance(job['created'], datetime.datetime)
+        queue.close()
+        folder.cleanup()
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(SRGSchedulerTestCase('test_estimate'))
+    suite.addTest(SRGSchedulerTestCase('test_shortest_first'))
+    suite.addTest(SRGSchedulerTestCase('test_aging'))
+    suite.addTest(SRGSchedulerTestCase('test_fair_share'))
+    suite.addTest(SRGSchedulerTestCase('test_queue_estimate'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
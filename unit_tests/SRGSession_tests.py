@@ -0,0 +1,55 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import SRGSession
+
+class SRGSessionTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.folder = tempfile.TemporaryDirectory()
+        self.pid_path = SRGSession.pid_path
+        SRGSession.pid_path = lambda: os.path.join(self.folder.name, SRGSession.PID_FILE)
+        
+    def tearDown(self):
+        """ Run after each use case """
+        SRGSession.pid_path = self.pid_path
+        self.folder.cleanup()
+
+    def test_pidfile(self):
+        SRGSession.write_pidfile('session')
+        self.assertEqual(SRGSession.read_pid(), os.getpid())
+        self.assertEqual(SRGSession.session_pid(), os.getpid())
+        
+        SRGSession.remove_pidfile()
+        self.assertIsNone(SRGSession.read_pid())
+        self.assertIsNone(SRGSession.session_pid())
+        
+    @unittest.skipIf(SRGSession.process_start(os.getpid()) is None, "process start times need /proc")
+    def test_reused_pid_not_signalled(self):
+        #another process that was given the process id of the stopped session
+        other = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            f=open(SRGSession.pid_path(), "w+")
+            f.write("{0}\nsession\n{1}\n".format(other.pid, 'not-the-start-time'))
+            f.close()
+            
+            self.assertIsNone(SRGSession.session_pid())
+            self.assertFalse(SRGSession.stop_session(wait=0))
+            self.assertIsNone(other.poll())
+            self.assertFalse(os.path.exists(SRGSession.pid_path()))
+        finally:
+            other.kill()
+            other.wait()
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(SRGSessionTestCase('test_pidfile'))
+    suite.addTest(SRGSessionTestCase('test_reused_pid_not_signalled'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
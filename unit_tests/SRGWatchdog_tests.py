@@ -0,0 +1,54 @@
+import unittest
+import threading
+from SRGWatchdog import SRGWatchdog, StageTimeout
+
+class SRGWatchdogTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.watchdog = SRGWatchdog()
+        
+    def tearDown(self):
+        """ Run after each use case """
+        self.watchdog.close()
+
+    def test_result(self):
+        self.assertEqual(self.watchdog.run('parse', 5, lambda a, b: a + b, 1, 2), 3)
+        
+        #stages share the stage thread until one is abandoned
+        first = self.watchdog.run('parse', 5, threading.get_ident)
+        self.assertEqual(self.watchdog.run('render', 5, threading.get_ident), first)
+        self.assertNotEqual(first, threading.get_ident())
+        
+    def test_exception(self):
+        def fail():
+            raise ValueError("bad sheet")
+        with self.assertRaises(ValueError):
+            self.watchdog.run('parse', 5, fail)
+        self.assertEqual(self.watchdog.run('parse', 5, lambda: 'next'), 'next')
+        self.assertEqual(self.watchdog.abandoned, 0)
+        
+    def test_timeout(self):
+        release = threading.Event()
+        stuck = self.watchdog.run('parse', 5, threading.get_ident)
+        
+        with self.assertRaises(StageTimeout) as context:
+            self.watchdog.run('upload', 0.1, release.wait)
+        self.assertEqual(context.exception.stage, 'upload')
+        self.assertEqual(str(context.exception), "Stage upload took longer than 0.1 seconds")
+        self.assertEqual(self.watchdog.abandoned, 1)
+        
+        #the next stage runs on a new thread while the abandoned one is stuck
+        self.assertNotEqual(self.watchdog.run('parse', 5, threading.get_ident), stuck)
+        release.set()
+        
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(SRGWatchdogTestCase('test_result'))
+    suite.addTest(SRGWatchdogTestCase('test_exception'))
+    suite.addTest(SRGWatchdogTestCase('test_timeout'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,135 @@
+import unittest
+import copy
+import pickle
+from SampleData import SampleData
+from SRGJob import SRGJob
+
+def make_sample(name, code):
+    sample = SampleData()
+    sample.add_detail('Name', name)
+    sample.add_detail('Code', code)
+    return sample
+
+class SampleDataTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        """ Run before each use case """
+        self.s = make_sample('Sample A', 'A')
+
+    def test_build_name_strips_fields(self):
+        self.assertEqual(self.s.build_name(['Name', ' Code ']), 'Sample A A')
+        self.assertEqual(self.s.build_name(['Missing', 'Code']), 'A')
+        
+    def test_build_name_updated_by_add_detail(self):
+        self.assertEqual(self.s.build_name(['Name']), 'Sample A')
+        self.s.add_detail('Name', 'Sample B')
+        self.assertEqual(self.s.build_name(['Name']), 'Sample B')
+        
+    def test_sample_index(self):
+        job = SRGJob()
+        job.add_sample(self.s)
+        job.add_sample(make_sample('Sample B', 'B'))
+        job.add_sample(make_sample('Sample A', 'C'))
+        index = job.sample_index(['Name'])
+        self.assertEqual(list(index.keys()), ['Sample A', 'Sample B'])
+        self.assertEqual(len(index['Sample A']), 2)
+        self.assertIs(job.sample_index(['Name']), index)
+        
+        #changing the details rebuilds the index
+        job.samples[2].add_detail('Name', 'Sample C')
+        self.assertEqual(len(job.sample_index(['Name'])['Sample A']), 1)
+        
+    def test_results_frame_and_aggregate(self):
+        job = SRGJob()
+        job.add_sample(self.s)
+        for result in ['10%', '12.5%', 'N/A', '11%']:
+            self.s.add_result('Moisture', result)
+        self.s.add_result('Rating', 'High')
+        
+        frame = job.results_frame()
+        self.assertEqual(list(frame.columns), ['sample', 'test', 'replicate', 'value', 'raw', 'unit'])
+        self.assertEqual(len(frame), 5)
+        self.assertEqual(frame['replicate'].tolist()[:4], [1, 2, 3, 4])
+        
+        aggregate = job.aggregate()
+        self.assertEqual(len(aggregate), 1)
+        self.assertEqual(aggregate.loc[(0, 'Moisture'), 'count'], 3)
+        self.assertEqual(aggregate.loc[(0, 'Moisture'), 'mean'], self.s.result_average('Moisture'))
+        self.assertAlmostEqual(aggregate.loc[(0, 'Moisture'), 'std'], self.s.result_std('Moisture'))
+        
+        #adding a result rebuilds the aggregate
+        self.s.add_result('Moisture', '20')
+        self.assertEqual(job.aggregate().loc[(0, 'Moisture'), 'count'], 4)
+        
+    def test_add_results_matches_add_result(self):
+        test_names = ['Gloss', 'Moisture', 'Gloss', 'Rating', 'Moisture', 'Gloss', 'Moisture']
+        results = ['85', '10%', '86.5', 'High', 'N/A', '1e2', '%12']
+        each = make_sample('Sample B', 'B')
+        each.add_result('Rating', 'Low')
+        for test_name, result in zip(test_names, results):
+            each.add_result(test_name, result)
+        self.s.add_result('Rating', 'Low')
+        self.s.add_results(test_names, results)
+        
+        self.assertEqual(self.s.test_results, each.test_results)
+        self.assertEqual(list(self.s.test_results_values.items()), list(each.test_results_values.items()))
+        self.assertEqual(self.s.test_units, {'Moisture': '%'})
+        self.assertEqual(self.s.results_version, each.results_version)
+        
+    def test_add_results_invalid_number(self):
+        #a result starting with a digit that isn't a number raises as add_result does
+        self.assertRaises(ValueError, self.s.add_results, ['Gloss', 'Gloss', 'Gloss'], ['85', '85 GU', '86'])
+        self.assertEqual(self.s.test_results['Gloss'], ['85', '85 GU'])
+
+        
+    def test_ordinal_averages(self):
+        job = SRGJob()
+        job.add_sample(self.s)
+        job.add_sample(make_sample('Sample B', 'B'))
+        job.add_sample(make_sample('Sample C', 'C'))
+        for result in ['Low', 'High ', 'High', 'Other']:
+            self.s.add_result('Rating', result)
+        job.samples[1].add_result('Rating', 'Medium')
+        
+        factors = ['Low', ' Medium', 'High']
+        averages = job.ordinal_averages('Rating', factors)
+        self.assertEqual(averages, [1, 1, 0])
+        self.assertEqual(averages[:2], [sample.result_average_ordinal('Rating', {'Rating': factors}) for sample in job.samples[:2]])
+        self.assertIs(job.ordinal_averages('Rating', factors), averages)
+        
+        #adding a result rebuilds the averages
+        job.samples[1].add_result('Rating', 'High')
+        self.assertEqual(job.ordinal_averages('Rating', factors), [1, 2, 0])
+        
+    def test_copy_leaves_out_built_frames(self):
+        job = SRGJob()
+        job.add_sample(self.s)
+        self.s.add_result('Moisture', '10')
+        size = len(pickle.dumps(job))
+        job.sample_index(['Name'])
+        job.aggregate()
+        job.ordinal_averages('Moisture', ['Low'])
+        self.assertEqual(len(pickle.dumps(job)), size)
+        
+        #a copy shares the samples but builds its own frames
+        job_copy = copy.copy(job)
+        self.assertIs(job_copy.samples[0], self.s)
+        self.assertIsNone(job_copy._aggregate)
+        self.assertEqual(job_copy.aggregate().loc[(0, 'Moisture'), 'count'], 1)
+        self.assertIsNotNone(job._aggregate)
+
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(SampleDataTestCase('test_build_name_strips_fields'))
+    suite.addTest(SampleDataTestCase('test_build_name_updated_by_add_detail'))
+    suite.addTest(SampleDataTestCase('test_sample_index'))
+    suite.addTest(SampleDataTestCase('test_results_frame_and_aggregate'))
+    suite.addTest(SampleDataTestCase('test_add_results_matches_add_result'))
+    suite.addTest(SampleDataTestCase('test_add_results_invalid_number'))
+    suite.addTest(SampleDataTestCase('test_ordinal_averages'))
+    suite.addTest(SampleDataTestCase('test_copy_leaves_out_built_frames'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
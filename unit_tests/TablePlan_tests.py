@@ -0,0 +1,76 @@
+import unittest
+from TablePlan import TablePlan, parse_command
+
+class TablePlanTestCase(unittest.TestCase):
+
+    def test_invalid_commands(self):
+        plan = TablePlan(['Field:Title', 'SummaryTable;Name;Test 1', 'StatCompareTable;Name;Code;Test;10,*', 'UnknownTable;Name'])
+        self.assertEqual(plan.commands, [])
+        self.assertEqual(len(plan.invalid), 4)
+        
+    def test_duplicates_share_a_table(self):
+        plan = TablePlan(['SummaryTable;Name;Test 1,Test 2;2;Vertical',
+                          'SummaryTable;Name;Test 1,Test 2;2;Vertical',
+                          'SummaryTable; Name ;Test 1, Test 2 ;02;Vertical'])
+        self.assertEqual(len(plan.commands), 1)
+        self.assertEqual(len(plan.aliases), 2)
+        
+    def test_different_commands_not_shared(self):
+        plan = TablePlan(['SummaryTable;Name;Test 1;2;Vertical',
+                          'SummaryTable;Name;Test 1;2;Horizontal',
+                          'SamplesTable;Name',
+                          'SamplesTable; Name'])
+        self.assertEqual(len(plan.commands), 4)
+        
+    def test_stat_comparisons(self):
+        plan = TablePlan(['StatCompareTable;Name;Code;Test 1',
+                          'StatCompareTable;Name+Batch;Code;Test 1(FLIP)',
+                          'StatCompareTable;Name;Code;Test 2'])
+        self.assertEqual(plan.stat_comparisons(), [(('Code',), 'Test 1'), (('Code',), 'Test 2')])
+        
+    def test_stat_matrix_command(self):
+        plan = TablePlan(['StatMatrixTable;Code;Test 1',
+                          'StatMatrixTable; Code ;Test 1 ',
+                          'StatMatrixTable;Code;Test 1(FLIP);10,*',
+                          'StatMatrixTable;Code'])
+        self.assertEqual(len(plan.commands), 2)
+        self.assertEqual(plan.commands[1].args, ['Code', 'Test 1(FLIP)', '10,*'])
+        self.assertEqual(plan.invalid, ['StatMatrixTable;Code'])
+        self.assertEqual(plan.stat_comparisons(), [(('Code',), 'Test 1')])
+        
+    def test_image_command(self):
+        plan = TablePlan(['ImageTable;StatCompareTable;Name;Code;Test 1',
+                          'StatCompareTable;Name;Code;Test 1',
+                          'ImageTable;SummaryTable;Name'])
+        self.assertEqual(len(plan.commands), 2)
+        self.assertEqual(plan.commands[0].args[0].key, plan.commands[1].key)
+        self.assertEqual(plan.invalid, ['ImageTable;SummaryTable;Name'])
+        self.assertEqual(plan.stat_comparisons(), [(('Code',), 'Test 1')])
+        
+    def test_chart_command(self):
+        plan = TablePlan(['ChartTable;Name;Test 1, Test 2',
+                          'ChartTable;Name;Test 1,Test 2;Vertical',
+                          'ChartTable;Name;Test 1,Test 2;Horizontal'])
+        #vertical is the default orientation
+        self.assertEqual(len(plan.commands), 2)
+        self.assertEqual(plan.commands[1].args, ['Name', 'Test 1,Test 2', 'Horizontal'])
+        
+    def test_widths_parsed(self):
+        self.assertEqual(parse_command('SamplesTable;Name,Code;20,*').args, ['Name,Code', '20,*'])
+        self.assertEqual(parse_command('SummaryTable;Name;T;1;Vertical;20,*').args[-1], '20,*')
+
+
+def suite():
+    suite = unittest.TestSuite()  
+    suite.addTest(TablePlanTestCase('test_invalid_commands'))
+    suite.addTest(TablePlanTestCase('test_duplicates_share_a_table'))
+    suite.addTest(TablePlanTestCase('test_different_commands_not_shared'))
+    suite.addTest(TablePlanTestCase('test_stat_comparisons'))
+    suite.addTest(TablePlanTestCase('test_stat_matrix_command'))
+    suite.addTest(TablePlanTestCase('test_image_command'))
+    suite.addTest(TablePlanTestCase('test_chart_command'))
+    suite.addTest(TablePlanTestCase('test_widths_parsed'))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())